@@ -0,0 +1,4 @@
+"""Benchmarks for oh_behave
+
+Run with `python -m benchmarks`, see `python -m benchmarks --help`
+"""
@@ -0,0 +1,157 @@
+"""Module running the benchmarks and reporting machine readable results"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from oh_behave import actor
+from oh_behave import codegen
+from oh_behave import compiler
+from oh_behave import generate
+from oh_behave import pool
+from oh_behave import reader
+
+def _timed(func, *args, **kwargs):
+    """Returns (result, seconds) of calling func"""
+    gc.collect()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def _rate(count, seconds):
+    """Returns count / seconds, 0 when nothing was counted or timed"""
+    if count == 0 or seconds <= 0:
+        return 0.0
+    return count / seconds
+
+def _parse(strings):
+    parser = reader.DataParser()
+    for string in strings:
+        parser._parse_object_string(string)
+    return parser
+
+def _load_file(filepath):
+    parser = reader.DataParser()
+    parser.parse_file(filepath)
+    return parser.build_objects()
+
+def _actors(objects):
+    return [obj for obj in objects.values() if isinstance(obj, actor.Actor)]
+
+def _tick(actors, ticks):
+    for _ in range(ticks):
+        for a in actors:
+            a.execute()
+
+def _build_memory(strings):
+    """Returns the peak bytes allocated while parsing and building"""
+    gc.collect()
+    tracemalloc.start()
+    parser = _parse(strings)
+    objects = parser.build_objects()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return peak
+
+def _instance_memory(program, count):
+    """Returns the bytes allocated by count instances of program"""
+    gc.collect()
+    tracemalloc.start()
+    instances = [program.instantiate() for _ in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del instances
+    return current
+
+def run(actors, depth, fanout, ticks, seed=0):
+    """
+    Run every benchmark, returns a dictionary of results
+    """
+    definitions = generate.generate_library(actors, depth, fanout, seed)
+    strings = [json.dumps(values) for values in definitions]
+    entries = len(strings)
+    results = {}
+
+    parser, seconds = _timed(_parse, strings)
+    results['parse_entries_per_second'] = _rate(entries, seconds)
+    objects, seconds = _timed(parser.build_objects)
+    results['build_entries_per_second'] = _rate(entries, seconds)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        filepath = os.path.join(tempdir, 'library.jsonl')
+        with open(filepath, 'w') as output:
+            output.write('\n'.join(strings))
+        _, seconds = _timed(_load_file, filepath)
+        results['file_load_entries_per_second'] = _rate(entries, seconds)
+        reader.DataParser().load_objects_cached(filepath)
+        _, seconds = _timed(reader.DataParser().load_objects_cached, filepath)
+        results['cached_load_entries_per_second'] = _rate(entries, seconds)
+
+    population = _actors(objects)
+    _, seconds = _timed(_tick, population, ticks)
+    results['node_ticks_per_second'] = _rate(len(population) * ticks, seconds)
+
+    objects = _parse(strings).build_objects()
+    population = _actors(objects)
+    programs, seconds = _timed(compiler.compile_actors, objects)
+    results['compile_actors_per_second'] = _rate(len(population), seconds)
+    _, seconds = _timed(_tick, population, ticks)
+    results['compiled_ticks_per_second'] = _rate(len(population) * ticks, seconds)
+
+    objects = _parse(strings).build_objects()
+    population = _actors(objects)
+    for program in compiler.compile_actors(objects).values():
+        codegen.specialize(program)
+    _, seconds = _timed(_tick, population, ticks)
+    results['generated_ticks_per_second'] = _rate(len(population) * ticks, seconds)
+
+    objects = _parse(strings).build_objects()
+    compiler.compile_actors(objects)
+    actor_pool = pool.ActorPool(_actors(objects))
+    actor_pool.run(max_ticks=ticks)
+    results['pool_ticks_per_second'] = actor_pool.ticks_per_second()
+
+    results['build_peak_bytes_per_actor'] = _rate(_build_memory(strings), actors)
+    program = next(iter(programs.values()), None)
+    if program is None:
+        results['instance_bytes_per_actor'] = 0.0
+        results['nodes_per_tree'] = 0
+    else:
+        results['instance_bytes_per_actor'] = _rate(_instance_memory(program, actors), actors)
+        results['nodes_per_tree'] = len(program)
+    return results
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    parser.add_argument('--actors', type=int, default=1000)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--fanout', type=int, default=3)
+    parser.add_argument('--ticks', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='File to write the JSON results to, stdout by default')
+    args = parser.parse_args(argv)
+
+    report = {
+        'python' : platform.python_version(),
+        'implementation' : platform.python_implementation(),
+        'parameters' : {'actors' : args.actors, 'depth' : args.depth,
+                        'fanout' : args.fanout, 'ticks' : args.ticks, 'seed' : args.seed},
+        'results' : run(args.actors, args.depth, args.fanout, args.ticks, args.seed)
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=4, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=4, sort_keys=True)
+        sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main()
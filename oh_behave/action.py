@@ -1,12 +1,44 @@
 """Action module"""
+import asyncio
 import enum
+import logging
+import operator
 import oh_behave
+from oh_behave import actor
 from oh_behave import behave
+from oh_behave import offload
+
+logger = logging.getLogger(__name__)
+
+_FAILURE = oh_behave.ExecuteResult.failure
+_READY = oh_behave.ExecuteResult.ready
+_SUCCESS = oh_behave.ExecuteResult.success
+
+_COMPARISONS = {
+    'eq' : operator.eq,
+    'ne' : operator.ne,
+    'lt' : operator.lt,
+    'le' : operator.le,
+    'gt' : operator.gt,
+    'ge' : operator.ge
+}
+
+def _performer(act):
+    """
+    Returns the actor act runs for: the one being executed, else the actor
+    act is linked to, or None if it is not linked to one
+    """
+    performer = actor.get_executing()
+    if performer is None and isinstance(act._actor, actor.Actor):
+        performer = act._actor
+    return performer
 
 class Action(behave.Node):
     """
     Action base class
     """
+    __slots__ = ('_actor',)
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         try:
@@ -14,8 +46,14 @@ class Action(behave.Node):
         except KeyError as e:
             raise oh_behave.MissingArgumentException(self, self.__init__, str(e))
 
+    def set_actor(self, actor):
+        """Set the actor performing the action"""
+        self._actor = actor
+
 class ActionTimed(Action):
     """Action that takes a certain amount of time"""
+    __slots__ = ('timegoal', 'time')
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         try:
@@ -26,12 +64,242 @@ class ActionTimed(Action):
 
     def _execute(self):
         if self.time>= self.timegoal:
-            status = oh_behave.ExecuteResult.success
+            status = _SUCCESS
         else:
-            status = oh_behave.ExecuteResult.ready
+            status = _READY
+            # Nothing changes until the last tick, let the actor be parked
+            idle = self.timegoal - self.time - 1
+            if idle > 0:
+                performer = _performer(self)
+                if performer is not None:
+                    performer.sleep(idle, self)
         self.time += 1
         return status
 
+    def skip(self, ticks):
+        """Account for ticks skipped while the actor was parked"""
+        self.time += ticks
+
+    def _failed(self):
+        pass
+    def _success(self):
+        pass
+    def _reset(self):
+        self.time = 1
+
+class ActionCondition(Action):
+    """
+    Action comparing a key of the actor's blackboard with a value
+
+    Succeeds when blackboard[key] compare value holds, compare being one of
+    eq, ne, lt, le, gt or ge, and fails otherwise. The result is kept in the
+    blackboard of the executing actor and only evaluated again once the key
+    has changed. With wait set the condition returns ready instead of
+    failing and asks the actor to wait for the key to change, see
+    Actor.wait.
+    """
+    __slots__ = ('key', 'value', 'wait', '_compare')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        try:
+            self.key = kwargs['key']
+        except KeyError as e:
+            raise oh_behave.MissingArgumentException(self, self.__init__, str(e))
+        self.value = kwargs.get('value', None)
+        self.wait = kwargs.get('wait', False)
+        compare = kwargs.get('compare', 'eq')
+        if compare not in _COMPARISONS:
+            raise ValueError('Unknown comparison "{0}"'.format(compare))
+        self._compare = _COMPARISONS[compare]
+
+    def _execute(self):
+        performer = _performer(self)
+        if performer is None:
+            logger.warning('Condition id "%s" has no actor to read', self.get_id())
+            return _FAILURE
+        blackboard = performer.get_blackboard()
+        version = blackboard.version(self.key)
+        memo = blackboard.recall(self)
+        if memo is not None and memo[0] == version:
+            result = memo[1]
+        else:
+            try:
+                holds = self._compare(blackboard.get(self.key), self.value)
+            except TypeError:
+                holds = False
+            result = _SUCCESS if holds else _FAILURE
+            blackboard.remember(self, (version, result))
+        if result is _FAILURE and self.wait:
+            performer.wait(self.key)
+            return _READY
+        return result
+
+    def _failed(self):
+        pass
+    def _success(self):
+        pass
+
+class ActionAssign(Action):
+    """
+    Action storing value under key in the actor's blackboard, succeeds
+    unless there is no actor to write to
+    """
+    __slots__ = ('key', 'value')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        try:
+            self.key = kwargs['key']
+        except KeyError as e:
+            raise oh_behave.MissingArgumentException(self, self.__init__, str(e))
+        self.value = kwargs.get('value', None)
+
+    def _execute(self):
+        performer = _performer(self)
+        if performer is None:
+            logger.warning('Assignment id "%s" has no actor to write to', self.get_id())
+            return _FAILURE
+        performer.get_blackboard().set(self.key, self.value)
+        return _SUCCESS
+
+    def _failed(self):
+        pass
+    def _success(self):
+        pass
+
+class ActionAsync(Action):
+    """
+    Action running a coroutine on the asyncio event loop
+
+    The first execution starts run() as a task and returns ready until the
+    task is done. It then succeeds if the coroutine returned
+    ExecuteResult.success or a true value, and fails if it returned
+    anything else or raised. Must be executed from a running event loop,
+    see oh_behave.aio.
+
+    The coroutine is made by calling coroutine(action) when given, or by
+    the run() method of subclasses. Every actor executing the action runs a
+    task of its own, and resetting only cancels the executing actor's.
+    """
+    __slots__ = ('_coroutine', '_tasks')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._coroutine = kwargs.get('coroutine', None)
+        # Running tasks keyed by actor, None when the action has no actor
+        self._tasks = {}
+
+    async def run(self):
+        """
+        Coroutine doing the work of the action
+        """
+        if self._coroutine is None:
+            raise NotImplementedError('ActionAsync needs a coroutine or a run() method')
+        return await self._coroutine(self)
+
+    def _execute(self):
+        performer = _performer(self)
+        task = self._tasks.get(performer)
+        if task is None:
+            self._tasks[performer] = asyncio.get_running_loop().create_task(self.run())
+            return _READY
+        if not task.done():
+            return _READY
+        del self._tasks[performer]
+        if task.cancelled():
+            return _FAILURE
+        error = task.exception()
+        if error is not None:
+            logger.warning('Action id "%s" failed: %r', self._ident, error)
+            return _FAILURE
+        result = task.result()
+        if isinstance(result, oh_behave.ExecuteResult):
+            return _SUCCESS if result is _SUCCESS else _FAILURE
+        if result:
+            return _SUCCESS
+        return _FAILURE
+
+    def _reset(self):
+        task = self._tasks.pop(_performer(self), None)
+        if task is not None:
+            task.cancel()
+
+    def _failed(self):
+        pass
+    def _success(self):
+        pass
+
+class ActionOffload(Action):
+    """
+    Action running blocking work on a thread pool
+
+    The first execution submits work() to the executor, an
+    offload.BoundedExecutor shared by default, and returns ready until it
+    is done. It then succeeds if work() returned ExecuteResult.success or
+    a true value. If work() raised, the action fails and keeps the
+    exception in errors under the actor that executed it. While the
+    executor is full the action stays ready and submits again on the next
+    tick.
+
+    The work is function(action) when given, or the work() method of
+    subclasses. Every actor executing the action submits work of its own,
+    and resetting only cancels the executing actor's.
+    """
+    __slots__ = ('_function', '_executor', '_futures', 'errors')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function = kwargs.get('function', None)
+        self._executor = kwargs.get('executor', None)
+        # Keyed by actor, None when the action has no actor
+        self._futures = {}
+        self.errors = {}
+
+    def work(self):
+        """
+        Blocking work of the action, run in a worker thread
+        """
+        if self._function is None:
+            raise NotImplementedError('ActionOffload needs a function or a work() method')
+        return self._function(self)
+
+    def _execute(self):
+        performer = _performer(self)
+        future = self._futures.get(performer)
+        if future is None:
+            executor = self._executor
+            if executor is None:
+                executor = offload.get_default_executor()
+            self.errors.pop(performer, None)
+            future = executor.try_submit(self.work)
+            if future is not None:
+                self._futures[performer] = future
+            return _READY
+        if not future.done():
+            return _READY
+        del self._futures[performer]
+        if future.cancelled():
+            return _FAILURE
+        error = future.exception()
+        if error is not None:
+            self.errors[performer] = error
+            logger.warning('Action id "%s" failed: %r', self._ident, error)
+            return _FAILURE
+        result = future.result()
+        if isinstance(result, oh_behave.ExecuteResult):
+            return _SUCCESS if result is _SUCCESS else _FAILURE
+        if result:
+            return _SUCCESS
+        return _FAILURE
+
+    def _reset(self):
+        performer = _performer(self)
+        future = self._futures.pop(performer, None)
+        if future is not None:
+            future.cancel()
+        self.errors.pop(performer, None)
+
     def _failed(self):
         pass
     def _success(self):
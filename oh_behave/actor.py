@@ -1,11 +1,39 @@
 """Actor module"""
+import contextlib
+import contextvars
 import logging
 import oh_behave
+from oh_behave import blackboard
 
 logger = logging.getLogger(__name__)
 
+# The actor whose tree is running, so that nodes and actions shared between
+# actors act on behalf of the right one
+_executing = contextvars.ContextVar('executing_actor', default=None)
+
+def get_executing():
+    """
+    Returns the actor being executed, None outside of Actor.execute
+    """
+    return _executing.get()
+
+@contextlib.contextmanager
+def executing(a):
+    """
+    Context manager making a the actor being executed, for work done on its
+    behalf outside of Actor.execute
+    """
+    token = _executing.set(a)
+    try:
+        yield a
+    finally:
+        _executing.reset(token)
+
 class Actor:
     """Represents a character in the world"""
+    __slots__ = ('name', '_rootnode', '_sleep_ticks', '_sleepers', '_waits', '_awake',
+                 '_blackboard')
+
     def __init__(self, *args, **kwargs):
         try:
             self.name = kwargs['name']
@@ -15,6 +43,14 @@ class Actor:
             self._rootnode = kwargs['rootnode']
         except KeyError:
             self._rootnode = None
+        self._sleep_ticks = 0
+        self._sleepers = []
+        self._waits = []
+        self._awake = False
+        values = kwargs.get('blackboard', None)
+        if isinstance(values, dict):
+            values = blackboard.Blackboard(values)
+        self._blackboard = values
         logging.info('Constructed actor name "%s"', self.name)
 
 
@@ -22,10 +58,18 @@ class Actor:
         """
         Run the actor's root behavior tree node
         """
-        logger.info('Actor "%s" running root node',self.name)
-        if self._rootnode:
-            ret = self._rootnode.execute()
-            logger.info('Actor "%s" returns status "%s"', self.name, ret)
+        if self._sleep_ticks:
+            self._sleep_ticks = 0
+            self._sleepers.clear()
+        if self._waits:
+            self._waits.clear()
+        self._awake = False
+        if self._rootnode is not None:
+            token = _executing.set(self)
+            try:
+                ret = self._rootnode.execute()
+            finally:
+                _executing.reset(token)
         else:
             ret = None
             logger.warning('Actor "%s" does not have root node', self.name)
@@ -37,3 +81,81 @@ class Actor:
         """
         self._rootnode = node
 
+    def sleep(self, ticks, sleeper):
+        """
+        Ask the scheduler running the actor not to tick it for the next
+        ticks frames, only valid for the current tick
+
+        When several sleeps are requested the shortest one wins. If the
+        actor is parked, sleeper.skip() is called with the number of frames
+        actually skipped when it wakes up. Ignored after stay_awake().
+        """
+        if self._awake:
+            return
+        if not self._sleep_ticks or ticks < self._sleep_ticks:
+            self._sleep_ticks = ticks
+        self._sleepers.append(sleeper)
+
+    def stay_awake(self):
+        """
+        Cancel the sleeps asked for this tick, and any asked later in it
+        """
+        self._awake = True
+        self._sleep_ticks = 0
+        self._sleepers.clear()
+        self._waits.clear()
+
+    def wait(self, key):
+        """
+        Ask the scheduler running the actor not to tick it again until key
+        of its blackboard changes, only valid for the current tick
+
+        Combined with sleep() the actor is woken by whichever comes first.
+        Ignored after stay_awake().
+        """
+        if self._awake:
+            return
+        self._waits.append(key)
+
+    def get_waits(self):
+        """
+        Returns the blackboard keys the actor asked to wait for this tick
+        """
+        return self._waits
+
+    def count_sleepers(self):
+        """
+        Returns the number of sleeps and waits asked for this tick
+        """
+        return len(self._sleepers) + len(self._waits)
+
+    def get_sleep(self):
+        """
+        Returns the number of frames the actor asked to sleep for this tick
+        """
+        return self._sleep_ticks
+
+    def wake(self, skipped):
+        """
+        Tell the sleepers how many frames were skipped while parked
+        """
+        for sleeper in self._sleepers:
+            sleeper.skip(skipped)
+        self._sleep_ticks = 0
+        self._sleepers.clear()
+        self._waits.clear()
+
+    def get_rootnode(self):
+        """
+        Returns the actor's root behavior tree node
+        """
+        return self._rootnode
+
+    def get_blackboard(self):
+        """
+        Returns the actor's blackboard, created on first use
+        """
+        if self._blackboard is None:
+            self._blackboard = blackboard.Blackboard()
+        return self._blackboard
+
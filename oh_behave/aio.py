@@ -0,0 +1,58 @@
+"""Module for ticking actors from an asyncio event loop
+
+Each actor runs as its own task, ticking once per interval seconds and
+yielding to the event loop between ticks, so that oh_behave.action.ActionAsync
+coroutines make progress while other actors keep running.
+"""
+
+import asyncio
+import logging
+import oh_behave
+
+logger = logging.getLogger(__name__)
+
+async def run_actor(a, interval=0, max_ticks=None):
+    """
+    Tick actor a until it returns success or failure, or max_ticks ticks
+    have run, returns its last oh_behave.ExecuteResult
+
+    Ticks the actor asked to sleep for (see Actor.sleep) are skipped
+    without executing it.
+    """
+    ready = oh_behave.ExecuteResult.ready
+    status = ready
+    ticks = 0
+    while status is ready and (max_ticks is None or ticks < max_ticks):
+        status = a.execute()
+        ticks += 1
+        if status is not ready:
+            break
+        skipped = a.get_sleep()
+        if max_ticks is not None:
+            skipped = min(skipped, max_ticks - ticks)
+        await asyncio.sleep(interval * (skipped + 1))
+        if skipped:
+            a.wake(skipped)
+            ticks += skipped
+    return status
+
+async def run_actors(actors, interval=0, max_ticks=None):
+    """
+    Run every actor in actors as a task until they are all finished,
+    returns their last oh_behave.ExecuteResult in the same order
+
+    An actor raising an exception does not stop the others, its result is
+    the exception.
+    """
+    tasks = [asyncio.ensure_future(run_actor(a, interval, max_ticks)) for a in actors]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for a, result in zip(actors, results):
+        if isinstance(result, BaseException):
+            logger.error('Actor "%s" raised %r', a.name, result)
+    return results
+
+def run(actors, interval=0, max_ticks=None):
+    """
+    Run actors in a new event loop, see run_actors
+    """
+    return asyncio.run(run_actors(actors, interval, max_ticks))
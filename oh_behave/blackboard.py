@@ -0,0 +1,130 @@
+"""Module for the key value store shared by the nodes of an actor
+
+Every key of a blackboard owns a slot in a flat list of values. A slot's
+type is fixed when it is declared, or by the first value stored in it, and
+storing a value of another type raises TypeError. Integers are accepted
+in float slots.
+
+Callbacks can subscribe to a key and are called when its value changes,
+so that nodes depending on a key only do work when it does. Every key also
+has a version counting its changes, and objects shared between the actors
+can remember a result per blackboard, see remember().
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Blackboard:
+    """Typed key value store with change notifications"""
+    __slots__ = ('_slots', '_values', '_types', '_versions', '_subscribers', '_memo')
+
+    def __init__(self, values=None):
+        self._slots = {}
+        self._values = []
+        self._types = []
+        self._versions = []
+        self._subscribers = {}
+        self._memo = {}
+        if values is not None:
+            for key, value in values.items():
+                self.set(key, value)
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    def __len__(self):
+        return len(self._slots)
+
+    def keys(self):
+        """
+        Returns the keys of the blackboard
+        """
+        return self._slots.keys()
+
+    def declare(self, key, slottype, default=None):
+        """
+        Add key with a slot of type slottype holding default
+        """
+        if key in self._slots:
+            raise KeyError('Key "{0}" is already declared'.format(key))
+        self._slots[key] = len(self._values)
+        self._values.append(default)
+        self._types.append(slottype)
+        self._versions.append(1)
+
+    def get_type(self, key):
+        """
+        Returns the type of the slot of key, None until it is known
+        """
+        return self._types[self._slots[key]]
+
+    def version(self, key):
+        """
+        Returns the number of times key was declared or changed, 0 if it
+        has no slot
+        """
+        slot = self._slots.get(key)
+        if slot is None:
+            return 0
+        return self._versions[slot]
+
+    def get(self, key, default=None):
+        """
+        Returns the value of key, default if it has no slot
+        """
+        slot = self._slots.get(key)
+        if slot is None:
+            return default
+        return self._values[slot]
+
+    def set(self, key, value):
+        """
+        Store value under key, notifying subscribers if it changed
+        """
+        slot = self._slots.get(key)
+        if slot is None:
+            self.declare(key, None if value is None else type(value))
+            slot = self._slots[key]
+        slottype = self._types[slot]
+        if value is not None:
+            if slottype is None:
+                self._types[slot] = type(value)
+            elif type(value) is not slottype and not (
+                    slottype is float and type(value) is int):
+                raise TypeError('Key "{0}" holds {1}, not {2}'.format(
+                        key, slottype.__name__, type(value).__name__))
+        old = self._values[slot]
+        self._values[slot] = value
+        if old != value:
+            self._versions[slot] += 1
+            for callback in self._subscribers.get(key, ()):
+                callback(key, value)
+
+    def subscribe(self, key, callback):
+        """
+        Call callback(key, value) whenever the value of key changes
+        """
+        self._subscribers.setdefault(key, []).append(callback)
+
+    def unsubscribe(self, key, callback):
+        """
+        Stop calling callback for changes of key
+        """
+        callbacks = self._subscribers.get(key)
+        if callbacks and callback in callbacks:
+            callbacks.remove(callback)
+            if not callbacks:
+                del self._subscribers[key]
+
+    def remember(self, owner, memo):
+        """
+        Store memo for owner, an object shared between the actors
+        """
+        self._memo[owner] = memo
+
+    def recall(self, owner):
+        """
+        Returns the memo stored for owner, None if there is none
+        """
+        return self._memo.get(owner)
@@ -0,0 +1,218 @@
+"""Module for caching parsed object definitions in a binary file
+
+The cache holds a fully linked library: every reference between the
+entries of a definition file is resolved to the index of the entry it
+names, so loading needs neither the source JSON nor the lookups by id of
+DataParser.build_objects. It is read back through a memory mapping and is
+only used when the hash of the source file matches the one it was written
+for.
+
+Layout, all integers little endian:
+    header
+    link records, LINK.size bytes each, one per entry: type code, rootnode,
+    decoratee, action and actor entry indices, first child and child count
+    child table, one u32 entry index per child reference
+    definitions, a marshal dump of (type names, list of entry values) in
+    which equal strings are stored once
+
+References to ids the file does not define are stored as UNRESOLVED, and
+absent ones as NONE. The values are already decoded, marshal is only
+readable by the Python version that wrote it so its format version is part
+of the header.
+"""
+
+import array
+import hashlib
+import logging
+import marshal
+import mmap
+import os
+import struct
+import sys
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'OHBC'
+VERSION = 2
+
+# magic, version, marshal version, source digest, entry count, child count,
+# definitions offset
+HEADER = struct.Struct('<4sHH32sIIQ')
+# type code, rootnode, decoratee, action, actor, first child, child count
+LINK_FIELDS = 7
+LINK = struct.Struct('<{0}I'.format(LINK_FIELDS))
+NONE = 0xFFFFFFFF
+UNRESOLVED = 0xFFFFFFFE
+
+# Reference fields of the link records, in order
+REFERENCE_FIELDS = ('rootnode', 'decoratee', 'action', 'actor')
+
+class Library:
+    """
+    Definitions read from a cache
+
+    definitions lists the values of every entry. links holds the link
+    records back to back, LINK_FIELDS integers per entry, and children the
+    child table they index into. classtypes lists the type names the type
+    codes stand for.
+    """
+    def __init__(self, classtypes, definitions, links, children):
+        self.classtypes = classtypes
+        self.definitions = definitions
+        self.links = links
+        self.children = children
+
+    def __len__(self):
+        return len(self.definitions)
+
+def source_hash(filepath):
+    """
+    Returns the sha256 digest of the file at filepath
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as source:
+        for block in iter(lambda: source.read(1 << 20), b''):
+            digest.update(block)
+    return digest.digest()
+
+def _reference(ident, indices):
+    """Returns the link record value for a reference to ident"""
+    if not isinstance(ident, str):
+        return NONE
+    return indices.get(ident, UNRESOLVED)
+
+def _u32_bytes(values):
+    """Returns values packed as little endian u32"""
+    packed = array.array('I', values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+def _u32_array(buf):
+    """Returns an array of the little endian u32 in buf"""
+    unpacked = array.array('I')
+    unpacked.frombytes(buf)
+    if sys.byteorder == 'big':
+        unpacked.byteswap()
+    return unpacked
+
+def _check_links(classtypes, links, children, entry_count):
+    """
+    Raises ValueError when a link record or child reference points outside
+    the tables it indexes
+    """
+    codes = links[0::LINK_FIELDS]
+    if codes and max(codes) >= len(classtypes):
+        raise ValueError('Type code out of range')
+    references = [links[field::LINK_FIELDS] for field in range(1, len(REFERENCE_FIELDS) + 1)]
+    references.append(children)
+    for indices in references:
+        if any(entry_count <= index < UNRESOLVED for index in indices):
+            raise ValueError('Entry index out of range')
+    firsts = links[LINK_FIELDS - 2::LINK_FIELDS]
+    counts = links[LINK_FIELDS - 1::LINK_FIELDS]
+    for first, count in zip(firsts, counts):
+        if count and first + count > len(children):
+            raise ValueError('Child range out of range')
+
+def write_cache(cachepath, entries, digest):
+    """
+    Write the values of entries, reader.ObjectEntry objects, to cachepath
+    for a source file with the given digest
+    """
+    # Like DataParser, the last entry defining an id is the one it names
+    indices = {entry.ident : index for index, entry in enumerate(entries)}
+
+    strings = {}
+    def intern(value):
+        if isinstance(value, str):
+            return strings.setdefault(value, value)
+        if isinstance(value, list):
+            return [intern(item) for item in value]
+        return value
+
+    classtypes = []
+    codes = {}
+    links = []
+    children = []
+    definitions = []
+    for entry in entries:
+        definitions.append({intern(key) : intern(value) for key, value in entry.values.items()})
+        code = codes.get(entry.classtype)
+        if code is None:
+            code = codes[entry.classtype] = len(classtypes)
+            classtypes.append(entry.classtype)
+        links.append(code)
+        links.extend(_reference(entry.values.get(field), indices) for field in REFERENCE_FIELDS)
+        childnodes = entry.values.get('childnodes')
+        if isinstance(childnodes, list) and childnodes:
+            links.extend((len(children), len(childnodes)))
+            children.extend(_reference(child, indices) for child in childnodes)
+        else:
+            links.extend((NONE, 0))
+
+    data = marshal.dumps((classtypes, definitions), marshal.version)
+    definitions_offset = HEADER.size + 4 * (len(links) + len(children))
+    temppath = cachepath + '.tmp'
+    with open(temppath, 'wb') as output:
+        output.write(HEADER.pack(MAGIC, VERSION, marshal.version, digest, len(entries),
+                                 len(children), definitions_offset))
+        output.write(_u32_bytes(links))
+        output.write(_u32_bytes(children))
+        output.write(data)
+    os.replace(temppath, cachepath)
+    logger.info("Wrote %d entries to cache '%s'", len(entries), cachepath)
+
+def read_library(cachepath, digest):
+    """
+    Returns the Library stored in cachepath, or None if the cache is
+    missing, unreadable or was written for a source file with a different
+    digest
+    """
+    try:
+        with open(cachepath, 'rb') as source:
+            if os.fstat(source.fileno()).st_size < HEADER.size:
+                return None
+            mapping = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    except OSError:
+        return None
+
+    view = memoryview(mapping)
+    try:
+        (magic, version, marshal_version, cached_digest, entry_count, child_count,
+         definitions_offset) = HEADER.unpack_from(mapping, 0)
+        if magic != MAGIC or version != VERSION or marshal_version != marshal.version:
+            logger.warning("Ignoring cache '%s' with unknown format", cachepath)
+            return None
+        if cached_digest != digest:
+            logger.info("Cache '%s' is out of date", cachepath)
+            return None
+
+        links_end = HEADER.size + LINK.size * entry_count
+        if links_end + 4 * child_count != definitions_offset or len(mapping) < definitions_offset:
+            raise ValueError('Inconsistent table sizes')
+        links = _u32_array(view[HEADER.size:links_end])
+        children = _u32_array(view[links_end:definitions_offset])
+        classtypes, definitions = marshal.loads(view[definitions_offset:])
+        if len(definitions) != entry_count:
+            raise ValueError('Inconsistent entry count')
+        _check_links(classtypes, links, children, entry_count)
+    except (struct.error, ValueError, EOFError, TypeError, IndexError):
+        logger.warning("Ignoring corrupt cache '%s'", cachepath)
+        return None
+    finally:
+        view.release()
+        mapping.close()
+
+    logger.info("Read %d entries from cache '%s'", len(definitions), cachepath)
+    return Library(classtypes, definitions, links, children)
+
+def read_cache(cachepath, digest):
+    """
+    Returns the list of object definition values stored in cachepath, or
+    None if the cache cannot be used, see read_library
+    """
+    library = read_library(cachepath, digest)
+    if library is None:
+        return None
+    return library.definitions
@@ -0,0 +1,206 @@
+"""Module for generating specialized Python code from compiled programs
+
+The interpreter in compiler.Program.execute looks up the opcode of every
+node it visits. The code generated here has the shape of the tree baked in
+instead: nested ifs on the cursor of each composite, decorator chains folded
+into at most one negation, ActionTimed leaves inlined with their time goal
+as a constant and direct calls to every other leaf.
+
+Generated code is cached by program structure, trees of the same shape
+share one code object and only differ by the leaf objects they call.
+"""
+
+import logging
+import oh_behave
+from oh_behave import compiler
+
+logger = logging.getLogger(__name__)
+
+# Composites nested deeper than this inside one generated function are moved
+# into a function of their own, which keeps the indentation within what the
+# Python parser accepts
+BLOCK_DEPTH = 32
+
+_RESULTS = (oh_behave.ExecuteResult.failure,
+            oh_behave.ExecuteResult.ready,
+            oh_behave.ExecuteResult.success)
+
+_code_cache = {}
+
+def _structure(program):
+    """Returns the key identifying programs that generate the same code"""
+    return (program.opcodes, program.child_start, program.child_count, program.params,
+            tuple(target is not None for target in program.notify))
+
+class _Generator:
+    """Writes the source of the factory function for one program"""
+    def __init__(self, program):
+        self.program = program
+        self.lines = []
+        self.blocks = []
+        self.targets = set()
+        self.notify = set()
+
+    def emit(self, node, depth, indent):
+        """Write code leaving the status of running node in s"""
+        program = self.program
+        opcodes = program.opcodes
+        inverts = 0
+        while opcodes[node] == compiler.OP_DECORATOR or opcodes[node] == compiler.OP_INVERT:
+            if opcodes[node] == compiler.OP_INVERT:
+                inverts += 1
+            node = program.child_start[node]
+        op = opcodes[node]
+        pad = '    ' * indent
+        if op <= compiler.OP_SELECTOR:
+            if depth >= BLOCK_DEPTH:
+                self.blocks.append(node)
+                self.lines.append('{0}s = _block{1}(state)'.format(pad, node))
+            else:
+                self.emit_composite(node, op, depth, indent)
+        elif op == compiler.OP_TIMED:
+            self.emit_timed(node, indent)
+        else:
+            self.targets.add(node)
+            self.lines.extend((
+                '{0}r = target{1}.execute()'.format(pad, node),
+                '{0}s = {1} if r is success else {2} if r is failure else {3}'.format(
+                        pad, compiler.SUCCESS, compiler.FAILURE, compiler.READY)))
+        if inverts % 2:
+            self.lines.append('{0}s = -s'.format(pad))
+
+    def emit_timed(self, node, indent):
+        """Write the inlined body of an ActionTimed leaf"""
+        pad = '    ' * indent
+        goal = self.program.params[node]
+        header = self.program.header
+        self.lines.extend((
+            '{0}t = state[{1}]'.format(pad, node),
+            '{0}if t >= {1}:'.format(pad, goal),
+            '{0}    s = {1}'.format(pad, compiler.SUCCESS),
+            '{0}else:'.format(pad),
+            '{0}    s = {1}'.format(pad, compiler.READY),
+            '{0}    if t < {1}:'.format(pad, goal - 1),
+            '{0}        state[{1}] = {2} - t'.format(pad, header + compiler.SLOT_SLEEP, goal - 1),
+            '{0}        state[{1}] = {2}'.format(pad, header + compiler.SLOT_SLEEPER, node),
+            '{0}state[{1}] = t + 1'.format(pad, node)))
+
+    def emit_composite(self, node, op, depth, indent):
+        """Write one branch per child of a sequence or selector"""
+        program = self.program
+        pad = '    ' * indent
+        if op == compiler.OP_SEQUENCE:
+            advance, finish = compiler.SUCCESS, compiler.SUCCESS
+            on_advance, on_other = 'success', 'failed'
+        else:
+            advance, finish = compiler.FAILURE, compiler.FAILURE
+            on_advance, on_other = 'failed', 'success'
+        start = program.child_start[node]
+        count = program.child_count[node]
+
+        if count:
+            self.lines.append('{0}c = state[{1}]'.format(pad, node))
+            for cursor in range(count):
+                child = start + cursor
+                self.lines.append('{0}{1} c == {2}:'.format(
+                        pad, 'if' if cursor == 0 else 'elif', cursor))
+                self.emit(child, depth + 1, indent + 1)
+                notify = program.notify[child] is not None
+                if notify:
+                    self.notify.add(child)
+                self.lines.append('{0}    if s == {1}:'.format(pad, advance))
+                if notify:
+                    self.lines.append('{0}        notify{1}.{2}()'.format(pad, child, on_advance))
+                self.lines.append('{0}        state[{1}] = {2}'.format(pad, node, cursor + 1))
+                if cursor + 1 < count:
+                    self.lines.append('{0}        s = {1}'.format(pad, compiler.READY))
+                if notify:
+                    self.lines.append('{0}    elif s == {1}:'.format(pad, -advance))
+                    self.lines.append('{0}        notify{1}.{2}()'.format(pad, child, on_other))
+            self.lines.append('{0}else:'.format(pad))
+            self.lines.append('{0}    s = {1}'.format(pad, finish))
+        else:
+            self.lines.append('{0}s = {1}'.format(pad, finish))
+
+        mask = program.params[node]
+        if mask == compiler.RESET_ON_SUCCESS | compiler.RESET_ON_FAILURE:
+            condition = 's'
+        elif mask == compiler.RESET_ON_SUCCESS:
+            condition = 's == {0}'.format(compiler.SUCCESS)
+        elif mask == compiler.RESET_ON_FAILURE:
+            condition = 's == {0}'.format(compiler.FAILURE)
+        else:
+            return
+        self.lines.append('{0}if {1}:'.format(pad, condition))
+        self.lines.append('{0}    reset(state, {1})'.format(pad, node))
+
+    def source(self):
+        """Returns the source of a module defining _factory"""
+        header = self.program.header
+        self.lines.append('    def execute(state):')
+        self.emit(0, 0, 2)
+        self.lines.append('        state[{0}] = 0'.format(header + compiler.SLOT_RESUME))
+        self.lines.append('        return results[s + 1]')
+        body = self.lines
+
+        # Blocks may queue further blocks while being written
+        index = 0
+        blocks = []
+        while index < len(self.blocks):
+            node = self.blocks[index]
+            self.lines = ['    def _block{0}(state):'.format(node)]
+            self.emit(node, 0, 2)
+            self.lines.append('        return s')
+            blocks.extend(self.lines)
+            index += 1
+
+        lines = ['def _factory(targets, notify, reset, results):',
+                 '    failure = results[0]',
+                 '    success = results[2]']
+        lines.extend('    target{0} = targets[{0}]'.format(node) for node in sorted(self.targets))
+        lines.extend('    notify{0} = notify[{0}]'.format(node) for node in sorted(self.notify))
+        lines.extend(blocks)
+        lines.extend(body)
+        lines.append('    return execute')
+        return '\n'.join(lines) + '\n'
+
+def generate_source(program):
+    """
+    Returns the Python source generated for program
+
+    The source defines _factory(targets, notify, reset, results), which
+    returns the execute(state) function of the program
+    """
+    return _Generator(program).source()
+
+def generate(program):
+    """
+    Returns a function running one tick of program on a state array, the
+    same way program.execute does
+    """
+    key = _structure(program)
+    code = _code_cache.get(key)
+    if code is None:
+        code = compile(generate_source(program),
+                       '<oh_behave.codegen {0}>'.format(program.get_id()), 'exec')
+        _code_cache[key] = code
+        logger.info('Generated code for node id "%s"', program.get_id())
+    namespace = {}
+    exec(code, namespace)
+    return namespace['_factory'](program.targets, program.notify, program.reset, _RESULTS)
+
+def specialize(program):
+    """
+    Make program run its ticks through generated code, returns program
+
+    Instances of the program, existing and new, use the generated code
+    from their next tick on.
+    """
+    program.execute = generate(program)
+    return program
+
+def clear_cache():
+    """
+    Forget every generated code object
+    """
+    _code_cache.clear()
@@ -0,0 +1,535 @@
+"""Module for compiling behavior trees into flat programs
+
+A compiled program stores the tree as parallel arrays indexed by node
+position (opcode, first child, child count, parent) and runs a tick with a
+single non-recursive loop instead of calling execute() on every node.
+
+Programs are immutable and can be shared by any number of actors, the
+progress of each actor lives in a ProgramInstance.
+"""
+
+import array
+import copy
+import logging
+import oh_behave
+from oh_behave import action
+from oh_behave import actor
+from oh_behave import behave
+
+logger = logging.getLogger(__name__)
+
+OP_SEQUENCE = 0
+OP_SELECTOR = 1
+OP_DECORATOR = 2
+OP_INVERT = 3
+OP_ACTION = 4
+OP_NODE = 5
+OP_TIMED = 6
+
+# Statuses are plain integers inside programs, ExecuteResult members are
+# only returned by execute()
+FAILURE = oh_behave.ExecuteResult.failure.value
+READY = oh_behave.ExecuteResult.ready.value
+SUCCESS = oh_behave.ExecuteResult.success.value
+
+# Reset policy masks stored as the parameter of composite nodes
+RESET_ON_SUCCESS = 1
+RESET_ON_FAILURE = 2
+
+_RESET_MASKS = {
+    behave.ResetPolicy.never : 0,
+    behave.ResetPolicy.on_success : RESET_ON_SUCCESS,
+    behave.ResetPolicy.on_failure : RESET_ON_FAILURE,
+    behave.ResetPolicy.always : RESET_ON_SUCCESS | RESET_ON_FAILURE
+}
+
+# Slots of the state header following the node slots
+SLOT_SLEEP = 0
+SLOT_SLEEPER = 1
+SLOT_RESUME = 2
+HEADER_SIZE = 3
+
+# Indexed by status + 1
+_RESULTS = (oh_behave.ExecuteResult.failure,
+            oh_behave.ExecuteResult.ready,
+            oh_behave.ExecuteResult.success)
+_RESULT_FAILURE = oh_behave.ExecuteResult.failure
+_RESULT_SUCCESS = oh_behave.ExecuteResult.success
+
+_OPCODES = {
+    behave.NodeSequence : OP_SEQUENCE,
+    behave.NodeSelector : OP_SELECTOR,
+    behave.NodeDecorator : OP_DECORATOR,
+    behave.NodeDecoratorInvert : OP_INVERT,
+    behave.NodeLeafAction : OP_ACTION
+}
+
+class CompileException(ValueError):
+    pass
+
+class Program:
+    """
+    Flat, array backed representation of a behavior tree
+
+    Node 0 is the root. Children of a composite are stored contiguously
+    starting at child_start, so child n of node i is child_start[i] + n.
+    The program holds no execution state, every node owns one integer slot
+    in the state array passed to execute(): the cursor of a composite or the
+    tick counter of an ActionTimed leaf.
+
+    params holds the time goal of ActionTimed leaves and the reset policy
+    mask of composites. Composites that reset themselves keep the indices
+    of their whole subtree in subtrees.
+
+    The node slots are followed by a header of HEADER_SIZE slots starting
+    at index header: the number of ticks a waiting ActionTimed leaf could
+    be skipped for, the index of that leaf, and the node the next tick
+    resumes from. Ready results leave every ancestor untouched, so a tick
+    that ends on ready records where it stopped and the next one starts
+    there instead of descending from the root again.
+    """
+    def __init__(self, ids, opcodes, child_start, child_count, parents, targets, notify,
+                 params, initial_state, subtrees):
+        self.ids = ids
+        self.opcodes = opcodes
+        self.child_start = child_start
+        self.child_count = child_count
+        self.parents = parents
+        self.targets = targets
+        self.notify = notify
+        self.params = params
+        self.initial_state = initial_state
+        self.subtrees = subtrees
+        self.header = len(opcodes)
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def get_id(self):
+        """
+        Returns the id of the root node
+        """
+        return self.ids[0]
+
+    def new_state(self):
+        """
+        Returns a fresh state array for running the program
+        """
+        state = array.array('q', self.initial_state)
+        state.extend((0,) * HEADER_SIZE)
+        return state
+
+    def instantiate(self, actor=None):
+        """
+        Returns a ProgramInstance running the program with its own state
+        """
+        return ProgramInstance(self, actor)
+
+    def reset(self, state, node=0):
+        """
+        Rewind node and everything below it to their initial state
+        """
+        initial_state = self.initial_state
+        targets = self.targets
+        subtree = self.subtrees[node]
+        if subtree is None:
+            subtree = _subtree(self.opcodes, self.child_start, self.child_count, node)
+        for index in subtree:
+            state[index] = initial_state[index]
+            if targets[index] is not None:
+                targets[index].reset()
+
+    def execute(self, state):
+        """
+        Run one tick of the program on state, returns an oh_behave.ExecuteResult
+        """
+        opcodes = self.opcodes
+        child_start = self.child_start
+        child_count = self.child_count
+        params = self.params
+        header = self.header
+
+        # Walk down to the node doing work this tick
+        node = state[header + SLOT_RESUME]
+        while True:
+            op = opcodes[node]
+            if op <= OP_SELECTOR:
+                cursor = state[node]
+                if cursor < child_count[node]:
+                    node = child_start[node] + cursor
+                    continue
+                status = SUCCESS if op == OP_SEQUENCE else FAILURE
+                if params[node] & (RESET_ON_SUCCESS if status == SUCCESS else RESET_ON_FAILURE):
+                    self.reset(state, node)
+                break
+            elif op <= OP_INVERT:
+                node = child_start[node]
+            elif op == OP_TIMED:
+                time = state[node]
+                if time >= params[node]:
+                    status = SUCCESS
+                else:
+                    status = READY
+                    idle = params[node] - time - 1
+                    if idle > 0:
+                        state[header + SLOT_SLEEP] = idle
+                        state[header + SLOT_SLEEPER] = node
+                state[node] = time + 1
+                break
+            else:
+                result = self.targets[node].execute()
+                if result is _RESULT_SUCCESS:
+                    status = SUCCESS
+                elif result is _RESULT_FAILURE:
+                    status = FAILURE
+                else:
+                    status = READY
+                break
+
+        # Ready passes unchanged through every node type, so only completed
+        # results need to be propagated back up
+        if status != READY:
+            parents = self.parents
+            notify = self.notify
+            while node:
+                parent = parents[node]
+                op = opcodes[parent]
+                if op == OP_SEQUENCE:
+                    if status == SUCCESS:
+                        if notify[node] is not None:
+                            notify[node].success()
+                        cursor = state[parent] + 1
+                        state[parent] = cursor
+                        if cursor < child_count[parent]:
+                            status = READY
+                            node = parent
+                            break
+                    elif notify[node] is not None:
+                        notify[node].failed()
+                elif op == OP_SELECTOR:
+                    if status == FAILURE:
+                        if notify[node] is not None:
+                            notify[node].failed()
+                        cursor = state[parent] + 1
+                        state[parent] = cursor
+                        if cursor < child_count[parent]:
+                            status = READY
+                            node = parent
+                            break
+                    elif notify[node] is not None:
+                        notify[node].success()
+                elif op == OP_INVERT:
+                    status = -status
+
+                # A composite parent reaching here has finished
+                if op <= OP_SELECTOR and params[parent] & (
+                        RESET_ON_SUCCESS if status == SUCCESS else RESET_ON_FAILURE):
+                    self.reset(state, parent)
+                node = parent
+
+        state[header + SLOT_RESUME] = node
+        return _RESULTS[status + 1]
+
+class ProgramInstance:
+    """
+    Per actor execution state of a shared Program
+
+    When given the actor it runs for, waiting ActionTimed leaves ask the
+    actor to sleep like the action objects do
+    """
+    __slots__ = ('program', 'state', 'actor')
+
+    def __init__(self, program, actor=None):
+        self.program = program
+        self.state = program.new_state()
+        self.actor = actor
+
+    def get_id(self):
+        """
+        Returns the id of the program's root node
+        """
+        return self.program.ids[0]
+
+    def execute(self):
+        """
+        Run one tick of the program, returns an oh_behave.ExecuteResult
+        """
+        state = self.state
+        status = self.program.execute(state)
+        slot = self.program.header + SLOT_SLEEP
+        if state[slot]:
+            if self.actor is not None:
+                self.actor.sleep(state[slot], self)
+            state[slot] = 0
+        return status
+
+    def skip(self, ticks):
+        """
+        Account for ticks skipped while the actor was parked
+        """
+        state = self.state
+        state[state[self.program.header + SLOT_SLEEPER]] += ticks
+
+    def reset(self):
+        """
+        Rewind the program to its initial state
+
+        The leaves are reset on behalf of the actor, so that actions keeping
+        state per actor leave that of the other instances alone
+        """
+        if self.actor is not None:
+            with actor.executing(self.actor):
+                self.program.reset(self.state)
+        else:
+            self.program.reset(self.state)
+        header = self.program.header
+        for slot in range(header, header + HEADER_SIZE):
+            self.state[slot] = 0
+
+def _subtree(opcodes, child_start, child_count, node):
+    """Returns the indices of node and all of its descendants"""
+    nodes = [node]
+    for index in nodes:
+        if opcodes[index] <= OP_INVERT:
+            start = child_start[index]
+            nodes.extend(range(start, start + child_count[index]))
+    return nodes
+
+def _opcode(node):
+    """Returns the opcode for a node, unknown node types run as opaque leaves"""
+    op = _OPCODES.get(type(node), OP_NODE)
+    # ActionTimed keeps nothing but a counter, which moves into the state
+    # array so that the leaf can be shared between actors
+    if op == OP_ACTION and type(node.get_action()) is action.ActionTimed:
+        op = OP_TIMED
+    return op
+
+def _children(node, op):
+    """Returns the nodes a compiled node descends into"""
+    if op <= OP_SELECTOR:
+        return node.get_children()
+    elif op <= OP_INVERT:
+        return [node.get_decoratee()]
+    return []
+
+def _check_acyclic(rootnode):
+    """Raises CompileException if a node is reachable from itself"""
+    on_path = set()
+    done = set()
+    stack = [(rootnode, iter(_children(rootnode, _opcode(rootnode))))]
+    on_path.add(id(rootnode))
+    while stack:
+        node, children = stack[-1]
+        for child in children:
+            if id(child) in on_path:
+                raise CompileException(
+                        'Node id "{0}" is its own ancestor'.format(child.get_id()))
+            if id(child) not in done:
+                on_path.add(id(child))
+                stack.append((child, iter(_children(child, _opcode(child)))))
+                break
+        else:
+            stack.pop()
+            on_path.discard(id(node))
+            done.add(id(node))
+
+def compile_tree(rootnode):
+    """
+    Lower the behavior tree starting at rootnode into a Program
+
+    Nodes are laid out breadth first so that siblings are contiguous. A node
+    object reachable through several parents is given one slot per
+    occurrence. Node types the compiler does not know about, including
+    subclasses of the built in nodes, are run by calling their execute()
+    """
+    _check_acyclic(rootnode)
+
+    nodes = [rootnode]
+    ids = []
+    opcodes = []
+    child_start = []
+    child_count = []
+    parents = [0]
+
+    index = 0
+    while index < len(nodes):
+        node = nodes[index]
+        op = _opcode(node)
+        children = _children(node, op)
+
+        ids.append(node.get_id())
+        opcodes.append(op)
+        child_start.append(len(nodes))
+        child_count.append(len(children))
+        nodes.extend(children)
+        parents.extend([index] * len(children))
+        index += 1
+
+    targets = []
+    params = []
+    initial_state = []
+    for node, op in zip(nodes, opcodes):
+        if op == OP_ACTION:
+            targets.append(node.get_action())
+        elif op == OP_NODE:
+            targets.append(node)
+        else:
+            targets.append(None)
+        if op == OP_TIMED:
+            params.append(node.get_action().timegoal)
+            initial_state.append(1)
+        elif op <= OP_SELECTOR:
+            params.append(_RESET_MASKS[node.get_reset_policy()])
+            initial_state.append(0)
+        else:
+            params.append(0)
+            initial_state.append(0)
+
+    # success() and failed() pass through decorators down to whatever they
+    # wrap and are no-ops on the built in composites
+    notify = []
+    for index, op in enumerate(opcodes):
+        while op == OP_DECORATOR or op == OP_INVERT:
+            index = child_start[index]
+            op = opcodes[index]
+        notify.append(targets[index])
+
+    subtrees = []
+    for index, op in enumerate(opcodes):
+        if op <= OP_SELECTOR and params[index]:
+            subtrees.append(tuple(_subtree(opcodes, child_start, child_count, index)))
+        else:
+            subtrees.append(None)
+
+    logger.info('Compiled node id "%s" into %d instructions', ids[0], len(opcodes))
+    return Program(tuple(ids), tuple(opcodes), tuple(child_start), tuple(child_count),
+                   tuple(parents), tuple(targets), tuple(notify), tuple(params),
+                   tuple(initial_state), tuple(subtrees))
+
+def _node_children(node):
+    """Returns the objects node executes"""
+    if isinstance(node, behave.NodeComposite):
+        return node.get_children()
+    elif isinstance(node, behave.NodeDecorator):
+        decoratee = node.get_decoratee()
+        return [] if decoratee is None else [decoratee]
+    elif isinstance(node, behave.NodeLeafAction):
+        leaf_action = node.get_action()
+        return [] if leaf_action is None else [leaf_action]
+    return []
+
+def _keeps_state(node):
+    """
+    Returns whether executing node changes the state of node objects:
+    composites keep a cursor or results, ActionTimed a counter
+    """
+    pending = [node]
+    seen = set()
+    while pending:
+        node = pending.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if isinstance(node, (behave.NodeComposite, action.ActionTimed)):
+            return True
+        pending.extend(_node_children(node))
+    return False
+
+def unshared_target(program):
+    """
+    Returns the first target of program keeping state in node objects, or
+    None if the program can be run by several actors
+
+    Built in nodes are lowered and keep their state in the instances.
+    Subclasses of the built in composites, NodeParallel included, and of
+    ActionTimed run as opaque leaves and keep it in the objects, which the
+    instances would share.
+    """
+    for op, target in zip(program.opcodes, program.targets):
+        if op == OP_NODE and _keeps_state(target):
+            return target
+        if op == OP_ACTION and isinstance(target, action.ActionTimed):
+            return target
+    return None
+
+def check_shareable(program):
+    """
+    Raises CompileException if program cannot be run by several actors,
+    see unshared_target
+    """
+    target = unshared_target(program)
+    if target is not None:
+        raise CompileException(
+                'Node id "{0}" holds node id "{1}" keeping state of its own and cannot be '
+                'shared by several actors'.format(program.get_id(), target.get_id()))
+
+def _copy_state(obj):
+    """Returns a shallow copy of obj whose containers are copied as well"""
+    clone = copy.copy(obj)
+    names = [name for cls in type(obj).__mro__ for name in getattr(cls, '__slots__', ())]
+    names.extend(getattr(obj, '__dict__', ()))
+    for name in names:
+        value = getattr(clone, name, None)
+        if isinstance(value, (list, dict, set)):
+            setattr(clone, name, copy.copy(value))
+    return clone
+
+def private_tree(rootnode):
+    """
+    Returns a copy of the tree under rootnode for one more actor
+
+    Nodes and ActionTimed actions are copied along with their current
+    state, other actions keep their state per actor and are shared.
+    """
+    copies = {}
+    def copy_node(node):
+        clone = copies.get(id(node))
+        if clone is not None:
+            return clone
+        if isinstance(node, action.Action) and not isinstance(node, action.ActionTimed):
+            return node
+        clone = copies[id(node)] = _copy_state(node)
+        if isinstance(node, behave.NodeComposite):
+            clone._children = [copy_node(child) for child in node.get_children()]
+        elif isinstance(node, behave.NodeDecorator):
+            if node.get_decoratee() is not None:
+                clone._decoratee = copy_node(node.get_decoratee())
+        elif isinstance(node, behave.NodeLeafAction):
+            if node.get_action() is not None:
+                clone._action = copy_node(node.get_action())
+        return clone
+    return copy_node(rootnode)
+
+def compile_actors(objects):
+    """
+    Compile the root node of every actor in objects, as returned by
+    reader.DataParser.build_objects
+
+    Actors sharing a root node share a single Program and are each given
+    their own ProgramInstance. When the program cannot be shared, see
+    unshared_target, every actor but the first runs a program compiled
+    from its own private_tree. Returns a dictionary of programs keyed by
+    root node id, the shared or first one for each root.
+    """
+    programs = {}
+    shared = {}
+    for obj in objects.values():
+        if not isinstance(obj, actor.Actor):
+            continue
+        rootnode = obj.get_rootnode()
+        if rootnode is None:
+            continue
+        if isinstance(rootnode, ProgramInstance):
+            programs.setdefault(rootnode.get_id(), rootnode.program)
+            continue
+        program = shared.get(id(rootnode))
+        if program is None:
+            program = compile_tree(rootnode)
+            shared[id(rootnode)] = program
+            programs[program.get_id()] = program
+        elif unshared_target(program) is not None:
+            logger.info('Compiling a private copy of node id "%s" for actor "%s"',
+                        rootnode.get_id(), obj.name)
+            program = compile_tree(private_tree(rootnode))
+        obj.set_rootnode(program.instantiate(obj))
+    return programs
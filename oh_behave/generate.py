@@ -0,0 +1,74 @@
+"""Module generating synthetic behavior tree definitions
+
+Used by the benchmarks and as a fixture by the tests.
+"""
+
+import random
+
+# Relative weights of the node kinds picked above the last level
+DEFAULT_MIX = {
+    'NodeSequence' : 4,
+    'NodeSelector' : 3,
+    'NodeDecoratorInvert' : 1,
+    'NodeLeafAction' : 2
+}
+
+def generate_tree(rng, prefix, actor, depth, fanout, mix=None, max_timegoal=5,
+                  reset_policy='always'):
+    """
+    Returns (root id, definitions) for a random tree
+
+    Composites get between 1 and fanout children, every leaf is a
+    NodeLeafAction running its own ActionTimed. The root is always a
+    NodeSequence using reset_policy so that the tree can be ticked forever.
+    """
+    if mix is None:
+        mix = DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    definitions = []
+    count = [0]
+
+    def build(level, kind):
+        """Adds the definitions of a kind node at level and below, returns its id"""
+        count[0] += 1
+        ident = '{0}n{1}'.format(prefix, count[0])
+        if level == depth:
+            kind = 'NodeLeafAction'
+        values = {'id': ident, 'type': kind}
+        definitions.append(values)
+        if kind in ('NodeSequence', 'NodeSelector'):
+            values['childnodes'] = [build(level + 1, rng.choices(kinds, weights)[0])
+                                    for _ in range(rng.randint(1, fanout))]
+        elif kind == 'NodeDecoratorInvert':
+            values['decoratee'] = build(level + 1, rng.choices(kinds, weights)[0])
+        else:
+            values['action'] = ident + 'a'
+            definitions.append({'id': ident + 'a', 'type': 'ActionTimed', 'actor': actor,
+                                'timegoal': rng.randint(1, max_timegoal)})
+        return ident
+
+    root = build(0, 'NodeSequence')
+    definitions[0]['reset_policy'] = reset_policy
+    return root, definitions
+
+def generate_library(actors, depth, fanout, seed=0, mix=None, shared=False):
+    """
+    Returns the definitions of actors actors and their trees
+
+    With shared every actor uses the same tree, otherwise each actor gets
+    its own tree generated from the same seed.
+    """
+    definitions = []
+    shared_root = None
+    for index in range(actors):
+        ident = 'actor{0}'.format(index)
+        if shared and shared_root is not None:
+            root = shared_root
+        else:
+            rng = random.Random(seed)
+            root, tree = generate_tree(rng, 'a{0}_'.format(index), ident, depth, fanout, mix)
+            definitions.extend(tree)
+            shared_root = root
+        definitions.append({'id': ident, 'type': 'Actor', 'name': ident, 'rootnode': root})
+    return definitions
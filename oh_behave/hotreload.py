@@ -0,0 +1,263 @@
+"""Module for reloading object definitions into running actors
+
+A HotReloader remembers the definitions the current objects were built
+from. Given a parser holding the new definitions it builds only the
+entries that were added or changed, then patches the references held by
+unchanged objects so that they point at the new ones. Unchanged objects
+are kept along with their state: a sequence half way through its children
+carries on from the same child.
+
+Reloading happens in two steps. prepare() does all of the building and
+raises before anything is touched if the new definitions cannot be
+linked. apply() only swaps references, and is meant to be called between
+two ticks.
+
+Actors running a compiled program do not run the node objects, so the
+programs of those whose tree changed are compiled again from the new
+definitions. The slots of the nodes whose definitions did not change are
+copied over from the old program when the patch is applied, so those
+nodes carry on as the objects do. The walk down to the running node
+starts again from the root.
+"""
+
+import logging
+from oh_behave import action
+from oh_behave import actor
+from oh_behave import compiler
+
+logger = logging.getLogger(__name__)
+
+class ReloadReport:
+    """Ids of the entries added, changed, removed and relinked by a reload"""
+    def __init__(self):
+        self.added = []
+        self.changed = []
+        self.removed = []
+        self.relinked = []
+
+    def __len__(self):
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+class ReloadPatch:
+    """
+    Changes prepared by HotReloader.prepare, not yet visible to the actors
+    """
+    def __init__(self, reloader, definitions, objects, patches, report):
+        self._reloader = reloader
+        self._definitions = definitions
+        self._objects = objects
+        self._patches = patches
+        self.report = report
+        self.applied = False
+
+    def apply(self):
+        """
+        Swap the new objects into the running trees, returns the
+        ReloadReport
+        """
+        if self.applied:
+            return self.report
+        for patch in self._patches:
+            patch[0](*patch[1:])
+        objects = self._reloader.objects
+        for ident in self.report.removed:
+            objects.pop(ident, None)
+        objects.update(self._objects)
+        self._reloader._definitions = self._definitions
+        self.applied = True
+        logger.info('Reloaded %d added, %d changed and %d removed entries',
+                    len(self.report.added), len(self.report.changed), len(self.report.removed))
+        return self.report
+
+def _references(entry):
+    """Returns the ids entry links to, except the actor of an action"""
+    references = list(entry.childnodes)
+    references.extend(ref for ref in (entry.rootnode, entry.decoratee, entry.action) if ref)
+    return references
+
+def _reachable(entries, ident):
+    """Returns the ids reachable from the entry ident in entries"""
+    reachable = set()
+    pending = [ident]
+    while pending:
+        ident = pending.pop()
+        if ident in reachable or ident not in entries:
+            continue
+        reachable.add(ident)
+        pending.extend(_references(entries[ident]))
+    return reachable
+
+def _compile(parser, entries, rootnode, lookup, private=False):
+    """
+    Returns a Program for the tree under the entry rootnode as it will be
+    once the reload is applied
+
+    The nodes the compiler lowers are built anew from entries, since the
+    objects in lookup are only relinked by ReloadPatch.apply. Everything it
+    calls instead of lowering is taken from lookup, unless private is set:
+    every node and ActionTimed is then built anew for an actor that cannot
+    share them, see compiler.unshared_target.
+    """
+    scratch = dict(lookup)
+    built = []
+    for ident in _reachable(entries, rootnode):
+        entry = entries[ident]
+        node = entry.classtype.startswith('Node')
+        if not node and not private:
+            continue
+        obj = parser.build_entry(entry)
+        if private:
+            keep = node or isinstance(obj, action.ActionTimed)
+        else:
+            keep = compiler._opcode(obj) != compiler.OP_NODE
+        if keep:
+            scratch[ident] = obj
+            built.append(entry)
+    for entry in built:
+        parser.link_entry(entry, scratch)
+    return compiler.compile_tree(scratch[rootnode])
+
+def _carry_state(old, new, kept):
+    """
+    Copy the slots of the nodes with an id in kept from the ProgramInstance
+    old to the ProgramInstance new
+
+    A node shared within the tree has a slot per occurrence, occurrences
+    are matched in the order the programs list them.
+    """
+    positions = {}
+    for index, ident in enumerate(old.program.ids):
+        positions.setdefault(ident, []).append(index)
+    seen = {}
+    opcodes = new.program.opcodes
+    for index, ident in enumerate(new.program.ids):
+        occurrence = seen.get(ident, 0)
+        seen[ident] = occurrence + 1
+        previous = positions.get(ident, ())
+        if ident not in kept or occurrence >= len(previous):
+            continue
+        previous = previous[occurrence]
+        if old.program.opcodes[previous] == opcodes[index]:
+            new.state[index] = old.state[previous]
+
+class HotReloader:
+    """
+    Keeps objects, as returned by parser.build_objects, up to date with
+    new definitions
+    """
+    def __init__(self, parser, objects):
+        self.objects = objects
+        self._definitions = {entry.ident : entry.values for entry in parser.get_entries()}
+
+    def prepare(self, parser):
+        """
+        Build what changed between the current definitions and the entries
+        of parser, returns a ReloadPatch to apply
+        """
+        report = ReloadReport()
+        current = self._definitions
+        entries = parser.get_entries()
+        definitions = {entry.ident : entry.values for entry in entries}
+        report.removed = [ident for ident in current if ident not in definitions]
+
+        rebuilt = []
+        updated = []
+        for entry in entries:
+            old = current.get(entry.ident)
+            if old is None:
+                report.added.append(entry.ident)
+                rebuilt.append(entry)
+            elif old != entry.values:
+                report.changed.append(entry.ident)
+                obj = self.objects.get(entry.ident)
+                # Actors are held by whatever is running them, so they are
+                # updated rather than replaced
+                if isinstance(obj, actor.Actor) and entry.classtype == 'Actor':
+                    updated.append(entry)
+                else:
+                    rebuilt.append(entry)
+
+        objects = {entry.ident : parser.build_entry(entry) for entry in rebuilt}
+        lookup = dict(self.objects)
+        for ident in report.removed:
+            lookup.pop(ident, None)
+        lookup.update(objects)
+        for entry in rebuilt:
+            parser.link_entry(entry, lookup)
+
+        patches = []
+        for entry in updated:
+            obj = self.objects[entry.ident]
+            patches.append((setattr, obj, 'name', entry.values.get('name')))
+            if not isinstance(obj.get_rootnode(), compiler.ProgramInstance):
+                rootnode = lookup[entry.rootnode] if entry.rootnode else None
+                patches.append((obj.set_rootnode, rootnode))
+
+        # Compiled actors get a new program when anything in their tree, or
+        # the root they run, changed. Leaves keep their slot only when their
+        # action is unchanged too
+        entries_by_id = {entry.ident : entry for entry in entries}
+        touched = set(report.added) | set(report.changed) | set(report.removed)
+        kept = {entry.ident for entry in entries if entry.ident not in touched
+                and entry.action not in touched}
+        programs = {}
+        for ident, obj in self.objects.items():
+            if (not isinstance(obj, actor.Actor)
+                    or not isinstance(obj.get_rootnode(), compiler.ProgramInstance)
+                    or ident not in entries_by_id):
+                continue
+            rootnode = entries_by_id[ident].rootnode
+            old = obj.get_rootnode().program
+            if ident not in touched and touched.isdisjoint(old.ids) \
+                    and touched.isdisjoint(_reachable(entries_by_id, rootnode)):
+                continue
+            if not rootnode:
+                patches.append((obj.set_rootnode, None))
+                continue
+            program = programs.get(rootnode)
+            if program is None:
+                program = programs[rootnode] = _compile(parser, entries_by_id, rootnode, lookup)
+            elif compiler.unshared_target(program) is not None:
+                program = _compile(parser, entries_by_id, rootnode, lookup, private=True)
+            instance = program.instantiate(obj)
+            patches.append((_carry_state, obj.get_rootnode(), instance, kept))
+            patches.append((obj.set_rootnode, instance))
+
+        # Unchanged objects keep their state and are pointed at the new
+        # objects they reference
+        changed = set(report.changed)
+        for entry in entries:
+            if entry.ident in objects or entry.ident in changed:
+                continue
+            obj = self.objects.get(entry.ident)
+            references = [ref for ref in _references(entry) if ref in objects]
+            if obj is None or not references:
+                continue
+            report.relinked.append(entry.ident)
+            if entry.rootnode in objects and not isinstance(obj.get_rootnode(),
+                                                            compiler.ProgramInstance):
+                patches.append((obj.set_rootnode, objects[entry.rootnode]))
+            if entry.decoratee in objects:
+                patches.append((obj.set_decoratee, objects[entry.decoratee]))
+            if entry.action in objects:
+                patches.append((obj.set_action, objects[entry.action]))
+            if entry.childnodes:
+                # Children are matched by the object their id named, the
+                # order of the built children need not follow the entry
+                children = obj.get_children()
+                for child in entry.childnodes:
+                    previous = self.objects.get(child)
+                    if child not in objects or previous is None:
+                        continue
+                    for index, built in enumerate(children):
+                        if built is previous:
+                            patches.append((children.__setitem__, index, objects[child]))
+
+        return ReloadPatch(self, definitions, objects, patches, report)
+
+    def reload(self, parser):
+        """
+        Prepare and apply the entries of parser at once, returns the
+        ReloadReport
+        """
+        return self.prepare(parser).apply()
@@ -0,0 +1,91 @@
+"""Module for running blocking work off the tick loop
+
+A BoundedExecutor wraps a concurrent.futures thread pool with a limit on
+the number of submitted tasks not yet finished. Submissions over the limit
+are refused rather than queued, so a burst of actors backs off and retries
+on their next tick instead of flooding the pool.
+"""
+
+import concurrent.futures
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+class BoundedExecutor:
+    """
+    Thread pool accepting at most max_pending unfinished tasks, four per
+    worker by default
+    """
+    def __init__(self, max_workers=None, max_pending=None):
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+        if max_pending is None:
+            max_pending = 4 * max_workers
+        if max_pending <= 0:
+            raise ValueError('Maximum pending tasks must be positive')
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.rejected = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+
+    def pending(self):
+        """
+        Returns the number of submitted tasks not yet finished
+        """
+        return self._pending
+
+    def try_submit(self, fn, *args, **kwargs):
+        """
+        Schedule fn(*args, **kwargs), returns its Future or None if
+        max_pending tasks are already waiting
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                return None
+            self._pending += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._finished(None)
+            raise
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting work and release the threads
+        """
+        self._executor.shutdown(wait=wait)
+
+_default_executor = None
+_default_lock = threading.Lock()
+
+def get_default_executor():
+    """
+    Returns the executor shared by actions not given one, created on
+    first use
+    """
+    global _default_executor
+    with _default_lock:
+        if _default_executor is None:
+            _default_executor = BoundedExecutor()
+        return _default_executor
+
+def set_default_executor(executor):
+    """
+    Replace the shared executor, returns the previous one
+    """
+    global _default_executor
+    with _default_lock:
+        previous = _default_executor
+        _default_executor = executor
+        return previous
@@ -0,0 +1,262 @@
+"""Module for rewriting behavior trees into smaller equivalent ones
+
+Every rewrite keeps the results returned on each tick and the success(),
+failed() and reset() calls reaching the leaves:
+
+ - NodeDecorator passes everything through and is replaced by its decoratee
+ - two NodeDecoratorInvert in a row cancel out
+ - inverting an empty composite gives the empty composite of the other kind
+ - children after one that always succeeds in a selector, or always fails in
+   a sequence, can never run and are dropped
+ - a composite whose only child is a composite of the same kind is merged
+   into it when their reset policies allow
+
+Other single child composites are kept: a sequence latches the success of
+its last child instead of running it again, unlike the child on its own.
+
+Only the built in node types are rewritten, subclasses are left alone.
+"""
+
+import logging
+from oh_behave import actor
+from oh_behave import behave
+
+logger = logging.getLogger(__name__)
+
+class OptimizeReport:
+    """
+    What an optimize() call changed
+
+    removed lists (node id, reason) pairs. aliases maps the id of every
+    node taken out of a tree to the id of the node now doing its work, so
+    that traces and profiles of the optimized trees can be read in terms of
+    the original ones.
+    """
+    def __init__(self):
+        self.removed = []
+        self.aliases = {}
+
+    def __len__(self):
+        return len(self.removed)
+
+    def _remove(self, node, replacement, reason):
+        ident = node.get_id()
+        self.removed.append((ident, reason))
+        if replacement is not None:
+            self.aliases[ident] = replacement.get_id()
+        logger.info('Optimizer removed node id "%s": %s', ident, reason)
+
+def _children(node):
+    """Returns the nodes referenced by node"""
+    if isinstance(node, behave.NodeComposite):
+        return node.get_children()
+    elif isinstance(node, behave.NodeDecorator):
+        decoratee = node.get_decoratee()
+        return [] if decoratee is None else [decoratee]
+    return []
+
+def _postorder(roots):
+    """Returns every node reachable from roots, children before parents"""
+    order = []
+    seen = set()
+    for root in roots:
+        if id(root) in seen:
+            continue
+        seen.add(id(root))
+        stack = [(root, iter(_children(root)))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    stack.append((child, iter(_children(child))))
+                    break
+            else:
+                stack.pop()
+                order.append(node)
+    return order
+
+def _constant(node):
+    """Returns the result node returns on every tick, or None"""
+    inverted = False
+    while type(node) in (behave.NodeDecorator, behave.NodeDecoratorInvert):
+        if type(node) is behave.NodeDecoratorInvert:
+            inverted = not inverted
+        node = node.get_decoratee()
+    if type(node) is behave.NodeSequence and not node.get_children():
+        result = True
+    elif type(node) is behave.NodeSelector and not node.get_children():
+        result = False
+    else:
+        return None
+    return result != inverted
+
+def _merged_policy(outer, inner, latch):
+    """
+    Returns the reset policy of inner standing in for outer, or None when
+    outer would latch a result that inner does not
+
+    latch is the ResetPolicy bit of the result that moves outer past its
+    only child
+    """
+    outer_mask = outer.get_reset_policy().value
+    inner_mask = inner.get_reset_policy().value
+    if inner_mask & latch and not outer_mask & latch:
+        return None
+    return behave.ResetPolicy(outer_mask | inner_mask)
+
+class _Optimizer:
+    """Rewrites one set of objects"""
+    def __init__(self, report):
+        self.report = report
+        self.replacements = {}
+        self.references = {}
+
+    def replacement(self, node):
+        """Returns the node standing in for node"""
+        return self.replacements.get(id(node), node)
+
+    def count_references(self, nodes, rootnodes):
+        """Count how many parents and actors refer to each node"""
+        references = self.references
+        for node in nodes:
+            for child in _children(node):
+                references[id(child)] = references.get(id(child), 0) + 1
+        for rootnode in rootnodes:
+            references[id(rootnode)] = references.get(id(rootnode), 0) + 1
+
+    def release(self, node):
+        """
+        Drop one reference to node, and the references it holds once
+        nothing refers to it any more
+        """
+        references = self.references
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            count = references.get(id(node), 0) - 1
+            references[id(node)] = count
+            if count <= 0:
+                pending.extend(_children(node))
+
+    def transfer(self, node, replacement):
+        """
+        Hand the referrers of node, taken out of the trees, over to
+        replacement so that a node reached through a shared one stays
+        shared
+        """
+        references = self.references
+        references[id(replacement)] = references.get(id(replacement), 0) + \
+                references.get(id(node), 0)
+        references[id(node)] = 0
+        for child in _children(node):
+            self.release(child)
+
+    def is_shared(self, node):
+        """Returns whether anything but one parent refers to node"""
+        return self.references.get(id(node), 0) > 1
+
+    def relink(self, node):
+        """Point node at the replacements of its children"""
+        if isinstance(node, behave.NodeComposite):
+            children = node.get_children()
+            for index, child in enumerate(children):
+                children[index] = self.replacement(child)
+        elif isinstance(node, behave.NodeDecorator):
+            decoratee = node.get_decoratee()
+            if decoratee is not None and self.replacement(decoratee) is not decoratee:
+                node.set_decoratee(self.replacement(decoratee))
+
+    def rewrite(self, node):
+        """Returns the node replacing node, or node itself"""
+        nodetype = type(node)
+        if nodetype is behave.NodeDecorator:
+            decoratee = node.get_decoratee()
+            if decoratee is not None:
+                self.report._remove(node, decoratee, 'pass-through decorator')
+                return decoratee
+        elif nodetype is behave.NodeDecoratorInvert:
+            return self.rewrite_invert(node)
+        elif nodetype is behave.NodeSequence or nodetype is behave.NodeSelector:
+            return self.rewrite_composite(node, nodetype is behave.NodeSequence)
+        return node
+
+    def rewrite_invert(self, node):
+        """Cancel double inversions and fold inverted empty composites"""
+        decoratee = node.get_decoratee()
+        decorateetype = type(decoratee)
+        if decorateetype is behave.NodeDecoratorInvert and decoratee.get_decoratee() is not None:
+            replacement = decoratee.get_decoratee()
+            self.report._remove(node, replacement, 'double inversion')
+            if not self.is_shared(decoratee):
+                self.report._remove(decoratee, replacement, 'double inversion')
+            return replacement
+        if decorateetype in (behave.NodeSequence, behave.NodeSelector) and \
+                not decoratee.get_children():
+            if decorateetype is behave.NodeSequence:
+                replacement = behave.NodeSelector(id=node.get_id(), name=node.name)
+            else:
+                replacement = behave.NodeSequence(id=node.get_id(), name=node.name)
+            self.report._remove(node, replacement, 'inverted empty composite')
+            if not self.is_shared(decoratee):
+                self.report._remove(decoratee, replacement, 'inverted empty composite')
+            return replacement
+        return node
+
+    def rewrite_composite(self, node, sequence):
+        """Drop unreachable children and merge single child composites"""
+        children = node.get_children()
+        for index, child in enumerate(children):
+            if _constant(child) is (not sequence):
+                for unreachable in children[index + 1:]:
+                    self.report._remove(unreachable, None, 'unreachable child of "{0}"'
+                                        .format(node.get_id()))
+                    self.release(unreachable)
+                del children[index + 1:]
+                break
+
+        if len(children) == 1:
+            child = children[0]
+            if type(child) is type(node) and not self.is_shared(child):
+                latch = behave.ResetPolicy.on_success if sequence else \
+                        behave.ResetPolicy.on_failure
+                policy = _merged_policy(node, child, latch.value)
+                if policy is not None:
+                    child.set_reset_policy(policy)
+                    self.report._remove(node, child, 'single child composite')
+                    return child
+        return node
+
+def optimize(objects):
+    """
+    Rewrite the trees of objects, as returned by
+    reader.DataParser.build_objects, into smaller equivalent ones
+
+    Actors are pointed at the new root nodes and the entries of removed
+    nodes in objects are replaced by the node doing their work. Returns an
+    OptimizeReport.
+    """
+    report = OptimizeReport()
+    optimizer = _Optimizer(report)
+    actors = [obj for obj in objects.values() if isinstance(obj, actor.Actor)]
+    rootnodes = [a.get_rootnode() for a in actors if isinstance(a.get_rootnode(), behave.Node)]
+    nodes = _postorder(rootnodes + [obj for obj in objects.values()
+                                    if isinstance(obj, behave.Node)])
+    optimizer.count_references(nodes, rootnodes)
+
+    for node in nodes:
+        optimizer.relink(node)
+        replacement = optimizer.rewrite(node)
+        if replacement is not node:
+            optimizer.transfer(node, replacement)
+            optimizer.replacements[id(node)] = optimizer.replacement(replacement)
+
+    for a in actors:
+        rootnode = a.get_rootnode()
+        if rootnode is not None:
+            a.set_rootnode(optimizer.replacement(rootnode))
+    for ident, obj in objects.items():
+        objects[ident] = optimizer.replacement(obj)
+
+    logger.info('Optimizer removed %d nodes', len(report))
+    return report
@@ -0,0 +1,232 @@
+"""Module for running many actors together"""
+
+import functools
+import logging
+import math
+import time
+import oh_behave
+from oh_behave import schedule
+
+logger = logging.getLogger(__name__)
+
+class TickReport:
+    """Aggregated results of one ActorPool tick"""
+    def __init__(self, tick):
+        self.tick = tick
+        self.ticked = 0
+        self.ready = 0
+        self.parked = 0
+        self.woken = 0
+        self.succeeded = []
+        self.failed = []
+        self.elapsed_ns = 0
+
+class ActorPool:
+    """
+    Owns a population of actors and ticks them once per frame
+
+    Actors are ticked round robin, at most batch_size of them per call to
+    tick() when batch_size is set. Actors that return success or failure
+    are dropped from the active set, actors without a root node count as
+    failed.
+
+    Actors that return ready after asking to sleep (see Actor.sleep) are
+    parked in a timer wheel and skipped entirely until their deadline. Sleeps
+    count executions, so with batch_size set an actor is parked for as many
+    frames as it would have taken to be executed that many times. Actors
+    that asked to wait for blackboard keys (see Actor.wait) stay parked
+    until one of the keys changes or their sleep ends. Woken early, their
+    sleepers are told about the executions the frames spent parked stood
+    for.
+    """
+    def __init__(self, actors=(), batch_size=None, wheel_size=256):
+        if batch_size is not None and batch_size <= 0:
+            raise ValueError('Batch size must be positive')
+        self.batch_size = batch_size
+        self._active = []
+        self._positions = {}
+        self._cursor = 0
+        self._parked = {}
+        self._signalled = []
+        self._wheel = schedule.TimerWheel(wheel_size)
+        self.ticks = 0
+        self.actor_ticks = 0
+        self.elapsed_ns = 0
+        for a in actors:
+            self.add(a)
+
+    def __len__(self):
+        return len(self._active) + len(self._parked)
+
+    def __contains__(self, a):
+        return a in self._positions or a in self._parked
+
+    def add(self, a):
+        """
+        Add an actor to the active set
+        """
+        if a in self._positions or a in self._parked:
+            return
+        self._positions[a] = len(self._active)
+        self._active.append(a)
+
+    def remove(self, a):
+        """
+        Remove an actor from the pool in constant time
+        """
+        parked = self._parked.pop(a, None)
+        if parked is not None:
+            self._unsubscribe(a, parked)
+            return
+        index = self._positions.pop(a)
+        last = self._active.pop()
+        if last is not a:
+            self._active[index] = last
+            self._positions[last] = index
+
+    def get_actors(self):
+        """
+        Returns the actors in the pool, active ones first
+        """
+        return self._active + list(self._parked)
+
+    def get_parked(self):
+        """
+        Returns the parked actors
+        """
+        return list(self._parked)
+
+    def _signal(self, a, key, value):
+        """Blackboard callback of a parked actor, woken on the next tick"""
+        self._signalled.append(a)
+
+    def _unsubscribe(self, a, parked):
+        """Stop listening to the keys a parked actor waits for"""
+        callback = parked[4]
+        if callback is not None:
+            blackboard = a.get_blackboard()
+            for key in parked[5]:
+                blackboard.unsubscribe(key, callback)
+
+    def _wake(self, report):
+        """
+        Move actors whose deadline is the current tick, or whose keys
+        changed, back to the active set
+        """
+        for a in self._wheel.advance_to(self.ticks):
+            parked = self._parked.get(a)
+            # Actors removed or parked again since are ignored
+            if parked is None or parked[0] != self.ticks:
+                continue
+            del self._parked[a]
+            self._unsubscribe(a, parked)
+            a.wake(parked[1])
+            self.add(a)
+            report.woken += 1
+
+        signalled = self._signalled
+        self._signalled = []
+        for a in signalled:
+            parked = self._parked.pop(a, None)
+            if parked is None:
+                continue
+            self._unsubscribe(a, parked)
+            frames = self.ticks - parked[2] - 1
+            a.wake(min(parked[1], int(frames * parked[3])))
+            self.add(a)
+            report.woken += 1
+
+    def _park(self, a):
+        """Move an actor that asked to sleep or wait out of the active set"""
+        skipped = a.get_sleep()
+        frames = skipped
+        share = 1.0
+        # Parked actors would still be taking their turn if they were not
+        size = len(self)
+        if self.batch_size is not None and self.batch_size < size:
+            frames = math.ceil(skipped * size / self.batch_size)
+            share = self.batch_size / size
+        self.remove(a)
+        deadline = None
+        if skipped:
+            deadline = self.ticks + frames + 1
+            self._wheel.schedule(a, deadline)
+        callback = None
+        keys = tuple(a.get_waits())
+        if keys:
+            callback = functools.partial(self._signal, a)
+            blackboard = a.get_blackboard()
+            for key in keys:
+                blackboard.subscribe(key, callback)
+        self._parked[a] = (deadline, skipped, self.ticks, share, callback, keys)
+
+    def tick(self):
+        """
+        Run one frame, returns a TickReport
+        """
+        start = time.monotonic_ns()
+        report = TickReport(self.ticks)
+        self._wake(report)
+        active = self._active
+        size = len(active)
+        count = size
+        if self.batch_size is not None and self.batch_size < size:
+            count = self.batch_size
+
+        ready = oh_behave.ExecuteResult.ready
+        success = oh_behave.ExecuteResult.success
+        succeeded = report.succeeded
+        failed = report.failed
+        sleeping = []
+        index = self._cursor
+        for _ in range(count):
+            if index >= size:
+                index = 0
+            a = active[index]
+            status = a.execute()
+            if status is ready:
+                report.ready += 1
+                if a.get_sleep() or a.get_waits():
+                    sleeping.append(a)
+            elif status is success:
+                succeeded.append(a)
+            else:
+                failed.append(a)
+            index += 1
+        self._cursor = index
+
+        for a in succeeded:
+            self.remove(a)
+        for a in failed:
+            self.remove(a)
+        for a in sleeping:
+            self._park(a)
+        report.parked = len(sleeping)
+        if self._cursor > len(active):
+            self._cursor = 0
+
+        report.ticked = count
+        report.elapsed_ns = time.monotonic_ns() - start
+        self.ticks += 1
+        self.actor_ticks += count
+        self.elapsed_ns += report.elapsed_ns
+        return report
+
+    def run(self, max_ticks=None):
+        """
+        Tick until no actors are left or max_ticks frames have run,
+        returns the number of frames run
+        """
+        frames = 0
+        while (self._active or self._parked) and (max_ticks is None or frames < max_ticks):
+            self.tick()
+            frames += 1
+        return frames
+
+    def ticks_per_second(self):
+        """
+        Returns the number of actor ticks run per second of tick() time
+        """
+        if self.elapsed_ns == 0:
+            return 0.0
+        return self.actor_ticks * 1e9 / self.elapsed_ns
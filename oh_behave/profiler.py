@@ -0,0 +1,216 @@
+"""Module for profiling behavior trees node by node
+
+A Profiler is attached to individual actors: the references from parents
+to children in their trees are swapped for thin proxies that count calls
+and time them, and detaching puts the original references back. Actors
+that are not attached run without any overhead, so profiling a sampled
+fraction of actors is cheap enough for production.
+
+Node objects shared with other actors are profiled for those actors too.
+A compiled program is profiled as a single node.
+
+The call stack is kept in a context variable, so trees ticked on several
+threads at once, and the children of a concurrent NodeParallel, each
+record their own stacks under the node that started them.
+"""
+
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+import oh_behave
+from oh_behave import behave
+
+logger = logging.getLogger(__name__)
+
+class NodeProfile:
+    """Counters for one node id"""
+    __slots__ = ('execute_calls', 'success_calls', 'failed_calls', 'total_ns', 'self_ns',
+                 'results')
+
+    def __init__(self):
+        self.execute_calls = 0
+        self.success_calls = 0
+        self.failed_calls = 0
+        self.total_ns = 0
+        self.self_ns = 0
+        self.results = dict.fromkeys(oh_behave.ExecuteResult, 0)
+
+    def to_dict(self):
+        """
+        Returns the counters as a JSON serialisable dictionary
+        """
+        return {
+            'execute_calls' : self.execute_calls,
+            'success_calls' : self.success_calls,
+            'failed_calls' : self.failed_calls,
+            'total_ns' : self.total_ns,
+            'self_ns' : self.self_ns,
+            'results' : {result.name : count for result, count in self.results.items()}
+        }
+
+class _ProfiledNode:
+    """Stands in for a node and reports its calls to a profiler"""
+    __slots__ = ('node', '_ident', '_profile', '_profiler')
+
+    def __init__(self, node, profiler):
+        self.node = node
+        self._ident = node.get_id()
+        self._profile = profiler.get_profile(self._ident)
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self.node, name)
+
+    def get_id(self):
+        return self._ident
+
+    def execute(self):
+        profiler = self._profiler
+        frame = profiler._frame
+        parent = frame.get()
+        stack = parent[0] + (self._ident,) if parent is not None else (self._ident,)
+        children_ns = [0]
+        token = frame.set((stack, children_ns))
+        start = time.monotonic_ns()
+        try:
+            ret = self.node.execute()
+        finally:
+            elapsed = time.monotonic_ns() - start
+            frame.reset(token)
+            profile = self._profile
+            with profiler._lock:
+                # Children running concurrently may add up to more than the
+                # time of their parent
+                own = max(elapsed - children_ns[0], 0)
+                if parent is not None:
+                    parent[1][0] += elapsed
+                profile.execute_calls += 1
+                profile.total_ns += elapsed
+                profile.self_ns += own
+                profiler._stacks[stack] = profiler._stacks.get(stack, 0) + own
+        if ret in profile.results:
+            with profiler._lock:
+                profile.results[ret] += 1
+        return ret
+
+    def success(self):
+        with self._profiler._lock:
+            self._profile.success_calls += 1
+        return self.node.success()
+
+    def failed(self):
+        with self._profiler._lock:
+            self._profile.failed_calls += 1
+        return self.node.failed()
+
+    def reset(self):
+        return self.node.reset()
+
+class Profiler:
+    """
+    Accumulates per node call counts, times and results for the actors it
+    is attached to
+    """
+    def __init__(self):
+        self._profiles = {}
+        self._stacks = {}
+        # (call stack, [children ns]) of the node executing in this context
+        self._frame = contextvars.ContextVar('profiler_frame', default=None)
+        self._lock = threading.Lock()
+        self._patches = {}
+
+    def get_profile(self, ident):
+        """
+        Returns the NodeProfile of node id ident, creating it if needed
+        """
+        profile = self._profiles.get(ident)
+        if profile is None:
+            profile = NodeProfile()
+            self._profiles[ident] = profile
+        return profile
+
+    def get_profiles(self):
+        """
+        Returns a dictionary of NodeProfile keyed by node id
+        """
+        return dict(self._profiles)
+
+    def _wrap(self, node, pending):
+        """Returns a proxy for node and queues its own references"""
+        if isinstance(node, _ProfiledNode):
+            return node
+        pending.append(node)
+        return _ProfiledNode(node, self)
+
+    def attach(self, a):
+        """
+        Start profiling the tree of actor a
+        """
+        if a in self._patches or a.get_rootnode() is None:
+            return
+        patches = []
+        pending = []
+        rootnode = a.get_rootnode()
+        a.set_rootnode(self._wrap(rootnode, pending))
+        patches.append((a.set_rootnode, rootnode))
+        while pending:
+            node = pending.pop()
+            if isinstance(node, behave.NodeComposite):
+                children = node.get_children()
+                for index, child in enumerate(children):
+                    children[index] = self._wrap(child, pending)
+                    patches.append((children.__setitem__, index, child))
+            elif isinstance(node, behave.NodeDecorator):
+                decoratee = node.get_decoratee()
+                node.set_decoratee(self._wrap(decoratee, pending))
+                patches.append((node.set_decoratee, decoratee))
+            elif isinstance(node, behave.NodeLeafAction):
+                action = node.get_action()
+                node.set_action(self._wrap(action, pending))
+                patches.append((node.set_action, action))
+        self._patches[a] = patches
+        logger.info('Profiling actor "%s"', a.name)
+
+    def detach(self, a):
+        """
+        Stop profiling actor a, restoring its tree
+        """
+        for patch in reversed(self._patches.pop(a, [])):
+            patch[0](*patch[1:])
+
+    def detach_all(self):
+        """
+        Stop profiling every attached actor
+        """
+        for a in list(self._patches):
+            self.detach(a)
+
+    def sample(self, actors, fraction, rng=random):
+        """
+        Attach to roughly fraction of actors, picked at random, returns the
+        actors attached
+        """
+        sampled = [a for a in actors if rng.random() < fraction]
+        for a in sampled:
+            self.attach(a)
+        return sampled
+
+    def collapsed_stacks(self):
+        """
+        Returns the self time of every call stack in the collapsed format
+        read by flame graph tools, one "root;child;leaf nanoseconds" line
+        per stack
+        """
+        return ''.join('{0} {1}\n'.format(';'.join(str(ident) for ident in stack), ns)
+                       for stack, ns in sorted(self._stacks.items()))
+
+    def summary(self):
+        """
+        Returns the counters of every node as a JSON string
+        """
+        return json.dumps({str(ident) : profile.to_dict()
+                           for ident, profile in self._profiles.items()},
+                          indent=4, sort_keys=True)
@@ -1,17 +1,30 @@
 """Module for parsing data files and creating objects from them"""
 
+import codecs
+import concurrent.futures
+import hashlib
 import json
+import mmap
+import os
+import re
 import oh_behave
 import logging
 from oh_behave import behave
 from oh_behave import actor
 from oh_behave import action
+from oh_behave import cache
+from oh_behave import optimizer
 
 classname_match_table_default = {
     'Actor' : actor.Actor,
     'ActionTimed' : action.ActionTimed,
+    'ActionCondition' : action.ActionCondition,
+    'ActionAssign' : action.ActionAssign,
+    'ActionAsync' : action.ActionAsync,
+    'ActionOffload' : action.ActionOffload,
     'NodeSequence' : behave.NodeSequence,
     'NodeSelector' : behave.NodeSelector,
+    'NodeParallel' : behave.NodeParallel,
     'NodeLeafAction' : behave.NodeLeafAction,
     'NodeDecoratorInvert' : behave.NodeDecoratorInvert,
     'NodeDecorator' : behave.NodeDecorator
@@ -19,11 +32,113 @@ classname_match_table_default = {
 
 logger = logging.getLogger(__name__)
 
+DEFINITION_SUFFIXES = ('.json', '.jsonl')
+
+# Classes holding no state of their own, composites only qualify without
+# children. Subtrees made of them can be shared by any number of parents.
+STATELESS_CLASSES = (behave.NodeDecorator, behave.NodeDecoratorInvert, behave.NodeLeafAction)
+
+# Classes whose state moves into the compiler.ProgramInstance of each actor
+# once their tree is compiled
+EXTERNALIZED_CLASSES = STATELESS_CLASSES + (behave.NodeSequence, behave.NodeSelector,
+                                            action.ActionTimed)
+
+# Fields naming other entries or the entry itself, hashed separately
+_LINK_FIELDS = ('type', 'id', 'name', 'rootnode', 'childnodes', 'decoratee', 'action')
+
 class MissingFieldException(BaseException):
     pass
 
+class DuplicateIdException(Exception):
+    pass
+
+# Text that can follow a top level number or literal
+_SCALAR_END = re.compile(r'[\s,\]\[{"]')
+# Characters a JSON value can start with
+_VALUE_START = frozenset('{["-0123456789tfnNI')
+
+def _read_more(stream, buffer, position, chunk_size, max_pending):
+    """
+    Returns the pending text of buffer from position followed by the next
+    chunk of stream, and whether stream is exhausted
+
+    Reads at least as much as is pending so that a long value is decoded a
+    logarithmic number of times.
+    """
+    pending = len(buffer) - position
+    if pending > max_pending:
+        raise json.JSONDecodeError('Value longer than {0} characters'.format(max_pending),
+                                   buffer, position)
+    chunk = stream.read(max(chunk_size, pending))
+    return buffer[position:] + chunk, not chunk
+
+def iter_json_objects(stream, chunk_size=65536, max_pending=1 << 26):
+    """
+    Generator yielding the JSON values read from a text stream
+
+    The stream may hold whitespace separated values, such as JSON Lines, or
+    a single top level array of values. It is read chunk_size characters
+    at a time and only the text of the value being decoded is kept.
+
+    Malformed text raises json.JSONDecodeError as soon as it cannot start
+    a value, or once the value being decoded is longer than max_pending
+    characters, instead of reading the rest of the stream into memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    started = False
+    in_array = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n':
+            position += 1
+        if position >= len(buffer):
+            if eof:
+                break
+            buffer = stream.read(chunk_size)
+            position = 0
+            eof = not buffer
+            continue
+
+        char = buffer[position]
+        if not started and char == '[':
+            in_array = True
+            started = True
+            position += 1
+            continue
+        if in_array and char in ',]':
+            in_array = char == ','
+            position += 1
+            continue
+
+        if char not in _VALUE_START:
+            raise json.JSONDecodeError('Expecting value', buffer, position)
+        if char not in '{["' and not eof and not _SCALAR_END.search(buffer, position):
+            # Numbers and literals have no closing delimiter, the rest of
+            # them may be in the next chunk
+            buffer, eof = _read_more(stream, buffer, position, chunk_size, max_pending)
+            position = 0
+            continue
+
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # The value may continue in the next chunk
+            if eof:
+                raise
+            buffer, eof = _read_more(stream, buffer, position, chunk_size, max_pending)
+            position = 0
+            continue
+        started = True
+        position = end
+        yield value
+
 class ObjectEntry:
     """Represents an object and linking data"""
+    __slots__ = ('values', 'classtype', 'ident', 'rootnode', 'childnodes', 'decoratee',
+                 'action', 'actor')
+
     def __init__(self, values):
         self.values = values
         self.classtype = values.get('type', None)
@@ -31,12 +146,61 @@ class ObjectEntry:
         self.rootnode = values.get('rootnode', None)
         self.childnodes = values.get('childnodes', [])
         self.decoratee = values.get('decoratee', None)
+        self.action = values.get('action', None)
+        self.actor = values.get('actor', None)
         logger.info("Built Entry: type:\"%s\" id:\"%s\"", self.classtype, self.ident)
         if self.classtype is None:
             raise MissingFieldException('Missing required field "type"')
         if self.ident is None:
             raise MissingFieldException('Missing required field "id"')
 
+class DedupReport:
+    """
+    Subtrees found identical by DataParser.deduplicate
+
+    aliases maps the id of every entry that is not built to the id of the
+    identical entry built in its place
+    """
+    def __init__(self):
+        self.aliases = {}
+
+    def __len__(self):
+        return len(self.aliases)
+
+    def groups(self):
+        """
+        Returns a dictionary of the ids sharing each built entry, keyed by
+        the id of the built entry
+        """
+        groups = {}
+        for alias, ident in self.aliases.items():
+            groups.setdefault(ident, []).append(alias)
+        return groups
+
+def find_definition_files(paths):
+    """
+    Returns the definition files named by paths, directories are searched
+    recursively for files ending in one of DEFINITION_SUFFIXES
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = []
+            for directory, _, filenames in os.walk(path):
+                for filename in filenames:
+                    if filename.endswith(DEFINITION_SUFFIXES):
+                        found.append(os.path.join(directory, filename))
+            files.extend(sorted(found))
+        else:
+            files.append(path)
+    return files
+
+def _parse_definition_file(filepath):
+    """Returns the entries of one file, run in the parsing worker processes"""
+    parser = DataParser()
+    parser.parse_file(filepath)
+    return parser._entries
+
 class DataParser:
     """Class used to parse configuration files"""
     def __init__(self, classname_match_table=None):
@@ -46,38 +210,361 @@ class DataParser:
             self._classname_match_table = classname_match_table
 
         self._entries = []
+        self._index = {}
+        self._aliases = {}
+
+    def parse_file(self, filepath, use_mmap=False, chunk_size=65536):
+        """
+        Parse a file of object definitions in JSON Lines format or as a
+        top level JSON array, returns the number of entries parsed
+
+        The file is streamed so that only one definition is held as text at
+        a time. With use_mmap the file is memory mapped and decoded from the
+        mapping instead of being read through file buffers.
+        """
+        count = 0
+        with open(filepath, 'rb') as binary:
+            if use_mmap:
+                if os.fstat(binary.fileno()).st_size == 0:
+                    return count
+                mapping = mmap.mmap(binary.fileno(), 0, access=mmap.ACCESS_READ)
+                stream = codecs.getreader('utf-8')(mapping)
+            else:
+                mapping = None
+                stream = codecs.getreader('utf-8')(binary)
+            try:
+                for values in iter_json_objects(stream, chunk_size):
+                    self._add_entry(ObjectEntry(values))
+                    count += 1
+            finally:
+                if mapping is not None:
+                    mapping.close()
+        logger.info("Parsed %d entries from file '%s'", count, filepath)
+        return count
+
+    def parse_files(self, paths, processes=None):
+        """
+        Parse every definition file named by paths, which may include
+        directories, across a pool of processes
+
+        processes defaults to the number of CPUs, with one process or one
+        file everything is parsed in this process. Raises
+        DuplicateIdException if an id is defined more than once, across
+        files or already parsed entries. Returns the number of entries
+        parsed.
+        """
+        files = find_definition_files(paths)
+        if processes is None:
+            processes = os.cpu_count() or 1
+        processes = min(processes, len(files))
+        if processes <= 1:
+            results = map(_parse_definition_file, files)
+            executor = None
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=processes)
+            chunksize = max(1, len(files) // (processes * 4))
+            results = executor.map(_parse_definition_file, files, chunksize=chunksize)
+
+        sources = {}
+        merged = []
+        try:
+            for filepath, entries in zip(files, results):
+                for entry in entries:
+                    if entry.ident in sources:
+                        raise DuplicateIdException('Id "{0}" in "{1}" is already defined in "{2}"'
+                                .format(entry.ident, filepath, sources[entry.ident]))
+                    if entry.ident in self._index:
+                        raise DuplicateIdException('Id "{0}" in "{1}" has already been parsed'
+                                .format(entry.ident, filepath))
+                    sources[entry.ident] = filepath
+                    merged.append(entry)
+        finally:
+            if executor is not None:
+                executor.shutdown()
 
-    def parse_file(self, filepath):
-        """Parse a file"""
-        pass
+        for entry in merged:
+            self._add_entry(entry)
+        logger.info("Parsed %d entries from %d files", len(merged), len(files))
+        return len(merged)
+
+    def parse_file_cached(self, filepath, cachepath=None, use_mmap=False):
+        """
+        Parse a file like parse_file, going through a binary cache of its
+        definitions stored at cachepath, filepath + '.ohbc' by default
+
+        The cache is rewritten whenever the content of filepath changes.
+        Returns the number of entries parsed.
+        """
+        if cachepath is None:
+            cachepath = filepath + '.ohbc'
+        digest = cache.source_hash(filepath)
+        definitions = cache.read_cache(cachepath, digest)
+        if definitions is None:
+            return self._parse_file_to_cache(filepath, cachepath, digest, use_mmap)
+        for values in definitions:
+            self._add_entry(ObjectEntry(values))
+        return len(definitions)
+
+    def _parse_file_to_cache(self, filepath, cachepath, digest, use_mmap=False):
+        """Parse filepath and write the cache of its entries"""
+        first = len(self._entries)
+        count = self.parse_file(filepath, use_mmap=use_mmap)
+        cache.write_cache(cachepath, self._entries[first:], digest)
+        return count
+
+    def load_objects_cached(self, filepath, cachepath=None, optimize=False):
+        """
+        Returns the objects defined in filepath, like parse_file_cached
+        followed by build_objects, leaving the entries of the parser as they
+        are
+
+        When the cache can be used no entry is parsed: objects are built
+        from the decoded values in the cache and linked through its
+        resolved entry indices. Otherwise the file is parsed, the cache
+        rewritten and the objects built as usual.
+        """
+        if cachepath is None:
+            cachepath = filepath + '.ohbc'
+        digest = cache.source_hash(filepath)
+        library = cache.read_library(cachepath, digest)
+        if library is None:
+            parser = DataParser(self._classname_match_table)
+            parser._parse_file_to_cache(filepath, cachepath, digest)
+            return parser.build_objects(optimize=optimize)
+
+        classtypes = library.classtypes
+        classes = [self._classname_match_table[classtype] for classtype in classtypes]
+        definitions = library.definitions
+        fields = [library.links[field::cache.LINK_FIELDS] for field in range(cache.LINK_FIELDS)]
+        codes = fields[0]
+        built = [classes[code]([], **values) for code, values in zip(codes, definitions)]
+
+        def resolve(index, ident):
+            if index == cache.UNRESOLVED:
+                raise KeyError('Unresolved reference of "{0}"'.format(ident))
+            return built[index]
+
+        kinds = [classtype if classtype == 'Actor' else classtype[:4] if
+                 classtype.startswith('Node') else classtype[:6] for classtype in classtypes]
+        children = library.children
+        for obj, values, code, rootnode, decoratee, act, performer, first, count in zip(
+                built, definitions, *fields):
+            kind = kinds[code]
+            if kind == 'Node':
+                if count:
+                    for child in children[first:first + count]:
+                        obj.addchild(resolve(child, values['id']))
+                if decoratee != cache.NONE:
+                    obj.set_decoratee(resolve(decoratee, values['id']))
+                if act != cache.NONE:
+                    obj.set_action(resolve(act, values['id']))
+                if performer < cache.UNRESOLVED and hasattr(obj, 'set_actor'):
+                    obj.set_actor(built[performer])
+            elif kind == 'Action':
+                if performer < cache.UNRESOLVED:
+                    obj.set_actor(built[performer])
+            elif kind == 'Actor':
+                if rootnode != cache.NONE:
+                    obj.set_rootnode(resolve(rootnode, values['id']))
+
+        objects = {values['id'] : obj for values, obj in zip(definitions, built)}
+        if optimize:
+            optimizer.optimize(objects)
+        logger.info("Loaded %d objects from cache '%s'", len(objects), cachepath)
+        return objects
 
     def _parse_object_string(self, string):
         """Create an object from a json string"""
         parsed = json.loads(string)
-        self._entries.append(ObjectEntry(parsed))
+        self._add_entry(ObjectEntry(parsed))
 
-    def build_objects(self):
-        """Build all parsed objects into the determined hierarchy"""
-        #TODO: Future optimization: Filter out objects that don't need linking in first pass
-        objects = {}
-        for entry in self._entries:
-            logger.info("Building entry id:'%s' class '%s'", entry.ident, entry.classtype)
-            baseclass = self._classname_match_table[entry.classtype]
-            obj = baseclass([], **entry.values)
-            objects[entry.ident] = obj
+    def _add_entry(self, entry):
+        """Store a parsed entry and index it by id"""
+        self._entries.append(entry)
+        self._index[entry.ident] = entry
+
+    def get_entry(self, ident):
+        """Returns the parsed entry with id ident, None if there is none"""
+        return self._index.get(ident, None)
+
+    def get_entries(self):
+        """Returns the list of parsed entries, in the order they were parsed"""
+        return self._entries
+
+    def _shareable(self, entry, externalized):
+        """Returns whether entry may be shared if its references are"""
+        baseclass = self._classname_match_table.get(entry.classtype)
+        classes = EXTERNALIZED_CLASSES if externalized else STATELESS_CLASSES
+        if any(baseclass is cls for cls in classes):
+            return True
+        return (not entry.childnodes and
+                (baseclass is behave.NodeSequence or baseclass is behave.NodeSelector))
+
+    def structural_hashes(self, externalized=False):
+        """
+        Returns a dictionary of structural hashes keyed by id, for the
+        entries whose whole subtree can be shared
+
+        The hash covers the type and parameters of an entry and the hashes
+        of the entries it references, but not ids or names, so identical
+        subtrees defined under different ids hash the same. With
+        externalized, subtrees whose state moves into compiled programs are
+        included as well, and the actor of ActionTimed entries is ignored.
+        """
+        hashes = {}
+        expanding = set()
+        for root in self._entries:
+            pending = [root.ident]
+            while pending:
+                ident = pending[-1]
+                if ident in hashes:
+                    pending.pop()
+                    continue
+                entry = self._index.get(ident)
+                if entry is None:
+                    hashes[ident] = None
+                    pending.pop()
+                    continue
+                references = list(entry.childnodes)
+                references.extend(ref for ref in (entry.decoratee, entry.action) if ref)
+                if ident not in expanding:
+                    expanding.add(ident)
+                    # References still being expanded are part of a cycle
+                    pending.extend(ref for ref in references
+                                   if ref not in hashes and ref not in expanding)
+                    continue
+                pending.pop()
+                expanding.discard(ident)
+
+                digests = [hashes.get(ref) for ref in references]
+                if None in digests or not self._shareable(entry, externalized):
+                    hashes[ident] = None
+                    continue
+                params = {key : value for key, value in entry.values.items()
+                          if key not in _LINK_FIELDS}
+                if externalized and entry.classtype == 'ActionTimed':
+                    params.pop('actor', None)
+                structure = json.dumps([entry.classtype, params, digests], sort_keys=True)
+                hashes[ident] = hashlib.sha1(structure.encode('utf-8')).hexdigest()
+        return {ident : digest for ident, digest in hashes.items() if digest is not None}
+
+    def deduplicate(self, externalized=False):
+        """
+        Make build_objects build a single object for every group of
+        identical subtrees, returns a DedupReport
+
+        Only subtrees without state are shared unless externalized is set,
+        which also shares subtrees whose state moves into compiled programs.
+        Trees deduplicated that way must be run through
+        compiler.compile_actors before being executed.
+        """
+        hashes = self.structural_hashes(externalized)
+        report = DedupReport()
+        first = {}
         for entry in self._entries:
-            logger.info("Linking entry id:'%s' class '%s'", entry.ident, entry.classtype)
-            if entry.classtype == 'Actor':
-                if entry.rootnode:
-                    logger.info("Linking actor id:'%s' to rootnode id '%s'", entry.ident, entry.rootnode)
-                    objects[entry.ident].set_rootnode(objects[entry.rootnode])
-            elif entry.classtype.startswith('Node'):
-                for child in entry.childnodes:
-                    logger.info("Linking node id:'%s' to childnode id '%s'", entry.ident, child)
-                    objects[entry.ident].addchild(objects[child])
-                if entry.decoratee:
-                    logger.info("Linking decorator node id:'%s' to node id '%s'", entry.ident, entry.decoratee)
-                    objects[entry.ident].set_decoratee(objects[entry.decoratee])
+            digest = hashes.get(entry.ident)
+            if digest is None:
+                continue
+            ident = first.setdefault(digest, entry.ident)
+            if ident != entry.ident:
+                report.aliases[entry.ident] = ident
+        self._aliases = report.aliases
+        logger.info("Deduplication shares %d of %d entries", len(report), len(self._entries))
+        return report
+
+    def reachable_entries(self, roots):
+        """
+        Returns the entries reachable from the ids in roots through their
+        rootnode, childnodes, decoratee and action references
+
+        The actor an action belongs to is not followed, it is linked if it
+        is built anyway.
+        """
+        seen = set()
+        entries = []
+        pending = list(roots)
+        while pending:
+            ident = pending.pop()
+            ident = self._aliases.get(ident, ident)
+            if ident in seen:
+                continue
+            seen.add(ident)
+            entry = self._index[ident]
+            entries.append(entry)
+            if entry.rootnode:
+                pending.append(entry.rootnode)
+            pending.extend(entry.childnodes)
+            if entry.decoratee:
+                pending.append(entry.decoratee)
+            if entry.action:
+                pending.append(entry.action)
+        return entries
+
+    def build_entry(self, entry):
+        """
+        Returns a new object built from entry, without its links
+        """
+        logger.info("Building entry id:'%s' class '%s'", entry.ident, entry.classtype)
+        baseclass = self._classname_match_table[entry.classtype]
+        return baseclass([], **entry.values)
+
+    def link_entry(self, entry, objects):
+        """
+        Link the object built for entry to the objects it references,
+        looked up by id in objects
+        """
+        logger.info("Linking entry id:'%s' class '%s'", entry.ident, entry.classtype)
+        if entry.classtype == 'Actor':
+            if entry.rootnode:
+                logger.info("Linking actor id:'%s' to rootnode id '%s'", entry.ident, entry.rootnode)
+                objects[entry.ident].set_rootnode(objects[entry.rootnode])
+        elif entry.classtype.startswith('Node'):
+            for child in entry.childnodes:
+                logger.info("Linking node id:'%s' to childnode id '%s'", entry.ident, child)
+                objects[entry.ident].addchild(objects[child])
+            if entry.decoratee:
+                logger.info("Linking decorator node id:'%s' to node id '%s'", entry.ident, entry.decoratee)
+                objects[entry.ident].set_decoratee(objects[entry.decoratee])
+            if entry.action:
+                logger.info("Linking leaf node id:'%s' to action id '%s'", entry.ident, entry.action)
+                objects[entry.ident].set_action(objects[entry.action])
+            if entry.actor in objects and hasattr(objects[entry.ident], 'set_actor'):
+                logger.info("Linking node id:'%s' to actor id '%s'", entry.ident, entry.actor)
+                objects[entry.ident].set_actor(objects[entry.actor])
+        elif entry.classtype.startswith('Action'):
+            if entry.actor in objects:
+                logger.info("Linking action id:'%s' to actor id '%s'", entry.ident, entry.actor)
+                objects[entry.ident].set_actor(objects[entry.actor])
+
+    def build_objects(self, roots=None, optimize=False):
+        """
+        Build parsed objects into the determined hierarchy
+
+        By default every parsed entry is built. When roots, an iterable of
+        ids, is given only the objects reachable from them are built. When
+        optimize is set the built trees are passed through
+        optimizer.optimize().
+
+        Entries found identical by deduplicate() are built once and every
+        id of the group refers to the same object.
+        """
+        if roots is None:
+            entries = self._entries
+        else:
+            entries = self.reachable_entries(roots)
+        aliases = self._aliases
+        if aliases:
+            entries = [entry for entry in entries if entry.ident not in aliases]
+        objects = {}
+        for entry in entries:
+            objects[entry.ident] = self.build_entry(entry)
+        for alias, ident in aliases.items():
+            if ident in objects:
+                objects[alias] = objects[ident]
+        for entry in entries:
+            self.link_entry(entry, objects)
 
+        if optimize:
+            optimizer.optimize(objects)
         return objects
 
@@ -0,0 +1,65 @@
+"""Module for scheduling work at future ticks"""
+
+import heapq
+
+class TimerWheel:
+    """
+    Hashed timing wheel keyed by tick number
+
+    Deadlines less than one revolution ahead go straight into the wheel
+    slot for their tick, later ones wait in a heap until they come within
+    range. Advancing the wheel only looks at the slot of the new tick.
+    """
+    def __init__(self, size=256):
+        if size <= 0:
+            raise ValueError('Timer wheel size must be positive')
+        self.size = size
+        self.now = 0
+        self._slots = [[] for _ in range(size)]
+        self._overflow = []
+        self._sequence = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def schedule(self, item, deadline):
+        """
+        Schedule item to be returned when the wheel reaches tick deadline,
+        deadlines in the past are due on the next tick
+        """
+        if deadline <= self.now:
+            deadline = self.now + 1
+        if deadline - self.now < self.size:
+            self._slots[deadline % self.size].append(item)
+        else:
+            heapq.heappush(self._overflow, (deadline, self._sequence, item))
+            self._sequence += 1
+        self._count += 1
+
+    def advance(self):
+        """
+        Move to the next tick, returns the items due at that tick
+        """
+        self.now += 1
+        overflow = self._overflow
+        horizon = self.now + self.size
+        while overflow and overflow[0][0] < horizon:
+            deadline, _, item = heapq.heappop(overflow)
+            self._slots[deadline % self.size].append(item)
+
+        index = self.now % self.size
+        due = self._slots[index]
+        if due:
+            self._slots[index] = []
+            self._count -= len(due)
+        return due
+
+    def advance_to(self, tick):
+        """
+        Move forward to tick, returns every item due on the way
+        """
+        due = []
+        while self.now < tick:
+            due.extend(self.advance())
+        return due
@@ -0,0 +1,204 @@
+"""Module for running actors across several processes
+
+A ShardedRuntime splits the actors of a set of parsed definitions between
+worker processes. Every worker builds its own objects for its actors from
+the same definitions and runs them in an ActorPool. The coordinator moves
+all shards forward in lock step: a tick is only over once every shard has
+run it.
+
+Each shard answers a tick with one message holding the status of all of
+its actors as a byte array, in the order of the actor ids it was given.
+"""
+
+import array
+import logging
+import multiprocessing
+import os
+import traceback
+import oh_behave
+from oh_behave import compiler
+from oh_behave import pool
+from oh_behave import reader
+
+logger = logging.getLogger(__name__)
+
+def _shard_roots(parser, actor_ids):
+    """
+    Returns actor_ids followed by the actors that the entries reachable from
+    them belong to, so that actions shared with actors of other shards are
+    linked to an actor too
+    """
+    actors = {entry.ident for entry in parser.get_entries() if entry.classtype == 'Actor'}
+    roots = list(actor_ids)
+    known = set(roots)
+    while True:
+        referenced = {entry.actor for entry in parser.reachable_entries(roots)
+                      if entry.actor in actors and entry.actor not in known}
+        if not referenced:
+            return roots
+        roots.extend(sorted(referenced))
+        known.update(referenced)
+
+def _unshare_trees(actors):
+    """
+    Give every actor sharing a root node with an earlier one its own copy
+    of the tree, whose state would otherwise depend on which actors run in
+    the same shard
+    """
+    seen = set()
+    for a in actors:
+        rootnode = a.get_rootnode()
+        if rootnode is None:
+            continue
+        if id(rootnode) in seen:
+            a.set_rootnode(compiler.private_tree(rootnode))
+        else:
+            seen.add(id(rootnode))
+
+def _shard_main(connection, definitions, actor_ids, classname_match_table, compiled):
+    """Entry point of the worker processes"""
+    try:
+        parser = reader.DataParser(classname_match_table)
+        for values in definitions:
+            parser._add_entry(reader.ObjectEntry(values))
+        objects = parser.build_objects(roots=_shard_roots(parser, actor_ids))
+        actors = [objects[ident] for ident in actor_ids]
+        if compiled:
+            compiler.compile_actors(objects)
+        else:
+            _unshare_trees(actors)
+        positions = {a : index for index, a in enumerate(actors)}
+        actor_pool = pool.ActorPool(actors)
+        statuses = array.array('b', bytes(len(actors)))
+        connection.send(('ready', None))
+    except Exception:
+        connection.send(('error', traceback.format_exc()))
+        return
+
+    while True:
+        command, argument = connection.recv()
+        if command == 'close':
+            break
+        try:
+            if command == 'tick':
+                for _ in range(argument):
+                    report = actor_pool.tick()
+                    for a in report.succeeded:
+                        statuses[positions[a]] = oh_behave.ExecuteResult.success.value
+                    for a in report.failed:
+                        statuses[positions[a]] = oh_behave.ExecuteResult.failure.value
+                connection.send(('statuses', (statuses.tobytes(), len(actor_pool))))
+        except Exception:
+            connection.send(('error', traceback.format_exc()))
+    connection.close()
+
+class ShardException(RuntimeError):
+    pass
+
+class ShardedRuntime:
+    """
+    Runs the actors defined in parser across shards worker processes, one
+    per CPU by default
+
+    Actors are dealt to the shards in turn. A shard also builds, without
+    running them, the actors that the actions of its trees belong to. With
+    compiled set every shard runs its actors through
+    compiler.compile_actors, otherwise actors sharing a tree each run their
+    own compiler.private_tree of it. Either way the actors keep their state
+    to themselves and the results do not depend on how they are split
+    between the shards.
+    """
+    def __init__(self, parser, shards=None, compiled=False):
+        definitions = [entry.values for entry in parser.get_entries()]
+        self.actor_ids = [entry.ident for entry in parser.get_entries()
+                          if entry.classtype == 'Actor']
+        if shards is None:
+            shards = os.cpu_count() or 1
+        shards = max(1, min(shards, len(self.actor_ids)))
+        self.partitions = [self.actor_ids[index::shards] for index in range(shards)]
+        self.ticks = 0
+        self.remaining = len(self.actor_ids)
+        self._statuses = {}
+        self._connections = []
+        self._processes = []
+        for actor_ids in self.partitions:
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                    target=_shard_main, daemon=True,
+                    args=(child, definitions, actor_ids, parser._classname_match_table, compiled))
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+        try:
+            for connection in self._connections:
+                self._receive(connection)
+        except ShardException:
+            self.close()
+            raise
+        logger.info('Started %d shards for %d actors', shards, len(self.actor_ids))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _receive(self, connection):
+        """Returns the payload of the next message from a shard"""
+        try:
+            kind, payload = connection.recv()
+        except EOFError:
+            raise ShardException('Shard process exited')
+        if kind == 'error':
+            raise ShardException(payload)
+        return payload
+
+    def tick(self, count=1):
+        """
+        Run count ticks on every shard, returns a dictionary of the
+        oh_behave.ExecuteResult of every actor keyed by id
+
+        Finished actors keep reporting the result they finished with.
+        """
+        for connection in self._connections:
+            connection.send(('tick', count))
+        statuses = {}
+        remaining = 0
+        for actor_ids, connection in zip(self.partitions, self._connections):
+            data, active = self._receive(connection)
+            remaining += active
+            for ident, status in zip(actor_ids, array.array('b', data)):
+                statuses[ident] = oh_behave.ExecuteResult(status)
+        self.ticks += count
+        self.remaining = remaining
+        self._statuses = statuses
+        return statuses
+
+    def run(self, max_ticks=None, batch=1):
+        """
+        Tick batch frames at a time until every actor has finished or
+        max_ticks frames have run, returns the final statuses
+        """
+        statuses = self._statuses
+        frames = 0
+        while self.remaining and (max_ticks is None or frames < max_ticks):
+            count = batch if max_ticks is None else min(batch, max_ticks - frames)
+            statuses = self.tick(count)
+            frames += count
+        return statuses
+
+    def close(self):
+        """
+        Stop the worker processes
+        """
+        for connection in self._connections:
+            try:
+                connection.send(('close', None))
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
@@ -0,0 +1,253 @@
+"""Module for keeping compiled actor state in shared memory
+
+A SharedStateBlock lays out the execution state of many instances of one
+compiler.Program as fixed size records in a multiprocessing.shared_memory
+block. The instances run directly on their records, so any process can
+read the state of every actor through a SharedStateView without anything
+being copied or pickled.
+
+Layout:
+    header, little endian
+    metadata, utf-8 JSON of the node ids, opcodes and params of the
+    program, padded to a multiple of 8 bytes
+    records, one per actor, RECORD_STATUS followed by the state array of
+    a ProgramInstance: node slots (composite cursors and ActionTimed
+    times) then compiler.HEADER_SIZE header slots, 8 byte signed each in
+    native byte order
+
+The records are read and written in place, so the block is only meant to
+be shared between processes on the same machine.
+
+The time goals of ActionTimed leaves are the params of their nodes.
+
+Shared memory blocks need Python 3.8 or later, on older versions creating a
+block or a view raises SharedStateException.
+"""
+
+import json
+import logging
+import struct
+import sys
+import oh_behave
+from oh_behave import compiler
+
+try:
+    from multiprocessing import resource_tracker
+    from multiprocessing import shared_memory
+except ImportError:
+    resource_tracker = None
+    shared_memory = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'OHSS'
+VERSION = 1
+
+# magic, version, reserved, record count, slots per record, node count,
+# metadata length
+HEADER = struct.Struct('<4sHHIIII')
+
+# Slot of the last status returned, ahead of the state array
+RECORD_STATUS = 0
+RECORD_STATE = 1
+
+class SharedStateException(ValueError):
+    pass
+
+def _check_supported():
+    """Raises SharedStateException if shared memory is not available"""
+    if shared_memory is None:
+        raise SharedStateException('Shared state needs Python 3.8 or later')
+
+def _attach(name, track):
+    """Returns the SharedMemory block name, registered with the resource tracker if track"""
+    if track:
+        return shared_memory.SharedMemory(name=name)
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    memory = shared_memory.SharedMemory(name=name)
+    # Older versions register every block attached to, take it back
+    if resource_tracker is not None and sys.platform != 'win32':
+        resource_tracker.unregister(memory._name, 'shared_memory')
+    return memory
+
+def _layout(buf):
+    """Returns (count, record size, node count, metadata, records offset) of a block"""
+    magic, version, _, count, record_size, nodes, length = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != VERSION:
+        raise SharedStateException('Shared memory block has an unknown format')
+    metadata = json.loads(bytes(buf[HEADER.size:HEADER.size + length]).decode('utf-8'))
+    offset = HEADER.size + length
+    offset += -offset % 8
+    return count, record_size, nodes, metadata, offset
+
+class SharedProgramInstance(compiler.ProgramInstance):
+    """
+    ProgramInstance running on a record of a SharedStateBlock, the status
+    of every tick is stored in the record as well
+    """
+    __slots__ = ('record',)
+
+    def __init__(self, program, record, actor=None):
+        self.program = program
+        self.record = record
+        self.state = record[RECORD_STATE:]
+        self.actor = actor
+
+    def execute(self):
+        status = super().execute()
+        self.record[RECORD_STATUS] = status.value
+        return status
+
+    def reset(self):
+        super().reset()
+        self.record[RECORD_STATUS] = 0
+
+class SharedStateBlock:
+    """
+    Shared memory holding the state of count instances of program, named
+    name or given a unique name
+    """
+    def __init__(self, program, count, name=None):
+        metadata = json.dumps({'ids' : [str(ident) for ident in program.ids],
+                               'opcodes' : list(program.opcodes),
+                               'params' : list(program.params)}).encode('utf-8')
+        offset = HEADER.size + len(metadata)
+        offset += -offset % 8
+        record_size = RECORD_STATE + len(program) + compiler.HEADER_SIZE
+        size = offset + 8 * record_size * count
+
+        _check_supported()
+        self.program = program
+        self.count = count
+        self.record_size = record_size
+        self._memory = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+        buf = self._memory.buf
+        HEADER.pack_into(buf, 0, MAGIC, VERSION, 0, count, record_size, len(program),
+                         len(metadata))
+        buf[HEADER.size:HEADER.size + len(metadata)] = metadata
+        self._records = buf[offset:size].cast('q')
+        initial = program.new_state()
+        for index in range(count):
+            start = index * record_size
+            self._records[start + RECORD_STATE:start + record_size] = memoryview(initial)
+        self._views = []
+        logger.info('Created shared state block "%s" for %d instances of node id "%s"',
+                    self.name, count, program.get_id())
+
+    @property
+    def name(self):
+        """Name other processes attach to the block with"""
+        return self._memory.name
+
+    def instantiate(self, index, actor=None):
+        """
+        Returns a SharedProgramInstance running on record index
+        """
+        if not 0 <= index < self.count:
+            raise IndexError('Record {0} out of range'.format(index))
+        start = index * self.record_size
+        record = self._records[start:start + self.record_size]
+        instance = SharedProgramInstance(self.program, record, actor)
+        self._views.extend((record, instance.state))
+        return instance
+
+    def close(self):
+        """
+        Detach from the block, instances made by instantiate() cannot be run
+        afterwards
+        """
+        for view in self._views:
+            view.release()
+        self._views = []
+        self._records.release()
+        self._memory.close()
+
+    def unlink(self):
+        """
+        Free the block once every process has closed it
+        """
+        self._memory.unlink()
+
+def share_actors(actors, name=None):
+    """
+    Move the state of actors, whose root nodes must be instances of one
+    compiled program, into a new SharedStateBlock, returns the block
+
+    Each actor keeps running from the state it had.
+    """
+    instances = [a.get_rootnode() for a in actors]
+    if not instances or not all(isinstance(instance, compiler.ProgramInstance)
+                                for instance in instances):
+        raise SharedStateException('Actors must run compiled programs')
+    program = instances[0].program
+    if any(instance.program is not program for instance in instances):
+        raise SharedStateException('Actors must run the same program')
+    block = SharedStateBlock(program, len(actors), name)
+    for index, (a, instance) in enumerate(zip(actors, instances)):
+        shared = block.instantiate(index, a)
+        shared.state[:] = memoryview(instance.state)
+        a.set_rootnode(shared)
+    return block
+
+class SharedStateView:
+    """
+    Read access to a SharedStateBlock created by another process
+
+    Attaching registers the block with the resource tracker of the process,
+    which unlinks it, with a warning about a leak, when the process exits.
+    Processes started through multiprocessing by the one that created the
+    block share its tracker and can keep the default. Other readers must
+    pass track=False so that exiting leaves the block to its creator.
+    """
+    def __init__(self, name, track=True):
+        _check_supported()
+        self._memory = _attach(name, track)
+        buf = self._memory.buf
+        count, record_size, nodes, metadata, offset = _layout(buf)
+        self.count = count
+        self.record_size = record_size
+        self.ids = metadata['ids']
+        self.opcodes = metadata['opcodes']
+        self.params = metadata['params']
+        self.header = RECORD_STATE + nodes
+        self._offset = offset
+        self._records = buf[offset:offset + 8 * record_size * count].cast('q')
+
+    def record(self, index):
+        """
+        Returns a memoryview of the slots of record index
+        """
+        start = index * self.record_size
+        return self._records[start:start + self.record_size]
+
+    def status(self, index):
+        """
+        Returns the oh_behave.ExecuteResult of the last tick of record index
+        """
+        return oh_behave.ExecuteResult(self._records[index * self.record_size + RECORD_STATUS])
+
+    def running_node(self, index):
+        """
+        Returns the id of the node record index resumes from
+        """
+        slot = index * self.record_size + self.header + compiler.SLOT_RESUME
+        return self.ids[self._records[slot]]
+
+    def as_array(self):
+        """
+        Returns a NumPy array of shape (count, record_size) over the
+        records, without copying them
+
+        The view cannot be closed while the array is alive.
+        """
+        import numpy
+        return numpy.ndarray((self.count, self.record_size), dtype=numpy.int64,
+                             buffer=self._memory.buf, offset=self._offset)
+
+    def close(self):
+        """
+        Detach from the block
+        """
+        self._records.release()
+        self._memory.close()
@@ -5,6 +5,7 @@ from unittest import mock
 import oh_behave
 from oh_behave import actor
 from oh_behave import action
+from oh_behave import behave
 
 class TestAction(unittest.TestCase):
     def setUp(self):
@@ -25,30 +26,30 @@ class TestAction(unittest.TestCase):
 
     def test_action_execute_passthrough(self):
         """The execute call is correctly passed through"""
-        with mock.patch.object(self.action, '_execute', autospec=True) as mock_execute:
+        with mock.patch.object(action.Action, '_execute', autospec=True) as mock_execute:
             expected_ret = mock.Mock()
             mock_execute.return_value = expected_ret
             ret = self.action.execute()
             self.assertEqual(expected_ret, ret)
-            mock_execute.assert_called_with()
+            mock_execute.assert_called_with(self.action)
 
     def test_action_failed_passthrough(self):
         """The failed call is correctly passed through"""
-        with mock.patch.object(self.action, '_failed', autospec=True) as mock_failed:
+        with mock.patch.object(action.Action, '_failed', autospec=True) as mock_failed:
             expected_ret = mock.Mock()
             mock_failed.return_value = expected_ret
             ret = self.action.failed()
             self.assertEqual(expected_ret, ret)
-            mock_failed.assert_called_with()
+            mock_failed.assert_called_with(self.action)
 
     def test_action_success_passthrough(self):
         """The failed call is correctly passed through"""
-        with mock.patch.object(self.action, '_success', autospec=True) as mock_success:
+        with mock.patch.object(action.Action, '_success', autospec=True) as mock_success:
             expected_ret = mock.Mock()
             mock_success.return_value = expected_ret
             ret = self.action.success()
             self.assertEqual(expected_ret, ret)
-            mock_success.assert_called_with()
+            mock_success.assert_called_with(self.action)
 
 class TestActionTimed(unittest.TestCase):
     """Tests the iterative leaf  node's logic"""
@@ -79,3 +80,108 @@ class TestActionTimed(unittest.TestCase):
             # Fail if it looks like we are going to loop forever
             self.assertGreater(execs*1.5, loops)
         self.assertEqual(execs, loops)
+
+    def test_node_action_timed_reset(self):
+        """Tests that reset restarts the timer"""
+        timed = action.ActionTimed(actor=self.actor, id="action", timegoal=2)
+        timed.execute()
+        self.assertEqual(timed.execute(), oh_behave.ExecuteResult.success)
+        timed.reset()
+        self.assertEqual(timed.execute(), oh_behave.ExecuteResult.ready)
+
+    def test_node_action_timed_sleeps(self):
+        """Waiting timers ask the actor to sleep until their last tick"""
+        timed = action.ActionTimed(actor=self.actor, id="action", timegoal=5)
+        timed.execute()
+        self.actor.sleep.assert_called_with(3, timed)
+        timed.skip(3)
+        self.assertEqual(timed.execute(), oh_behave.ExecuteResult.success)
+
+    def test_node_action_timed_unlinked_actor(self):
+        """Timers whose actor was never linked do not ask anyone to sleep"""
+        timed = action.ActionTimed(actor='actor01', id="action", timegoal=5)
+        self.assertEqual(timed.execute(), oh_behave.ExecuteResult.ready)
+
+    def test_node_action_timed_sleeps_executing_actor(self):
+        """A timer shared between actors parks the actor executing it"""
+        linked = actor.Actor(name='Billy Bob')
+        timed = action.ActionTimed(actor=linked, id="action", timegoal=5)
+        executing = actor.Actor(name='Guy Mann',
+                                rootnode=behave.NodeLeafAction(id='leaf', action=timed))
+        executing.execute()
+        self.assertEqual(executing.get_sleep(), 3)
+        self.assertEqual(linked.get_sleep(), 0)
+
+class TestActionCondition(unittest.TestCase):
+    """Tests conditions on the actor's blackboard"""
+
+    def setUp(self):
+        self.actor = actor.Actor(name='Billy Bob', blackboard={'health' : 10})
+        self.condition = action.ActionCondition(id='condition', actor=self.actor,
+                                                key='health', value=5, compare='gt')
+
+    def test_action_condition_execute(self):
+        """The comparison decides between success and failure"""
+        self.assertIs(self.condition.execute(), oh_behave.ExecuteResult.success)
+        self.actor.get_blackboard().set('health', 5)
+        self.assertIs(self.condition.execute(), oh_behave.ExecuteResult.failure)
+
+    def test_action_condition_cached(self):
+        """The condition is only evaluated again after the key changes"""
+        compare = mock.Mock(return_value=True)
+        self.condition._compare = compare
+        for _ in range(3):
+            self.condition.execute()
+        self.assertEqual(compare.call_count, 1)
+        self.actor.get_blackboard().set('health', 8)
+        self.condition.execute()
+        self.assertEqual(compare.call_count, 2)
+
+    def test_action_condition_missing_key(self):
+        """Ordering comparisons with a missing key fail"""
+        condition = action.ActionCondition(id='condition', actor=self.actor, key='missing',
+                                           value=1, compare='lt')
+        self.assertIs(condition.execute(), oh_behave.ExecuteResult.failure)
+
+    def test_action_condition_unknown_compare(self):
+        """Unknown comparisons are refused"""
+        with self.assertRaises(ValueError):
+            action.ActionCondition(id='condition', actor=self.actor, key='health',
+                                   compare='about')
+
+    def test_action_assign(self):
+        """Assignments store their value and notify conditions"""
+        assign = action.ActionAssign(id='assign', actor=self.actor, key='health', value=1)
+        self.condition.execute()
+        self.assertIs(assign.execute(), oh_behave.ExecuteResult.success)
+        self.assertEqual(self.actor.get_blackboard().get('health'), 1)
+        self.assertIs(self.condition.execute(), oh_behave.ExecuteResult.failure)
+
+    def test_action_condition_per_actor(self):
+        """Shared conditions read and cache the blackboard of the executing actor"""
+        other = actor.Actor(name='Guy Mann', blackboard={'health' : 1},
+                            rootnode=behave.NodeLeafAction(id='leaf', action=self.condition))
+        self.actor.set_rootnode(other.get_rootnode())
+        self.assertIs(self.actor.execute(), oh_behave.ExecuteResult.success)
+        self.assertIs(other.execute(), oh_behave.ExecuteResult.failure)
+        self.assertIs(self.actor.execute(), oh_behave.ExecuteResult.success)
+
+    def test_action_condition_wait(self):
+        """Waiting conditions are ready and ask the actor to wait for the key"""
+        condition = action.ActionCondition(id='condition', actor=self.actor, key='health',
+                                           value=20, compare='ge', wait=True)
+        self.actor.set_rootnode(behave.NodeLeafAction(id='leaf', action=condition))
+        self.assertIs(self.actor.execute(), oh_behave.ExecuteResult.ready)
+        self.assertEqual(self.actor.get_waits(), ['health'])
+        self.actor.get_blackboard().set('health', 25)
+        self.assertIs(self.actor.execute(), oh_behave.ExecuteResult.success)
+        self.assertEqual(self.actor.get_waits(), [])
+
+    def test_action_assign_executing_actor(self):
+        """Shared assignments write to the blackboard of the executing actor"""
+        assign = action.ActionAssign(id='assign', actor=self.actor, key='health', value=1)
+        other = actor.Actor(name='Guy Mann',
+                            rootnode=behave.NodeLeafAction(id='leaf', action=assign))
+        other.execute()
+        self.assertEqual(other.get_blackboard().get('health'), 1)
+        self.assertEqual(self.actor.get_blackboard().get('health'), 10)
@@ -32,6 +32,13 @@ class TestActor(unittest.TestCase):
         self.assertIs(a.name, self.name)
         self.assertIs(a._rootnode, None)
 
+    def test_get_blackboard(self):
+        """Actors are given a blackboard, from initial values if any"""
+        self.assertEqual(len(self.actor.get_blackboard()), 0)
+        self.assertIs(self.actor.get_blackboard(), self.actor.get_blackboard())
+        a = actor.Actor(name=self.name, blackboard={'health' : 10})
+        self.assertEqual(a.get_blackboard().get('health'), 10)
+
     def test_execute_no_rootnode(self):
         """execute does not attempt to run if rootnode is None"""
         self.actor._rootnode = None
@@ -61,3 +68,48 @@ class TestActor(unittest.TestCase):
         self.actor.set_rootnode(new_node)
         self.assertIs(self.actor._rootnode, new_node)
 
+
+    def test_sleep_shortest_wins(self):
+        """The shortest sleep requested during a tick is kept"""
+        sleeper1 = mock.Mock()
+        sleeper2 = mock.Mock()
+        self.actor.sleep(5, sleeper1)
+        self.actor.sleep(3, sleeper2)
+        self.assertEqual(self.actor.get_sleep(), 3)
+        self.actor.wake(3)
+        sleeper1.skip.assert_called_with(3)
+        sleeper2.skip.assert_called_with(3)
+        self.assertEqual(self.actor.get_sleep(), 0)
+
+    def test_execute_clears_sleep(self):
+        """Sleep requests only last for the tick they were made in"""
+        sleeper = mock.Mock()
+        self.actor.sleep(5, sleeper)
+        self.actor.execute()
+        self.assertEqual(self.actor.get_sleep(), 0)
+        self.actor.wake(0)
+        sleeper.skip.assert_not_called()
+
+    def test_stay_awake_cancels_sleep(self):
+        """stay_awake drops the sleeps of the tick, including later ones"""
+        sleeper = mock.Mock()
+        self.actor.sleep(5, sleeper)
+        self.assertEqual(self.actor.count_sleepers(), 1)
+        self.actor.stay_awake()
+        self.actor.sleep(3, sleeper)
+        self.assertEqual(self.actor.get_sleep(), 0)
+        self.assertEqual(self.actor.count_sleepers(), 0)
+        self.actor.execute()
+        self.actor.sleep(3, sleeper)
+        self.assertEqual(self.actor.get_sleep(), 3)
+
+    def test_wait(self):
+        """Waits count as sleepers and only last for the tick"""
+        self.actor.wait('health')
+        self.assertEqual(self.actor.get_waits(), ['health'])
+        self.assertEqual(self.actor.count_sleepers(), 1)
+        self.actor.execute()
+        self.assertEqual(self.actor.get_waits(), [])
+        self.actor.stay_awake()
+        self.actor.wait('health')
+        self.assertEqual(self.actor.get_waits(), [])
@@ -0,0 +1,125 @@
+"""Unit tests for aio module"""
+
+import asyncio
+import contextvars
+import unittest
+from unittest import mock
+
+import oh_behave
+from oh_behave import action
+from oh_behave import actor
+from oh_behave import aio
+from oh_behave import behave
+
+def async_actor(name, coroutine):
+    """Returns an actor whose tree is a sequence of one async leaf"""
+    a = actor.Actor(name=name)
+    act = action.ActionAsync(id=name + '_action', actor=a, coroutine=coroutine)
+    root = behave.NodeSequence(id=name + '_root')
+    root.addchild(behave.NodeLeafAction(id=name + '_leaf', action=act))
+    a.set_rootnode(root)
+    return a
+
+class TestActionAsync(unittest.TestCase):
+    """Tests actions running coroutines"""
+
+    def test_action_async_result(self):
+        """The leaf is ready while the coroutine runs and then takes its result"""
+        async def work(act):
+            await asyncio.sleep(0)
+            return True
+        a = async_actor('Billy Bob', work)
+        self.assertIs(aio.run([a])[0], oh_behave.ExecuteResult.success)
+
+    def test_action_async_failure(self):
+        """Coroutines returning false values or raising fail"""
+        async def falsy(act):
+            return 0
+        async def error(act):
+            raise RuntimeError('service unavailable')
+        async def failure(act):
+            return oh_behave.ExecuteResult.failure
+        actors = [async_actor(name, coroutine) for name, coroutine in
+                  (('falsy', falsy), ('error', error), ('failure', failure))]
+        self.assertEqual(aio.run(actors), [oh_behave.ExecuteResult.failure] * 3)
+
+    def test_action_async_reset(self):
+        """Resetting the action cancels its task"""
+        async def forever(act):
+            await asyncio.Event().wait()
+        async def scenario():
+            act = action.ActionAsync(id='action', actor=None, coroutine=forever)
+            self.assertIs(act.execute(), oh_behave.ExecuteResult.ready)
+            task = act._tasks[None]
+            act.reset()
+            await asyncio.sleep(0)
+            return task
+        self.assertTrue(asyncio.run(scenario()).cancelled())
+
+    def test_action_async_per_actor(self):
+        """Actors sharing the action run and reset their own tasks"""
+        started = []
+        async def forever(act):
+            started.append(act)
+            await asyncio.Event().wait()
+        async def scenario():
+            act = action.ActionAsync(id='action', actor=None, coroutine=forever)
+            actors = [actor.Actor(name=name, rootnode=behave.NodeLeafAction(id='leaf', action=act))
+                      for name in ('Billy Bob', 'Guy Mann')]
+            for a in actors:
+                self.assertIs(a.execute(), oh_behave.ExecuteResult.ready)
+            await asyncio.sleep(0)
+            tasks = dict(act._tasks)
+            self.assertEqual(set(tasks), set(actors))
+            def reset():
+                actor._executing.set(actors[0])
+                actors[0].get_rootnode().reset()
+            contextvars.copy_context().run(reset)
+            await asyncio.sleep(0)
+            return [tasks[a].cancelled() for a in actors], len(started)
+        self.assertEqual(asyncio.run(scenario()), ([True, False], 2))
+
+    def test_action_async_no_loop(self):
+        """Async actions need a running event loop"""
+        async def work(act):
+            return True
+        act = action.ActionAsync(id='action', actor=None, coroutine=work)
+        with self.assertRaises(RuntimeError):
+            act.execute()
+
+class TestRunActors(unittest.TestCase):
+    """Tests the asyncio driver"""
+
+    def test_run_actors_concurrently(self):
+        """Actors waiting on slow actions do not block each other"""
+        async def scenario():
+            event = asyncio.Event()
+            async def wait(act):
+                await event.wait()
+                return True
+            async def release(act):
+                event.set()
+                return True
+            actors = [async_actor('waiter{0}'.format(index), wait) for index in range(1000)]
+            actors.append(async_actor('releaser', release))
+            return await aio.run_actors(actors)
+        results = asyncio.run(scenario())
+        self.assertEqual(set(results), {oh_behave.ExecuteResult.success})
+
+    def test_run_actor_max_ticks(self):
+        """Actors still running after max_ticks report ready"""
+        async def forever(act):
+            await asyncio.Event().wait()
+        a = async_actor('Billy Bob', forever)
+        self.assertEqual(aio.run([a], max_ticks=3), [oh_behave.ExecuteResult.ready])
+
+    def test_run_actor_sleep(self):
+        """Ticks an actor asked to sleep for are skipped"""
+        a = actor.Actor(name='Billy Bob')
+        timed = action.ActionTimed(id='wait', actor=a, timegoal=10)
+        a.set_rootnode(behave.NodeLeafAction(id='leaf', action=timed))
+        with mock.patch.object(actor.Actor, 'execute', autospec=True,
+                               side_effect=actor.Actor.execute) as mock_execute:
+            self.assertEqual(aio.run([a]), [oh_behave.ExecuteResult.success])
+        # The first tick asks to sleep until the last one
+        self.assertEqual(mock_execute.call_count, 2)
@@ -1,10 +1,13 @@
 """Test for behavior module"""
+import threading
 import unittest
 import pprint
 from unittest import mock
 
 import oh_behave
+from oh_behave import actor
 from oh_behave import behave
+from oh_behave import offload
 
 
 def mocknode_builder(execstatus):
@@ -59,6 +62,20 @@ class TestNode(unittest.TestCase):
         with self.assertRaises(oh_behave.MissingArgumentException):
             node = behave.NodeComposite()
 
+    def test_node_slots(self):
+        """Built in nodes do not carry an attribute dictionary"""
+        nodes = [behave.NodeSequence(id='sequence'), behave.NodeSelector(id='selector'),
+                 behave.NodeDecoratorInvert(id='invert', decoratee=None),
+                 behave.NodeLeafAction(id='leaf', action=None)]
+        for node in nodes:
+            self.assertFalse(hasattr(node, '__dict__'))
+
+    def test_execute_result_enum(self):
+        """Results are plain enum members, not integers"""
+        self.assertNotEqual(oh_behave.ExecuteResult.success, 1)
+        self.assertEqual(oh_behave.ExecuteResult.success.value, 1)
+        self.assertEqual(str(oh_behave.ExecuteResult.ready), 'ExecuteResult.ready')
+
 class TestNodeComposite(unittest.TestCase):
     """Tests the composite node's logic"""
     def setUp(self):
@@ -132,6 +149,57 @@ class TestNodeSequence(unittest.TestCase):
         result = self.sequence.execute()
         self.assertEqual(result, oh_behave.ExecuteResult.success)
 
+    def test_node_sequence_execute_keeps_children(self):
+        """Sequence exec does not remove finished children"""
+        node1 = mocknode_builder(oh_behave.ExecuteResult.success)
+        node2 = mocknode_builder(oh_behave.ExecuteResult.success)
+        self.sequence.addchild(node1)
+        self.sequence.addchild(node2)
+        self.sequence.execute()
+        self.sequence.execute()
+        self.assertEqual(self.sequence.get_children(), [node1, node2])
+        result = self.sequence.execute()
+        self.assertEqual(result, oh_behave.ExecuteResult.success)
+        assert_node_calls(node1, 1, 0, 1)
+        assert_node_calls(node2, 1, 0, 1)
+
+    def test_node_sequence_reset(self):
+        """Sequence reset rewinds to the first child and resets children"""
+        node1 = mocknode_builder(oh_behave.ExecuteResult.success)
+        node2 = mocknode_builder(oh_behave.ExecuteResult.ready)
+        self.sequence.addchild(node1)
+        self.sequence.addchild(node2)
+        self.sequence.execute()
+        self.sequence.reset()
+        node1.reset.assert_called_with()
+        node2.reset.assert_called_with()
+        self.sequence.execute()
+        assert_node_calls(node1, 2, 0, 2)
+        assert_node_calls(node2, 0, 0, 0)
+
+    def test_node_sequence_reset_policy_on_success(self):
+        """Sequence rewinds by itself after succeeding when asked to"""
+        sequence = behave.NodeSequence(id='sequence01', reset_policy='on_success')
+        node = mocknode_builder(oh_behave.ExecuteResult.success)
+        sequence.addchild(node)
+        for _ in range(3):
+            self.assertEqual(sequence.execute(), oh_behave.ExecuteResult.success)
+        assert_node_calls(node, 3, 0, 3)
+
+    def test_node_sequence_reset_policy_on_failure(self):
+        """Sequence restarts from its first child after failing when asked to"""
+        sequence = behave.NodeSequence(id='sequence01',
+                                       reset_policy=behave.ResetPolicy.on_failure)
+        node1 = mocknode_builder(oh_behave.ExecuteResult.success)
+        node2 = mocknode_builder(oh_behave.ExecuteResult.failure)
+        sequence.addchild(node1)
+        sequence.addchild(node2)
+        self.assertEqual(sequence.execute(), oh_behave.ExecuteResult.ready)
+        self.assertEqual(sequence.execute(), oh_behave.ExecuteResult.failure)
+        self.assertEqual(sequence.execute(), oh_behave.ExecuteResult.ready)
+        assert_node_calls(node1, 2, 0, 2)
+        assert_node_calls(node2, 0, 1, 1)
+
 class TestNodeSelector(unittest.TestCase):
     """Tests the selector node's logic"""
 
@@ -195,6 +263,198 @@ class TestNodeSelector(unittest.TestCase):
         result = self.selector.execute()
         self.assertEqual(result, oh_behave.ExecuteResult.failure)
 
+    def test_node_selector_reset_policy_always(self):
+        """selector rewinds after every result when asked to"""
+        selector = behave.NodeSelector(id='selector01', reset_policy='always')
+        node1 = mocknode_builder(oh_behave.ExecuteResult.failure)
+        node2 = mocknode_builder(oh_behave.ExecuteResult.failure)
+        selector.addchild(node1)
+        selector.addchild(node2)
+        self.assertEqual(selector.execute(), oh_behave.ExecuteResult.ready)
+        self.assertEqual(selector.execute(), oh_behave.ExecuteResult.failure)
+        self.assertEqual(selector.execute(), oh_behave.ExecuteResult.ready)
+        assert_node_calls(node1, 0, 2, 2)
+        assert_node_calls(node2, 0, 1, 1)
+
+class TestNodeParallel(unittest.TestCase):
+    """Tests the parallel node's logic"""
+
+    def setUp(self):
+        self.parallel = behave.NodeParallel(id='parallel00')
+
+    def test_node_parallel__init__bad_threshold(self):
+        """Thresholds that can never be met are refused"""
+        with self.assertRaises(ValueError):
+            behave.NodeParallel(id='parallel01', failure_threshold=0)
+        with self.assertRaises(ValueError):
+            behave.NodeParallel(id='parallel01', success_threshold=-1)
+
+    def test_node_parallel_execute_all_running(self):
+        """parallel exec ticks every child while they are running"""
+        node1 = mocknode_builder(oh_behave.ExecuteResult.ready)
+        node2 = mocknode_builder(oh_behave.ExecuteResult.ready)
+        self.parallel.addchild(node1)
+        self.parallel.addchild(node2)
+        self.assertEqual(self.parallel.execute(), oh_behave.ExecuteResult.ready)
+        self.assertEqual(self.parallel.execute(), oh_behave.ExecuteResult.ready)
+        assert_node_calls(node1, 0, 0, 2)
+        assert_node_calls(node2, 0, 0, 2)
+
+    def test_node_parallel_execute_success(self):
+        """parallel succeeds once every child succeeded, ticking only running ones"""
+        node1 = mocknode_builder(oh_behave.ExecuteResult.success)
+        node2 = mocknode_builder(oh_behave.ExecuteResult.ready)
+        self.parallel.addchild(node1)
+        self.parallel.addchild(node2)
+        self.assertEqual(self.parallel.execute(), oh_behave.ExecuteResult.ready)
+        node2.execute.return_value = oh_behave.ExecuteResult.success
+        self.assertEqual(self.parallel.execute(), oh_behave.ExecuteResult.success)
+        self.assertEqual(self.parallel.execute(), oh_behave.ExecuteResult.success)
+        assert_node_calls(node1, 1, 0, 1)
+        assert_node_calls(node2, 1, 0, 2)
+
+    def test_node_parallel_execute_failure_resets_running(self):
+        """parallel fails on the first failure and resets the running children"""
+        node1 = mocknode_builder(oh_behave.ExecuteResult.ready)
+        node2 = mocknode_builder(oh_behave.ExecuteResult.failure)
+        self.parallel.addchild(node1)
+        self.parallel.addchild(node2)
+        self.assertEqual(self.parallel.execute(), oh_behave.ExecuteResult.failure)
+        assert_node_calls(node1, 0, 0, 1)
+        assert_node_calls(node2, 0, 1, 1)
+        node1.reset.assert_called_once_with()
+        node2.reset.assert_not_called()
+
+    def test_node_parallel_execute_thresholds(self):
+        """parallel finishes once the thresholds are met"""
+        parallel = behave.NodeParallel(id='parallel01', success_threshold=1,
+                                       failure_threshold=2)
+        node1 = mocknode_builder(oh_behave.ExecuteResult.failure)
+        node2 = mocknode_builder(oh_behave.ExecuteResult.ready)
+        parallel.addchild(node1)
+        parallel.addchild(node2)
+        self.assertEqual(parallel.execute(), oh_behave.ExecuteResult.ready)
+        node2.execute.return_value = oh_behave.ExecuteResult.success
+        self.assertEqual(parallel.execute(), oh_behave.ExecuteResult.success)
+
+    def test_node_parallel_execute_cannot_succeed(self):
+        """parallel fails when too few children are left to succeed"""
+        parallel = behave.NodeParallel(id='parallel01', failure_threshold=5)
+        node1 = mocknode_builder(oh_behave.ExecuteResult.failure)
+        node2 = mocknode_builder(oh_behave.ExecuteResult.ready)
+        parallel.addchild(node1)
+        parallel.addchild(node2)
+        self.assertEqual(parallel.execute(), oh_behave.ExecuteResult.failure)
+
+    def test_node_parallel_execute_empty(self):
+        """parallel exec returns success when it has no children"""
+        self.assertEqual(self.parallel.execute(), oh_behave.ExecuteResult.success)
+
+    def test_node_parallel_reset(self):
+        """parallel runs its children again after a reset"""
+        node1 = mocknode_builder(oh_behave.ExecuteResult.success)
+        self.parallel.addchild(node1)
+        self.assertEqual(self.parallel.execute(), oh_behave.ExecuteResult.success)
+        self.parallel.reset()
+        node1.execute.return_value = oh_behave.ExecuteResult.ready
+        self.assertEqual(self.parallel.execute(), oh_behave.ExecuteResult.ready)
+        assert_node_calls(node1, 1, 0, 2)
+        node1.reset.assert_called_once_with()
+
+    def test_node_parallel_sleep_veto(self):
+        """The actor is kept awake while a running child did not ask to sleep"""
+        a = actor.Actor(name='Billy Bob')
+        sleeper = mock.Mock()
+        node1 = mocknode_builder(oh_behave.ExecuteResult.ready)
+        node1.execute.side_effect = lambda: a.sleep(5, sleeper) or oh_behave.ExecuteResult.ready
+        node2 = mocknode_builder(oh_behave.ExecuteResult.ready)
+        parallel = behave.NodeParallel(id='parallel01', actor=a)
+        parallel.addchild(node1)
+        parallel.addchild(node2)
+        a.set_rootnode(parallel)
+        a.execute()
+        self.assertEqual(a.get_sleep(), 0)
+        node2.execute.side_effect = lambda: a.sleep(3, sleeper) or oh_behave.ExecuteResult.ready
+        a.execute()
+        self.assertEqual(a.get_sleep(), 3)
+
+    def test_node_parallel_sleep_veto_executing_actor(self):
+        """Without an actor of its own the node keeps the executing actor awake"""
+        a = actor.Actor(name='Billy Bob')
+        node1 = mocknode_builder(oh_behave.ExecuteResult.ready)
+        node1.execute.side_effect = lambda: a.sleep(5, mock.Mock()) or oh_behave.ExecuteResult.ready
+        node2 = mocknode_builder(oh_behave.ExecuteResult.ready)
+        parallel = behave.NodeParallel(id='parallel01')
+        parallel.addchild(node1)
+        parallel.addchild(node2)
+        a.set_rootnode(parallel)
+        a.execute()
+        self.assertEqual(a.get_sleep(), 0)
+
+    def test_node_parallel_concurrent(self):
+        """Concurrent children block at the same time rather than one after another"""
+        barrier = threading.Barrier(3, timeout=5)
+        def wait():
+            barrier.wait()
+            return oh_behave.ExecuteResult.success
+        parallel = behave.NodeParallel(id='parallel01', concurrent=True,
+                                       executor=offload.BoundedExecutor(2))
+        nodes = [mocknode_builder(oh_behave.ExecuteResult.ready) for _ in range(3)]
+        for node in nodes:
+            node.execute.side_effect = wait
+            parallel.addchild(node)
+        self.assertEqual(parallel.execute(), oh_behave.ExecuteResult.success)
+        for node in nodes:
+            assert_node_calls(node, 1, 0, 1)
+
+    def test_node_parallel_concurrent_nested(self):
+        """Nested concurrent nodes do not wait on the executor they run on"""
+        executor = offload.BoundedExecutor(1, max_pending=4)
+        self.addCleanup(executor.shutdown)
+        inner = behave.NodeParallel(id='inner', concurrent=True, executor=executor)
+        outer = behave.NodeParallel(id='outer', concurrent=True, executor=executor)
+        for _ in range(2):
+            inner.addchild(mocknode_builder(oh_behave.ExecuteResult.success))
+        outer.addchild(inner)
+        outer.addchild(mocknode_builder(oh_behave.ExecuteResult.success))
+        results = []
+        thread = threading.Thread(target=lambda: results.append(outer.execute()), daemon=True)
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(results, [oh_behave.ExecuteResult.success])
+
+    def test_node_parallel_concurrent_executing_actor(self):
+        """Children run on the executor act for the executing actor"""
+        executor = offload.BoundedExecutor(2)
+        self.addCleanup(executor.shutdown)
+        seen = []
+        def record():
+            seen.append(actor.get_executing())
+            return oh_behave.ExecuteResult.success
+        parallel = behave.NodeParallel(id='parallel01', concurrent=True, executor=executor)
+        for _ in range(3):
+            node = mocknode_builder(oh_behave.ExecuteResult.ready)
+            node.execute.side_effect = record
+            parallel.addchild(node)
+        a = actor.Actor(name='Billy Bob', rootnode=parallel)
+        self.assertEqual(a.execute(), oh_behave.ExecuteResult.success)
+        self.assertEqual(seen, [a] * 3)
+
+    def test_node_parallel_concurrent_rejected(self):
+        """Children refused by the executor run on the calling thread"""
+        executor = mock.Mock()
+        executor.try_submit.return_value = None
+        parallel = behave.NodeParallel(id='parallel01', concurrent=True, executor=executor)
+        node1 = mocknode_builder(oh_behave.ExecuteResult.success)
+        node2 = mocknode_builder(oh_behave.ExecuteResult.success)
+        parallel.addchild(node1)
+        parallel.addchild(node2)
+        self.assertEqual(parallel.execute(), oh_behave.ExecuteResult.success)
+        self.assertEqual(executor.try_submit.call_count, 1)
+        assert_node_calls(node1, 1, 0, 1)
+        assert_node_calls(node2, 1, 0, 1)
+
 class TestNodeDecorator(unittest.TestCase):
     """Tests the decorator node base's logic"""
     def setUp(self):
@@ -244,6 +504,11 @@ class TestNodeDecorator(unittest.TestCase):
         self.decorator.failed()
         self.mock_node.failed.assert_called_with()
 
+    def test_node_decorator_reset_passthrough(self):
+        """Tests that the decorator passes reset call through"""
+        self.decorator.reset()
+        self.mock_node.reset.assert_called_with()
+
 class TestNodeDecoratorInvert(unittest.TestCase):
     """Tests the decorator node base's logic"""
     def setUp(self):
@@ -321,3 +586,8 @@ class TestNodeLeafAction(unittest.TestCase):
         self.leaf.failed()
         self.mock_action.failed.assert_called_with()
 
+    def test_node_leaf_action_reset_passthrough(self):
+        """Tests that the leaf passes reset call through"""
+        self.leaf.reset()
+        self.mock_action.reset.assert_called_with()
+
@@ -0,0 +1,67 @@
+"""Unit tests for blackboard module"""
+
+import unittest
+from unittest import mock
+
+from oh_behave import blackboard
+
+class TestBlackboard(unittest.TestCase):
+    """Tests the blackboard store"""
+    def setUp(self):
+        self.blackboard = blackboard.Blackboard({'health' : 10, 'target' : None})
+
+    def test_get(self):
+        """Values are read back by key, missing keys give the default"""
+        self.assertEqual(self.blackboard.get('health'), 10)
+        self.assertIs(self.blackboard.get('target'), None)
+        self.assertEqual(self.blackboard.get('missing', 'default'), 'default')
+        self.assertIn('target', self.blackboard)
+        self.assertEqual(len(self.blackboard), 2)
+
+    def test_set_typed(self):
+        """Slots keep the type of their first value"""
+        self.blackboard.set('health', 5)
+        with self.assertRaises(TypeError):
+            self.blackboard.set('health', 'full')
+        self.blackboard.set('target', 'door')
+        self.assertIs(self.blackboard.get_type('target'), str)
+        self.blackboard.set('target', None)
+
+    def test_declare(self):
+        """Declared slots accept integers as floats"""
+        self.blackboard.declare('speed', float, 1.5)
+        self.blackboard.set('speed', 2)
+        self.assertEqual(self.blackboard.get('speed'), 2)
+        with self.assertRaises(KeyError):
+            self.blackboard.declare('speed', int)
+
+    def test_subscribe(self):
+        """Subscribers are called when a value changes"""
+        callback = mock.Mock()
+        self.blackboard.subscribe('health', callback)
+        self.blackboard.set('health', 10)
+        callback.assert_not_called()
+        self.blackboard.set('health', 3)
+        callback.assert_called_once_with('health', 3)
+        self.blackboard.unsubscribe('health', callback)
+        self.blackboard.set('health', 4)
+        self.assertEqual(callback.call_count, 1)
+
+    def test_version(self):
+        """Versions count declarations and changes of a key"""
+        self.assertEqual(self.blackboard.version('missing'), 0)
+        version = self.blackboard.version('health')
+        self.blackboard.set('health', 10)
+        self.assertEqual(self.blackboard.version('health'), version)
+        self.blackboard.set('health', 3)
+        self.assertEqual(self.blackboard.version('health'), version + 1)
+        self.blackboard.declare('speed', float, 1.5)
+        self.assertEqual(self.blackboard.version('speed'), 1)
+
+    def test_remember(self):
+        """Memos are kept per owner"""
+        owner = object()
+        self.assertIs(self.blackboard.recall(owner), None)
+        self.blackboard.remember(owner, (1, 'memo'))
+        self.assertEqual(self.blackboard.recall(owner), (1, 'memo'))
+        self.assertIs(self.blackboard.recall(object()), None)
@@ -0,0 +1,183 @@
+"""Unit tests for cache module"""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from oh_behave import cache
+from oh_behave import reader
+
+class TestCache(unittest.TestCase):
+    """Tests writing and reading the binary definition cache"""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cachepath = os.path.join(self.tempdir.name, 'definitions.ohbc')
+        self.digest = b'\x01' * 32
+        self.definitions = [
+            {'id': 'actor01', 'type': 'Actor', 'name': 'Guÿ Männ', 'rootnode': 'node01'},
+            {'id': 'node01', 'type': 'NodeSequence', 'childnodes': ['node02', 'leaf'],
+             'reset_policy': 'always'},
+            {'id': 'node02', 'type': 'NodeSelector', 'childnodes': [], 'name': None},
+            {'id': 'leaf', 'type': 'NodeLeafAction', 'action': 'wait'},
+            {'id': 'wait', 'type': 'ActionTimed', 'actor': 'actor01', 'timegoal': 5},
+            {'id': 'invert', 'type': 'NodeDecoratorInvert', 'decoratee': 'node02'}
+        ]
+        self.entries = [reader.ObjectEntry(values) for values in self.definitions]
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_read_cache_round_trip(self):
+        """Definitions read back are equal to the ones written"""
+        cache.write_cache(self.cachepath, self.entries, self.digest)
+        self.assertEqual(cache.read_cache(self.cachepath, self.digest), self.definitions)
+
+    def test_read_library_links(self):
+        """References are stored as the indices of the entries they name"""
+        self.definitions.append({'id': 'orphan', 'type': 'ActionTimed', 'actor': 'nobody',
+                                 'timegoal': 1})
+        cache.write_cache(self.cachepath, [reader.ObjectEntry(values)
+                                           for values in self.definitions], self.digest)
+        library = cache.read_library(self.cachepath, self.digest)
+        self.assertEqual(len(library), 7)
+        links = [library.links[index:index + cache.LINK_FIELDS]
+                 for index in range(0, len(library.links), cache.LINK_FIELDS)]
+        self.assertEqual(library.classtypes[links[0][0]], 'Actor')
+        self.assertEqual(list(links[0][1:5]), [1, cache.NONE, cache.NONE, cache.NONE])
+        first, count = links[1][5:]
+        self.assertEqual(list(library.children[first:first + count]), [2, 3])
+        self.assertEqual(links[3][3], 4)
+        self.assertEqual(links[4][4], 0)
+        self.assertEqual(links[5][2], 2)
+        self.assertEqual(links[6][4], cache.UNRESOLVED)
+
+    def test_read_cache_interns_strings(self):
+        """Repeated strings are stored once"""
+        cache.write_cache(self.cachepath, self.entries, self.digest)
+        with open(self.cachepath, 'rb') as source:
+            self.assertEqual(source.read().count(b'actor01'), 1)
+
+    def test_read_cache_stale(self):
+        """Caches written for other content are not used"""
+        cache.write_cache(self.cachepath, self.entries, self.digest)
+        self.assertIs(cache.read_cache(self.cachepath, b'\x02' * 32), None)
+
+    def test_read_cache_missing(self):
+        """Missing caches are reported as None"""
+        self.assertIs(cache.read_cache(self.cachepath, self.digest), None)
+
+    def test_read_cache_corrupt(self):
+        """Unreadable caches are reported as None"""
+        cache.write_cache(self.cachepath, self.entries, self.digest)
+        with open(self.cachepath, 'r+b') as output:
+            output.truncate(cache.HEADER.size + 10)
+        self.assertIs(cache.read_cache(self.cachepath, self.digest), None)
+        with open(self.cachepath, 'wb') as output:
+            output.write(b'garbage' * 20)
+        self.assertIs(cache.read_cache(self.cachepath, self.digest), None)
+
+    def test_read_cache_bad_index(self):
+        """Caches with indices outside their tables are reported as None"""
+        cache.write_cache(self.cachepath, self.entries, self.digest)
+        with open(self.cachepath, 'rb') as source:
+            data = source.read()
+        # Second child of node01, the rootnode of actor01 and the child range
+        # of node01
+        offsets = [cache.HEADER.size + cache.LINK.size * len(self.entries) + 4,
+                   cache.HEADER.size + 4,
+                   cache.HEADER.size + cache.LINK.size + 4 * (cache.LINK_FIELDS - 2)]
+        for offset in offsets:
+            with open(self.cachepath, 'wb') as output:
+                output.write(data[:offset] + b'\x40\x00\x00\x00' + data[offset + 4:])
+            self.assertIs(cache.read_cache(self.cachepath, self.digest), None)
+
+class TestParseFileCached(unittest.TestCase):
+    """Tests parsing through the cache"""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.tempdir.name, 'definitions.json')
+        self.write_source([{'id': 'node01', 'type': 'NodeSequence', 'childnodes': ['node02']},
+                           {'id': 'node02', 'type': 'NodeSelector'}])
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write_source(self, definitions):
+        """Writes definitions to the source file"""
+        with open(self.filepath, 'w') as output:
+            output.write('\n'.join(json.dumps(d) for d in definitions))
+
+    def test_parse_file_cached(self):
+        """The second parse is served from the cache"""
+        first = reader.DataParser()
+        self.assertEqual(first.parse_file_cached(self.filepath), 2)
+        self.assertTrue(os.path.exists(self.filepath + '.ohbc'))
+        second = reader.DataParser()
+        with mock.patch.object(second, 'parse_file') as mock_parse:
+            self.assertEqual(second.parse_file_cached(self.filepath), 2)
+            mock_parse.assert_not_called()
+        self.assertEqual([e.values for e in first._entries],
+                         [e.values for e in second._entries])
+        objects = second.build_objects()
+        self.assertIs(objects['node01'].get_children()[0], objects['node02'])
+
+    def test_parse_file_cached_rebuilds(self):
+        """Changing the source file rebuilds the cache"""
+        cachepath = os.path.join(self.tempdir.name, 'other.ohbc')
+        reader.DataParser().parse_file_cached(self.filepath, cachepath)
+        self.write_source([{'id': 'node03', 'type': 'NodeSequence'}])
+        parser = reader.DataParser()
+        self.assertEqual(parser.parse_file_cached(self.filepath, cachepath), 1)
+        self.assertEqual(parser._entries[0].ident, 'node03')
+
+    def test_load_objects_cached(self):
+        """Objects loaded from the cache are built and linked like build_objects"""
+        self.write_source([
+            {'id': 'actor01', 'type': 'Actor', 'name': 'Guy Mann', 'rootnode': 'node01'},
+            {'id': 'node01', 'type': 'NodeSequence', 'childnodes': ['invert', 'leaf'],
+             'reset_policy': 'always'},
+            {'id': 'invert', 'type': 'NodeDecoratorInvert', 'decoratee': 'node02'},
+            {'id': 'node02', 'type': 'NodeSelector'},
+            {'id': 'leaf', 'type': 'NodeLeafAction', 'action': 'wait'},
+            {'id': 'wait', 'type': 'ActionTimed', 'actor': 'actor01', 'timegoal': 2},
+            {'id': 'other', 'type': 'ActionTimed', 'actor': 'elsewhere', 'timegoal': 2}])
+        parser = reader.DataParser()
+        expected = parser.load_objects_cached(self.filepath)
+        self.assertTrue(os.path.exists(self.filepath + '.ohbc'))
+        with mock.patch.object(reader.DataParser, 'parse_file') as mock_parse:
+            objects = parser.load_objects_cached(self.filepath)
+            mock_parse.assert_not_called()
+        self.assertEqual(parser.get_entries(), [])
+        self.assertEqual(set(objects), set(expected))
+        for ident, obj in objects.items():
+            self.assertIs(type(obj), type(expected[ident]))
+        self.assertIs(objects['actor01'].get_rootnode(), objects['node01'])
+        self.assertEqual(objects['node01'].get_children(), [objects['invert'], objects['leaf']])
+        self.assertIs(objects['invert'].get_decoratee(), objects['node02'])
+        self.assertIs(objects['leaf'].get_action(), objects['wait'])
+        self.assertIs(objects['wait']._actor, objects['actor01'])
+        self.assertEqual(objects['other']._actor, 'elsewhere')
+        for _ in range(3):
+            self.assertEqual(objects['actor01'].execute(), expected['actor01'].execute())
+
+    def test_load_objects_cached_corrupt(self):
+        """A cache with a bad child index falls back to the source file"""
+        cachepath = self.filepath + '.ohbc'
+        reader.DataParser().load_objects_cached(self.filepath)
+        with open(cachepath, 'r+b') as output:
+            output.seek(cache.HEADER.size + 2 * cache.LINK.size)
+            output.write(b'\xff\x00\x00\x00')
+        objects = reader.DataParser().load_objects_cached(self.filepath)
+        self.assertIs(objects['node01'].get_children()[0], objects['node02'])
+
+    def test_load_objects_cached_unresolved(self):
+        """Missing tree references raise like build_objects"""
+        self.write_source([{'id': 'node01', 'type': 'NodeSequence', 'childnodes': ['missing']}])
+        parser = reader.DataParser()
+        for _ in range(2):
+            with self.assertRaises(KeyError):
+                parser.load_objects_cached(self.filepath)
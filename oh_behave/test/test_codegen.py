@@ -0,0 +1,93 @@
+"""Unit tests for codegen module"""
+
+import unittest
+from unittest import mock
+
+import oh_behave
+from oh_behave import action
+from oh_behave import behave
+from oh_behave import codegen
+from oh_behave import compiler
+from oh_behave.test.test_behave import mocknode_builder, assert_node_calls
+from oh_behave.test.test_compiler import build_tree, build_random_tree
+
+class TestGenerate(unittest.TestCase):
+    """Tests generated code against the interpreter"""
+    def setUp(self):
+        codegen.clear_cache()
+
+    def assert_same_ticks(self, program, ticks):
+        """Runs the interpreter and generated code side by side"""
+        generated = codegen.generate(program)
+        interpreted_state = program.new_state()
+        generated_state = program.new_state()
+        resume = program.header + compiler.SLOT_RESUME
+        for _ in range(ticks):
+            self.assertIs(generated(generated_state), program.execute(interpreted_state))
+            # The generated code always starts from the root
+            interpreted_state[resume] = 0
+            self.assertEqual(generated_state, interpreted_state)
+
+    def test_generate_matches_interpreter(self):
+        """Generated code leaves the same state and results as the interpreter"""
+        for policy in behave.ResetPolicy:
+            self.assert_same_ticks(compiler.compile_tree(build_tree(policy)), 30)
+
+    def test_generate_random_trees(self):
+        """Generated code matches the interpreter on random trees"""
+        for seed in range(50):
+            self.assert_same_ticks(compiler.compile_tree(build_random_tree(seed)), 40)
+
+    def test_generate_deep_tree(self):
+        """Trees nested deeper than one generated function are split up"""
+        root = node = behave.NodeSequence(id='sequence0')
+        for depth in range(1, codegen.BLOCK_DEPTH * 3):
+            child = behave.NodeSelector(id='selector{0}'.format(depth))
+            node.addchild(behave.NodeDecoratorInvert(id='invert{0}'.format(depth),
+                                                     decoratee=child))
+            node = child
+        program = compiler.compile_tree(root)
+        self.assertIn('_block', codegen.generate_source(program))
+        self.assert_same_ticks(program, 5)
+
+    def test_generate_folds_decorators(self):
+        """Chains of decorators compile down to one negation at most"""
+        node = mocknode_builder(oh_behave.ExecuteResult.success)
+        for depth in range(3):
+            node = behave.NodeDecoratorInvert(id='invert{0}'.format(depth), decoratee=node)
+        node = behave.NodeDecorator(id='decorator', decoratee=node)
+        program = compiler.compile_tree(node)
+        self.assertEqual(codegen.generate_source(program).count('s = -s'), 1)
+        self.assertIs(codegen.generate(program)(program.new_state()),
+                      oh_behave.ExecuteResult.failure)
+
+    def test_generate_callbacks(self):
+        """Opaque leaves are called and notified like in the interpreter"""
+        node1 = mocknode_builder(oh_behave.ExecuteResult.success)
+        node2 = mocknode_builder(oh_behave.ExecuteResult.failure)
+        sequence = behave.NodeSequence(id='sequence')
+        sequence.addchild(node1)
+        sequence.addchild(behave.NodeDecoratorInvert(id='invert', decoratee=node2))
+        program = codegen.specialize(compiler.compile_tree(sequence)).instantiate()
+        self.assertIs(program.execute(), oh_behave.ExecuteResult.ready)
+        self.assertIs(program.execute(), oh_behave.ExecuteResult.success)
+        assert_node_calls(node1, 1, 0, 1)
+        assert_node_calls(node2, 1, 0, 1)
+
+    def test_generate_shares_code(self):
+        """Trees of the same shape share one code object"""
+        first = codegen.generate(compiler.compile_tree(build_tree()))
+        second = codegen.generate(compiler.compile_tree(build_tree()))
+        other = codegen.generate(compiler.compile_tree(build_tree(behave.ResetPolicy.always)))
+        self.assertIs(first.__code__, second.__code__)
+        self.assertIsNot(first.__code__, other.__code__)
+
+    def test_specialize_sleep(self):
+        """Specialized instances still ask their actor to sleep"""
+        mock_actor = mock.Mock()
+        leaf = behave.NodeLeafAction(id='leaf', action=action.ActionTimed(
+                id='action', actor=mock_actor, timegoal=5))
+        program = codegen.specialize(compiler.compile_tree(leaf))
+        instance = program.instantiate(mock_actor)
+        self.assertIs(instance.execute(), oh_behave.ExecuteResult.ready)
+        mock_actor.sleep.assert_called_with(3, instance)
@@ -0,0 +1,303 @@
+"""Unit tests for compiler module"""
+
+import random
+import threading
+import unittest
+from unittest import mock
+
+import oh_behave
+from oh_behave import action
+from oh_behave import actor
+from oh_behave import behave
+from oh_behave import compiler
+from oh_behave import offload
+from oh_behave.test.test_behave import mocknode_builder, assert_node_calls
+
+def build_tree(reset_policy=behave.ResetPolicy.never):
+    """
+    Builds a small tree exercising every compiled node type, returns the
+    root node
+    """
+    mock_actor = mock.Mock(spec=actor.Actor)
+    def leaf(ident, timegoal):
+        act = action.ActionTimed(id=ident + '_action', actor=mock_actor, timegoal=timegoal)
+        return behave.NodeLeafAction(id=ident, action=act)
+
+    root = behave.NodeSequence(id='root', reset_policy=reset_policy)
+    selector = behave.NodeSelector(id='selector', reset_policy=reset_policy)
+    selector.addchild(behave.NodeDecoratorInvert(id='invert', decoratee=leaf('leaf01', 2)))
+    selector.addchild(behave.NodeDecorator(id='decorator', decoratee=leaf('leaf02', 3)))
+    root.addchild(selector)
+    root.addchild(behave.NodeSequence(id='empty'))
+    root.addchild(leaf('leaf03', 4))
+    return root
+
+def build_random_tree(seed, depth=5):
+    """
+    Builds a random tree of composites, decorators and timed leaves,
+    returns the root node
+    """
+    rng = random.Random(seed)
+    mock_actor = mock.Mock(spec=actor.Actor)
+    count = [0]
+    def build(level):
+        count[0] += 1
+        ident = 'node{0}'.format(count[0])
+        kind = rng.randrange(5) if level < depth else 4
+        if kind <= 1:
+            policy = rng.choice(list(behave.ResetPolicy))
+            cls = behave.NodeSequence if kind == 0 else behave.NodeSelector
+            node = cls(id=ident, reset_policy=policy)
+            for _ in range(rng.randrange(4)):
+                node.addchild(build(level + 1))
+        elif kind <= 3:
+            cls = behave.NodeDecorator if kind == 2 else behave.NodeDecoratorInvert
+            node = cls(id=ident, decoratee=build(level + 1))
+        else:
+            act = action.ActionTimed(id=ident + '_action', actor=mock_actor,
+                                     timegoal=rng.randrange(4))
+            node = behave.NodeLeafAction(id=ident, action=act)
+        return node
+    return build(0)
+
+class TestCompileTree(unittest.TestCase):
+    """Tests lowering node objects into programs"""
+
+    def test_compile_tree_layout(self):
+        """Children are laid out contiguously, breadth first"""
+        program = compiler.compile_tree(build_tree())
+        self.assertEqual(program.ids[:4], ('root', 'selector', 'empty', 'leaf03'))
+        self.assertEqual(program.child_count[0], 3)
+        self.assertEqual(program.child_start[0], 1)
+        self.assertEqual(program.opcodes[0], compiler.OP_SEQUENCE)
+        self.assertEqual(program.opcodes[3], compiler.OP_TIMED)
+        self.assertEqual(program.params[3], 4)
+        for index in range(1, len(program)):
+            parent = program.parents[index]
+            start = program.child_start[parent]
+            self.assertTrue(start <= index < start + program.child_count[parent])
+
+    def test_compile_tree_cycle(self):
+        """Trees containing cycles are refused"""
+        root = behave.NodeSequence(id='root')
+        child = behave.NodeSequence(id='child')
+        root.addchild(child)
+        child.addchild(root)
+        with self.assertRaises(compiler.CompileException):
+            compiler.compile_tree(root)
+
+    def test_compile_tree_unknown_node(self):
+        """Unknown node types are compiled to opaque leaves"""
+        node = mocknode_builder(oh_behave.ExecuteResult.success)
+        program = compiler.compile_tree(node)
+        self.assertEqual(program.opcodes, (compiler.OP_NODE,))
+        self.assertIs(program.instantiate().execute(), oh_behave.ExecuteResult.success)
+        assert_node_calls(node, 0, 0, 1)
+
+class TestProgram(unittest.TestCase):
+    """Tests the program interpreter against the node objects"""
+
+    def test_execute_matches_nodes(self):
+        """The program returns the same results as executing the nodes"""
+        tree = build_tree()
+        program = compiler.compile_tree(build_tree()).instantiate()
+        expected = None
+        while expected is not oh_behave.ExecuteResult.success:
+            expected = tree.execute()
+            self.assertIs(program.execute(), expected)
+
+    def test_execute_reset_policy_matches_nodes(self):
+        """Programs reset composites the same way the node objects do"""
+        for policy in behave.ResetPolicy:
+            tree = build_tree(policy)
+            program = compiler.compile_tree(build_tree(policy)).instantiate()
+            for _ in range(30):
+                self.assertIs(program.execute(), tree.execute())
+
+    def test_execute_random_trees_match_nodes(self):
+        """Programs match the node objects on randomly generated trees"""
+        for seed in range(50):
+            tree = build_random_tree(seed)
+            program = compiler.compile_tree(build_random_tree(seed)).instantiate()
+            for _ in range(40):
+                self.assertIs(program.execute(), tree.execute())
+
+    def test_execute_resumes_running_leaf(self):
+        """A tick ending on ready resumes at the node it stopped at"""
+        program = compiler.compile_tree(build_tree()).instantiate()
+        resume = program.program.header + compiler.SLOT_RESUME
+        self.assertIs(program.execute(), oh_behave.ExecuteResult.ready)
+        self.assertEqual(program.program.ids[program.state[resume]], 'leaf01')
+        self.assertIs(program.execute(), oh_behave.ExecuteResult.ready)
+        # leaf01 succeeds, the inverter fails and the selector moves on
+        self.assertEqual(program.program.ids[program.state[resume]], 'selector')
+        while program.execute() is not oh_behave.ExecuteResult.success:
+            pass
+        self.assertEqual(program.state[resume], 0)
+
+    def test_instance_reset(self):
+        """Resetting an instance restarts the program"""
+        program = compiler.compile_tree(build_tree()).instantiate()
+        first = [program.execute() for _ in range(8)]
+        program.reset()
+        self.assertEqual(program.state, program.program.new_state())
+        self.assertEqual([program.execute() for _ in range(8)], first)
+
+    def test_execute_sequence_callbacks(self):
+        """Sequences call success() on finished children and failed() on failures"""
+        node1 = mocknode_builder(oh_behave.ExecuteResult.success)
+        node2 = mocknode_builder(oh_behave.ExecuteResult.failure)
+        sequence = behave.NodeSequence(id='sequence')
+        sequence.addchild(node1)
+        sequence.addchild(node2)
+        program = compiler.compile_tree(sequence).instantiate()
+        self.assertIs(program.execute(), oh_behave.ExecuteResult.ready)
+        self.assertIs(program.execute(), oh_behave.ExecuteResult.failure)
+        assert_node_calls(node1, 1, 0, 1)
+        assert_node_calls(node2, 0, 1, 1)
+
+    def test_execute_selector_callbacks(self):
+        """Selectors call failed() on failed children and success() on success"""
+        node1 = mocknode_builder(oh_behave.ExecuteResult.failure)
+        node2 = mocknode_builder(oh_behave.ExecuteResult.success)
+        selector = behave.NodeSelector(id='selector')
+        selector.addchild(node1)
+        selector.addchild(node2)
+        program = compiler.compile_tree(selector).instantiate()
+        self.assertIs(program.execute(), oh_behave.ExecuteResult.ready)
+        self.assertIs(program.execute(), oh_behave.ExecuteResult.success)
+        assert_node_calls(node1, 0, 1, 1)
+        assert_node_calls(node2, 1, 0, 1)
+
+    def test_execute_decorator_callbacks(self):
+        """Callbacks pass through decorators without being inverted"""
+        node = mocknode_builder(oh_behave.ExecuteResult.failure)
+        invert = behave.NodeDecoratorInvert(id='invert', decoratee=node)
+        sequence = behave.NodeSequence(id='sequence')
+        sequence.addchild(invert)
+        program = compiler.compile_tree(sequence)
+        self.assertIs(program.instantiate().execute(), oh_behave.ExecuteResult.success)
+        assert_node_calls(node, 1, 0, 1)
+
+    def test_execute_deep_tree(self):
+        """Trees deeper than the recursion limit can be run"""
+        root = node = behave.NodeDecoratorInvert(id='invert0', decoratee=None)
+        for depth in range(1, 5000):
+            child = behave.NodeDecoratorInvert(id='invert{0}'.format(depth), decoratee=None)
+            node.set_decoratee(child)
+            node = child
+        node.set_decoratee(mocknode_builder(oh_behave.ExecuteResult.failure))
+        program = compiler.compile_tree(root)
+        self.assertIs(program.instantiate().execute(), oh_behave.ExecuteResult.failure)
+
+    def test_execute_as_actor_rootnode(self):
+        """Programs can be used as an actor's root node"""
+        program = compiler.compile_tree(build_tree())
+        a = actor.Actor(name='Billy Bob', rootnode=program.instantiate())
+        self.assertIs(a.execute(), oh_behave.ExecuteResult.ready)
+
+    def test_execute_shared_program(self):
+        """Instances of one program keep independent state"""
+        program = compiler.compile_tree(build_tree())
+        first = program.instantiate()
+        second = program.instantiate()
+        for _ in range(3):
+            first.execute()
+        self.assertNotEqual(first.state, second.state)
+        self.assertEqual(second.state, program.new_state())
+
+    def test_execute_opaque_action(self):
+        """Leaf actions other than ActionTimed are called directly"""
+        mock_action = mock.Mock(spec=action.Action)
+        mock_action.execute.return_value = oh_behave.ExecuteResult.success
+        sequence = behave.NodeSequence(id='sequence')
+        sequence.addchild(behave.NodeLeafAction(id='leaf', action=mock_action))
+        program = compiler.compile_tree(sequence)
+        self.assertEqual(program.opcodes[1], compiler.OP_ACTION)
+        self.assertIs(program.instantiate().execute(), oh_behave.ExecuteResult.success)
+        mock_action.success.assert_called_with()
+
+class TestCompileActors(unittest.TestCase):
+    """Tests compiling the actors built by the reader"""
+
+    def test_compile_actors_shares_program(self):
+        """Actors with the same root node share one program"""
+        root = build_tree()
+        objects = {
+            'actor01' : actor.Actor(name='Billy Bob', rootnode=root),
+            'actor02' : actor.Actor(name='Guy Mann', rootnode=root),
+            'actor03' : actor.Actor(name='Nobody'),
+            'root' : root
+        }
+        programs = compiler.compile_actors(objects)
+        self.assertEqual(list(programs), ['root'])
+        first = objects['actor01'].get_rootnode()
+        second = objects['actor02'].get_rootnode()
+        self.assertIsInstance(first, compiler.ProgramInstance)
+        self.assertIsNot(first, second)
+        self.assertIs(first.program, second.program)
+        self.assertIs(objects['actor03'].get_rootnode(), None)
+
+    def test_compile_actors_parallel_private(self):
+        """Actors sharing a tree holding a NodeParallel get private copies"""
+        root = behave.NodeParallel(id='root')
+        timed = action.ActionTimed(id='wait', actor=None, timegoal=2)
+        root.addchild(behave.NodeLeafAction(id='leaf', action=timed))
+        objects = {name : actor.Actor(name=name, rootnode=root)
+                   for name in ('Billy Bob', 'Guy Mann')}
+        compiler.compile_actors(objects)
+        first, second = (a.get_rootnode() for a in objects.values())
+        self.assertIsNot(first.program, second.program)
+        self.assertIs(first.program.targets[0], root)
+        self.assertIsNot(second.program.targets[0], root)
+        self.assertIs(objects['Billy Bob'].execute(), oh_behave.ExecuteResult.ready)
+        self.assertIs(objects['Billy Bob'].execute(), oh_behave.ExecuteResult.success)
+        self.assertIs(objects['Guy Mann'].execute(), oh_behave.ExecuteResult.ready)
+
+    def test_unshared_target(self):
+        """Subclasses of composites and ActionTimed keep state in the objects"""
+        class Sequence(behave.NodeSequence):
+            __slots__ = ()
+        class Timed(action.ActionTimed):
+            __slots__ = ()
+        self.assertIs(compiler.unshared_target(compiler.compile_tree(build_tree())), None)
+        subclassed = Sequence(id='sequence')
+        self.assertIs(compiler.unshared_target(compiler.compile_tree(subclassed)), subclassed)
+        timed = Timed(id='wait', actor=None, timegoal=3)
+        program = compiler.compile_tree(behave.NodeLeafAction(id='leaf', action=timed))
+        self.assertIs(compiler.unshared_target(program), timed)
+        with self.assertRaises(compiler.CompileException):
+            compiler.check_shareable(program)
+
+    def test_private_tree(self):
+        """Private copies carry on from the state of the original"""
+        root = build_tree()
+        root.execute()
+        copied = compiler.private_tree(root)
+        self.assertIsNot(copied, root)
+        self.assertIsNot(copied.get_children(), root.get_children())
+        for _ in range(10):
+            self.assertIs(copied.execute(), root.execute())
+
+    def test_reset_leaves_other_actors(self):
+        """Resetting one instance of a shared program leaves the others running"""
+        release = threading.Event()
+        executor = offload.BoundedExecutor(max_workers=2, max_pending=2)
+        self.addCleanup(executor.shutdown)
+        self.addCleanup(release.set)
+        act = action.ActionOffload(id='action', actor=None, executor=executor,
+                                   function=lambda act: release.wait(10))
+        root = behave.NodeLeafAction(id='root', action=act)
+        objects = {name : actor.Actor(name=name, rootnode=root)
+                   for name in ('Billy Bob', 'Guy Mann')}
+        compiler.compile_actors(objects)
+        first, second = objects.values()
+        for a in (first, second):
+            self.assertIs(a.execute(), oh_behave.ExecuteResult.ready)
+        futures = dict(act._futures)
+        first.get_rootnode().reset()
+        self.assertEqual(set(act._futures), {second})
+        self.assertFalse(futures[second].cancelled())
+        release.set()
+        futures[second].result()
+        self.assertIs(second.execute(), oh_behave.ExecuteResult.success)
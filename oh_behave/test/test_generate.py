@@ -0,0 +1,33 @@
+"""Unit tests for generate module"""
+
+import random
+import unittest
+
+from oh_behave import generate
+from oh_behave import reader
+
+class TestGenerate(unittest.TestCase):
+    """Tests generating synthetic tree definitions"""
+
+    def test_generate_tree(self):
+        """Trees are rooted in a sequence and end in timed leaves"""
+        root, definitions = generate.generate_tree(random.Random(1), 'x_', 'actor', 3, 2)
+        self.assertEqual(definitions[0]['id'], root)
+        self.assertEqual(definitions[0]['type'], 'NodeSequence')
+        self.assertEqual(definitions[0]['reset_policy'], 'always')
+        for values in definitions:
+            self.assertTrue(values['id'].startswith('x_'))
+            if values['type'] == 'ActionTimed':
+                self.assertEqual(values['actor'], 'actor')
+        self.assertEqual(generate.generate_tree(random.Random(1), 'x_', 'actor', 3, 2),
+                         (root, definitions))
+
+    def test_generate_library(self):
+        """Libraries build, with one tree per actor unless shared"""
+        for shared in (False, True):
+            parser = reader.DataParser()
+            for values in generate.generate_library(3, 2, 2, shared=shared):
+                parser._add_entry(reader.ObjectEntry(values))
+            objects = parser.build_objects()
+            roots = {objects['actor{0}'.format(index)].get_rootnode() for index in range(3)}
+            self.assertEqual(len(roots), 1 if shared else 3)
@@ -0,0 +1,202 @@
+"""Unit tests for hotreload module"""
+
+import copy
+import unittest
+
+import oh_behave
+from oh_behave import compiler
+from oh_behave import hotreload
+from oh_behave import reader
+
+DEFINITIONS = [
+    {"id": "actor", "type": "Actor", "name": "Billy Bob", "rootnode": "root"},
+    {"id": "root", "type": "NodeSequence", "childnodes": ["first", "second"]},
+    {"id": "first", "type": "NodeLeafAction", "action": "wait01"},
+    {"id": "second", "type": "NodeDecoratorInvert", "decoratee": "leaf"},
+    {"id": "leaf", "type": "NodeLeafAction", "action": "wait02"},
+    {"id": "wait01", "type": "ActionTimed", "actor": "actor", "timegoal": 2},
+    {"id": "wait02", "type": "ActionTimed", "actor": "actor", "timegoal": 3}
+]
+
+def parse(definitions):
+    """Returns a parser holding definitions"""
+    parser = reader.DataParser()
+    for values in definitions:
+        parser._add_entry(reader.ObjectEntry(copy.deepcopy(values)))
+    return parser
+
+def changed(**changes):
+    """Returns DEFINITIONS with the entries keyed by id in changes replaced"""
+    definitions = [changes.pop(values['id'], values) for values in DEFINITIONS]
+    definitions.extend(changes.values())
+    return [values for values in definitions if values is not None]
+
+class TestHotReloader(unittest.TestCase):
+    """Tests reloading definitions into built objects"""
+    def setUp(self):
+        parser = parse(DEFINITIONS)
+        self.objects = parser.build_objects()
+        self.actor = self.objects['actor']
+        self.reloader = hotreload.HotReloader(parser, self.objects)
+
+    def test_reload_nothing(self):
+        """Identical definitions change nothing"""
+        root = self.objects['root']
+        report = self.reloader.reload(parse(DEFINITIONS))
+        self.assertEqual(len(report), 0)
+        self.assertIs(self.objects['root'], root)
+
+    def test_reload_changed_leaf(self):
+        """Changed entries are rebuilt and their parents relinked in place"""
+        root = self.objects['root']
+        first = self.objects['first']
+        self.assertIs(self.actor.execute(), oh_behave.ExecuteResult.ready)
+        self.assertIs(self.actor.execute(), oh_behave.ExecuteResult.ready)
+        report = self.reloader.reload(parse(changed(
+                wait02={"id": "wait02", "type": "ActionTimed", "actor": "actor",
+                        "timegoal": 1})))
+        self.assertEqual(report.changed, ['wait02'])
+        self.assertEqual(report.relinked, ['leaf'])
+        self.assertIs(self.objects['root'], root)
+        self.assertIs(self.objects['first'], first)
+        self.assertEqual(self.objects['leaf'].get_action().timegoal, 1)
+        self.assertIs(self.objects['wait02']._actor, self.actor)
+        # The sequence carries on from its second child
+        self.assertIs(self.actor.execute(), oh_behave.ExecuteResult.failure)
+
+    def test_reload_changed_composite(self):
+        """Changed composites get new children, unchanged ones are kept"""
+        first = self.objects['first']
+        report = self.reloader.reload(parse(changed(
+                root={"id": "root", "type": "NodeSelector", "childnodes": ["first", "extra"]},
+                extra={"id": "extra", "type": "NodeSequence"})))
+        self.assertEqual(report.added, ['extra'])
+        self.assertEqual(report.changed, ['root'])
+        self.assertEqual(report.relinked, ['actor'])
+        root = self.actor.get_rootnode()
+        self.assertIs(root, self.objects['root'])
+        self.assertEqual(root.get_children(), [first, self.objects['extra']])
+
+    def test_reload_actor(self):
+        """Changed actors are updated in place"""
+        report = self.reloader.reload(parse(changed(
+                actor={"id": "actor", "type": "Actor", "name": "Guy Mann", "rootnode": "second"},
+                root=None, first=None, wait01=None)))
+        self.assertEqual(sorted(report.removed), ['first', 'root', 'wait01'])
+        self.assertIs(self.objects['actor'], self.actor)
+        self.assertEqual(self.actor.name, 'Guy Mann')
+        self.assertIs(self.actor.get_rootnode(), self.objects['second'])
+        self.assertNotIn('root', self.objects)
+
+    def test_prepare_is_not_applied(self):
+        """Nothing changes until the patch is applied"""
+        root = self.objects['root']
+        patch = self.reloader.prepare(parse(changed(
+                root={"id": "root", "type": "NodeSequence", "childnodes": ["first"]})))
+        self.assertIs(self.actor.get_rootnode(), root)
+        patch.apply()
+        self.assertIsNot(self.actor.get_rootnode(), root)
+
+    def test_prepare_missing_reference(self):
+        """Definitions referencing unknown ids are refused before any change"""
+        root = self.objects['root']
+        with self.assertRaises(KeyError):
+            self.reloader.prepare(parse(changed(
+                    root={"id": "root", "type": "NodeSequence", "childnodes": ["missing"]})))
+        self.assertIs(self.actor.get_rootnode(), root)
+
+    def test_reload_unbuilt_removed(self):
+        """Removing entries that were never built is not an error"""
+        parser = parse(DEFINITIONS + [{"id": "spare", "type": "NodeSequence"}])
+        objects = parser.build_objects(roots=['actor'])
+        reloader = hotreload.HotReloader(parser, objects)
+        report = reloader.reload(parse(DEFINITIONS))
+        self.assertEqual(report.removed, ['spare'])
+
+    def test_reload_children_by_id(self):
+        """Children are relinked by the object they named, not by position"""
+        root = self.objects['root']
+        first = self.objects['first']
+        children = root.get_children()
+        children.reverse()
+        self.reloader.reload(parse(changed(
+                second={"id": "second", "type": "NodeDecorator", "decoratee": "leaf"})))
+        self.assertEqual(children, [self.objects['second'], first])
+
+class TestHotReloaderCompiled(unittest.TestCase):
+    """Tests reloading definitions into actors running compiled programs"""
+    def setUp(self):
+        parser = parse(DEFINITIONS)
+        self.objects = parser.build_objects()
+        self.actor = self.objects['actor']
+        compiler.compile_actors(self.objects)
+        self.reloader = hotreload.HotReloader(parser, self.objects)
+
+    def expected(self, definitions):
+        """Returns a fresh compiled actor built from definitions"""
+        objects = parse(definitions).build_objects()
+        compiler.compile_actors(objects)
+        return objects['actor']
+
+    def test_reload_changed_leaf(self):
+        """Programs are compiled again from the new definitions"""
+        instance = self.actor.get_rootnode()
+        definitions = changed(
+                wait02={"id": "wait02", "type": "ActionTimed", "actor": "actor", "timegoal": 1})
+        self.reloader.reload(parse(definitions))
+        self.assertIsInstance(self.actor.get_rootnode(), compiler.ProgramInstance)
+        self.assertIsNot(self.actor.get_rootnode(), instance)
+        self.assertIs(self.actor.get_rootnode().actor, self.actor)
+        expected = self.expected(definitions)
+        for _ in range(5):
+            self.assertIs(self.actor.execute(), expected.execute())
+
+    def test_reload_keeps_state(self):
+        """Unchanged nodes of a compiled program keep their state"""
+        self.assertIs(self.actor.execute(), oh_behave.ExecuteResult.ready)
+        self.assertIs(self.actor.execute(), oh_behave.ExecuteResult.ready)
+        definitions = changed(
+                wait02={"id": "wait02", "type": "ActionTimed", "actor": "actor", "timegoal": 1})
+        self.reloader.reload(parse(definitions))
+        instance = self.actor.get_rootnode()
+        self.assertEqual(instance.state[instance.program.ids.index('root')], 1)
+        self.assertIs(self.actor.execute(), oh_behave.ExecuteResult.failure)
+
+    def test_reload_changed_actor(self):
+        """Changed actors keep running a program"""
+        definitions = changed(
+                actor={"id": "actor", "type": "Actor", "name": "Guy Mann", "rootnode": "second"})
+        self.reloader.reload(parse(definitions))
+        self.assertIsInstance(self.actor.get_rootnode(), compiler.ProgramInstance)
+        self.assertEqual(self.actor.get_rootnode().get_id(), 'second')
+        expected = self.expected(definitions)
+        for _ in range(5):
+            self.assertIs(self.actor.execute(), expected.execute())
+
+    def test_reload_unrelated(self):
+        """Programs are kept when nothing in their tree changed"""
+        instance = self.actor.get_rootnode()
+        self.reloader.reload(parse(DEFINITIONS + [{"id": "spare", "type": "NodeSequence"}]))
+        self.assertIs(self.actor.get_rootnode(), instance)
+
+    def test_reload_parallel_private(self):
+        """Actors that cannot share a program get private ones after a reload"""
+        definitions = [
+            {"id": "first", "type": "Actor", "name": "Billy Bob", "rootnode": "both"},
+            {"id": "second", "type": "Actor", "name": "Guy Mann", "rootnode": "both"},
+            {"id": "both", "type": "NodeParallel", "childnodes": ["leaf"]},
+            {"id": "leaf", "type": "NodeLeafAction", "action": "wait"},
+            {"id": "wait", "type": "ActionTimed", "actor": "first", "timegoal": 2}]
+        parser = parse(definitions)
+        objects = parser.build_objects()
+        compiler.compile_actors(objects)
+        reloader = hotreload.HotReloader(parser, objects)
+        definitions[-1] = {"id": "wait", "type": "ActionTimed", "actor": "first", "timegoal": 3}
+        reloader.reload(parse(definitions))
+        first = objects['first'].get_rootnode()
+        second = objects['second'].get_rootnode()
+        self.assertIsNot(first.program.targets[0], second.program.targets[0])
+        for _ in range(2):
+            self.assertIs(objects['first'].execute(), oh_behave.ExecuteResult.ready)
+        self.assertIs(objects['first'].execute(), oh_behave.ExecuteResult.success)
+        self.assertIs(objects['second'].execute(), oh_behave.ExecuteResult.ready)
@@ -0,0 +1,114 @@
+"""Unit tests for offload module"""
+
+import threading
+import unittest
+
+import oh_behave
+from oh_behave import action
+from oh_behave import actor
+from oh_behave import behave
+from oh_behave import offload
+
+def run_until_done(act):
+    """Executes act until it stops returning ready"""
+    status = oh_behave.ExecuteResult.ready
+    while status is oh_behave.ExecuteResult.ready:
+        status = act.execute()
+    return status
+
+class TestBoundedExecutor(unittest.TestCase):
+    """Tests the bounded thread pool"""
+    def setUp(self):
+        self.executor = offload.BoundedExecutor(max_workers=2, max_pending=2)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.executor.shutdown()
+
+    def test_try_submit_bounded(self):
+        """Submissions over max_pending are refused until tasks finish"""
+        first = self.executor.try_submit(self.release.wait)
+        second = self.executor.try_submit(self.release.wait)
+        self.assertIs(self.executor.try_submit(self.release.wait), None)
+        self.assertEqual(self.executor.rejected, 1)
+        self.assertEqual(self.executor.pending(), 2)
+        self.release.set()
+        first.result()
+        second.result()
+        self.assertIsNot(self.executor.try_submit(int), None)
+
+    def test_invalid_max_pending(self):
+        """Executors must accept at least one task"""
+        with self.assertRaises(ValueError):
+            offload.BoundedExecutor(max_workers=1, max_pending=0)
+
+    def test_default_executor(self):
+        """The shared executor can be replaced"""
+        previous = offload.set_default_executor(self.executor)
+        try:
+            self.assertIs(offload.get_default_executor(), self.executor)
+        finally:
+            offload.set_default_executor(previous)
+
+class TestActionOffload(unittest.TestCase):
+    """Tests actions running on the thread pool"""
+    def setUp(self):
+        self.executor = offload.BoundedExecutor(max_workers=2, max_pending=1)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def offloaded(self, function):
+        """Returns an ActionOffload running function on the test executor"""
+        return action.ActionOffload(id='action', actor=None, function=function,
+                                    executor=self.executor)
+
+    def test_action_offload_success(self):
+        """The action is ready while its work runs and succeeds on a true result"""
+        act = self.offloaded(lambda act: True)
+        self.assertIs(act.execute(), oh_behave.ExecuteResult.ready)
+        self.assertIs(run_until_done(act), oh_behave.ExecuteResult.success)
+
+    def test_action_offload_error(self):
+        """Exceptions fail the action and are kept in errors"""
+        def work(act):
+            raise IOError('disk on fire')
+        act = self.offloaded(work)
+        self.assertIs(run_until_done(act), oh_behave.ExecuteResult.failure)
+        self.assertIsInstance(act.errors[None], IOError)
+
+    def test_action_offload_back_pressure(self):
+        """Actions wait their turn while the executor is full"""
+        release = threading.Event()
+        blocking = self.offloaded(lambda act: release.wait())
+        waiting = self.offloaded(lambda act: True)
+        blocking.execute()
+        self.assertIs(waiting.execute(), oh_behave.ExecuteResult.ready)
+        self.assertNotIn(None, waiting._futures)
+        release.set()
+        self.assertIs(run_until_done(blocking), oh_behave.ExecuteResult.success)
+        self.assertIs(run_until_done(waiting), oh_behave.ExecuteResult.success)
+
+    def test_action_offload_per_actor(self):
+        """Actors sharing the action submit their own work and keep their own errors"""
+        release = threading.Event()
+        calls = []
+        def work(act):
+            calls.append(act)
+            release.wait()
+            raise IOError('disk on fire')
+        executor = offload.BoundedExecutor(max_workers=2, max_pending=2)
+        self.addCleanup(executor.shutdown)
+        act = action.ActionOffload(id='action', actor=None, function=work, executor=executor)
+        actors = [actor.Actor(name=name, rootnode=behave.NodeLeafAction(id='leaf', action=act))
+                  for name in ('Billy Bob', 'Guy Mann')]
+        for a in actors:
+            self.assertIs(a.execute(), oh_behave.ExecuteResult.ready)
+        self.assertEqual(set(act._futures), set(actors))
+        release.set()
+        for a in actors:
+            self.assertIs(run_until_done(a), oh_behave.ExecuteResult.failure)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(set(act.errors), set(actors))
+        self.assertEqual(act._futures, {})
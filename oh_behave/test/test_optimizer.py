@@ -0,0 +1,143 @@
+"""Unit tests for optimizer module"""
+
+import unittest
+
+import oh_behave
+from oh_behave import action
+from oh_behave import actor
+from oh_behave import behave
+from oh_behave import optimizer
+from oh_behave import reader
+from oh_behave.test.test_behave import mocknode_builder
+from oh_behave.test.test_compiler import build_random_tree
+
+def count_nodes(node):
+    """Returns the number of nodes in the tree below node"""
+    count = 0
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        count += 1
+        pending.extend(optimizer._children(node))
+    return count
+
+class TestOptimize(unittest.TestCase):
+    """Tests rewriting trees"""
+
+    def optimize_root(self, rootnode):
+        """Optimizes the tree of one actor, returns (rootnode, report)"""
+        a = actor.Actor(name='Billy Bob', rootnode=rootnode)
+        report = optimizer.optimize({'actor' : a})
+        return a.get_rootnode(), report
+
+    def test_optimize_random_trees_match(self):
+        """Optimized trees return the same results as the originals"""
+        removed = 0
+        for seed in range(100):
+            tree = build_random_tree(seed)
+            optimized, report = self.optimize_root(build_random_tree(seed))
+            removed += len(report)
+            self.assertLessEqual(count_nodes(optimized), count_nodes(tree))
+            for _ in range(40):
+                self.assertIs(optimized.execute(), tree.execute())
+        self.assertTrue(removed)
+
+    def test_optimize_decorators(self):
+        """Pass-through decorators and double inversions are removed"""
+        leaf = mocknode_builder(oh_behave.ExecuteResult.success)
+        inner = behave.NodeDecoratorInvert(id='inner', decoratee=leaf)
+        outer = behave.NodeDecoratorInvert(id='outer', decoratee=inner)
+        root = behave.NodeDecorator(id='decorator', decoratee=outer)
+        rootnode, report = self.optimize_root(root)
+        self.assertIs(rootnode, leaf)
+        self.assertEqual(sorted(ident for ident, _ in report.removed),
+                         ['decorator', 'inner', 'outer'])
+        self.assertEqual(report.aliases['outer'], leaf.get_id())
+
+    def test_optimize_inverted_empty_composite(self):
+        """Inverted empty composites become the other empty composite"""
+        root = behave.NodeDecoratorInvert(id='invert', decoratee=behave.NodeSequence(id='empty'))
+        rootnode, report = self.optimize_root(root)
+        self.assertIs(type(rootnode), behave.NodeSelector)
+        self.assertEqual(rootnode.get_id(), 'invert')
+        self.assertIs(rootnode.execute(), oh_behave.ExecuteResult.failure)
+
+    def test_optimize_unreachable_children(self):
+        """Children after one that always succeeds in a selector are dropped"""
+        selector = behave.NodeSelector(id='selector')
+        selector.addchild(mocknode_builder(oh_behave.ExecuteResult.failure))
+        selector.addchild(behave.NodeSequence(id='empty'))
+        selector.addchild(mocknode_builder(oh_behave.ExecuteResult.success))
+        rootnode, report = self.optimize_root(selector)
+        self.assertIs(rootnode, selector)
+        self.assertEqual(len(selector.get_children()), 2)
+        self.assertEqual(len(report), 1)
+
+    def test_optimize_single_child_composite(self):
+        """Composites wrapping one composite of the same kind are merged"""
+        inner = behave.NodeSequence(id='inner', reset_policy='on_failure')
+        inner.addchild(mocknode_builder(oh_behave.ExecuteResult.success))
+        outer = behave.NodeSequence(id='outer', reset_policy='on_success')
+        outer.addchild(inner)
+        rootnode, report = self.optimize_root(outer)
+        self.assertIs(rootnode, inner)
+        self.assertIs(inner.get_reset_policy(), behave.ResetPolicy.always)
+        self.assertEqual(report.aliases, {'outer' : 'inner'})
+
+    def test_optimize_single_child_latch(self):
+        """A sequence latching a success its child would reset on is kept"""
+        inner = behave.NodeSequence(id='inner', reset_policy='on_success')
+        inner.addchild(mocknode_builder(oh_behave.ExecuteResult.success))
+        outer = behave.NodeSequence(id='outer')
+        outer.addchild(inner)
+        rootnode, report = self.optimize_root(outer)
+        self.assertIs(rootnode, outer)
+        self.assertEqual(len(report), 0)
+
+    def test_optimize_shared_node(self):
+        """Nodes shared by several parents are not modified"""
+        inner = behave.NodeSequence(id='inner')
+        first = behave.NodeSequence(id='first')
+        first.addchild(inner)
+        second = behave.NodeSequence(id='second')
+        second.addchild(inner)
+        objects = {'first' : first, 'second' : second, 'inner' : inner}
+        report = optimizer.optimize(objects)
+        self.assertEqual(len(report), 0)
+        self.assertIs(objects['first'], first)
+
+    def test_optimize_shared_decorator(self):
+        """Nodes reached through a removed shared decorator are still shared"""
+        def build():
+            a = actor.Actor(name='Billy Bob')
+            inner = behave.NodeSequence(id='inner')
+            inner.addchild(behave.NodeLeafAction(
+                    id='leaf', action=action.ActionTimed(id='wait', actor=a, timegoal=2)))
+            decorator = behave.NodeDecorator(id='decorator', decoratee=inner)
+            outer = behave.NodeSequence(id='outer', reset_policy='always')
+            outer.addchild(decorator)
+            second = behave.NodeSequence(id='second')
+            second.addchild(decorator)
+            a.set_rootnode(outer)
+            return {'first' : a, 'second' : actor.Actor(name='Guy Mann', rootnode=second),
+                    'inner' : inner}
+        def tick(objects):
+            return [objects[name].execute() for _ in range(4) for name in ('first', 'second')]
+        expected = tick(build())
+        objects = build()
+        optimizer.optimize(objects)
+        self.assertEqual(tick(objects), expected)
+        self.assertEqual(objects['first'].get_rootnode().get_id(), 'outer')
+        self.assertIs(objects['inner'].get_reset_policy(), behave.ResetPolicy.never)
+
+    def test_build_objects_optimize(self):
+        """build_objects can run the optimizer on what it built"""
+        parser = reader.DataParser()
+        for values in ({'type' : 'Actor', 'id' : 'actor', 'name' : 'Billy Bob',
+                        'rootnode' : 'decorator'},
+                       {'type' : 'NodeDecorator', 'id' : 'decorator', 'decoratee' : 'sequence'},
+                       {'type' : 'NodeSequence', 'id' : 'sequence'}):
+            parser._add_entry(reader.ObjectEntry(values))
+        objects = parser.build_objects(optimize=True)
+        self.assertIs(objects['actor'].get_rootnode(), objects['sequence'])
+        self.assertIs(objects['decorator'], objects['sequence'])
@@ -0,0 +1,203 @@
+"""Unit tests for pool module"""
+
+import math
+import unittest
+from unittest import mock
+
+import oh_behave
+from oh_behave import action
+from oh_behave import actor
+from oh_behave import behave
+from oh_behave import compiler
+from oh_behave import pool
+
+def timed_actor(name, timegoal):
+    """Returns an actor running a single ActionTimed leaf"""
+    a = actor.Actor(name=name)
+    timed = action.ActionTimed(id=name + '_wait', actor=a, timegoal=timegoal)
+    a.set_rootnode(behave.NodeLeafAction(id=name + '_leaf', action=timed))
+    return a
+
+def mockactor_builder(*statuses):
+    """Returns a mock actor returning statuses from successive executes"""
+    mock_actor = mock.Mock(spec=actor.Actor)
+    mock_actor.execute.side_effect = list(statuses)
+    mock_actor.get_sleep.return_value = 0
+    mock_actor.get_waits.return_value = []
+    return mock_actor
+
+def waiting_actor(name, timegoal=None):
+    """
+    Returns an actor waiting for its 'go' key, then running an ActionTimed
+    leaf when timegoal is given
+    """
+    a = actor.Actor(name=name, blackboard={'go' : False})
+    condition = action.ActionCondition(id=name + '_go', actor=a, key='go', value=True,
+                                       wait=True)
+    children = [behave.NodeLeafAction(id=name + '_check', action=condition)]
+    if timegoal is not None:
+        timed = action.ActionTimed(id=name + '_wait', actor=a, timegoal=timegoal)
+        children.append(behave.NodeLeafAction(id=name + '_leaf', action=timed))
+    root = behave.NodeParallel(id=name + '_root', actor=a)
+    for child in children:
+        root.addchild(child)
+    a.set_rootnode(root)
+    return a
+
+class TestActorPool(unittest.TestCase):
+    """Tests the actor pool"""
+
+    def test__init__bad_batch_size(self):
+        """Batch sizes must be positive"""
+        with self.assertRaises(ValueError):
+            pool.ActorPool(batch_size=0)
+
+    def test_add_remove(self):
+        """Actors can be added once and removed"""
+        actors = [mockactor_builder() for _ in range(3)]
+        p = pool.ActorPool(actors)
+        p.add(actors[0])
+        self.assertEqual(len(p), 3)
+        p.remove(actors[0])
+        self.assertNotIn(actors[0], p)
+        self.assertEqual(set(p.get_actors()), set(actors[1:]))
+        p.remove(actors[2])
+        p.remove(actors[1])
+        self.assertEqual(len(p), 0)
+
+    def test_tick_reports_results(self):
+        """Finished actors are reported and leave the active set"""
+        ready = mockactor_builder(oh_behave.ExecuteResult.ready)
+        succeeds = mockactor_builder(oh_behave.ExecuteResult.success)
+        fails = mockactor_builder(oh_behave.ExecuteResult.failure)
+        p = pool.ActorPool([ready, succeeds, fails])
+        report = p.tick()
+        self.assertEqual(report.tick, 0)
+        self.assertEqual(report.ticked, 3)
+        self.assertEqual(report.ready, 1)
+        self.assertEqual(report.succeeded, [succeeds])
+        self.assertEqual(report.failed, [fails])
+        self.assertEqual(p.get_actors(), [ready])
+
+    def test_tick_no_rootnode(self):
+        """Actors without a root node are removed as failed"""
+        a = actor.Actor(name='Nobody')
+        p = pool.ActorPool([a])
+        self.assertEqual(p.tick().failed, [a])
+
+    def test_tick_batches(self):
+        """Only batch_size actors are ticked per frame, round robin"""
+        actors = [mockactor_builder(*[oh_behave.ExecuteResult.ready] * 2) for _ in range(4)]
+        p = pool.ActorPool(actors, batch_size=2)
+        self.assertEqual(p.tick().ticked, 2)
+        self.assertEqual(p.tick().ticked, 2)
+        for a in actors:
+            self.assertEqual(a.execute.call_count, 1)
+
+    def test_run(self):
+        """run ticks until every actor has finished"""
+        actors = [mockactor_builder(*[oh_behave.ExecuteResult.ready] * n +
+                                    [oh_behave.ExecuteResult.success]) for n in range(4)]
+        p = pool.ActorPool(actors)
+        self.assertEqual(p.run(), 4)
+        self.assertEqual(p.actor_ticks, 10)
+        self.assertGreater(p.ticks_per_second(), 0)
+
+    def test_run_max_ticks(self):
+        """run stops after max_ticks frames"""
+        a = mockactor_builder(*[oh_behave.ExecuteResult.ready] * 5)
+        p = pool.ActorPool([a])
+        self.assertEqual(p.run(max_ticks=3), 3)
+        self.assertIn(a, p)
+
+    def test_tick_parks_sleeping_actors(self):
+        """Actors waiting on ActionTimed are skipped until their deadline"""
+        a = timed_actor('Billy Bob', 5)
+        p = pool.ActorPool([a])
+        report = p.tick()
+        self.assertEqual(report.parked, 1)
+        self.assertEqual(p.get_parked(), [a])
+        self.assertIn(a, p)
+        for _ in range(3):
+            self.assertEqual(p.tick().ticked, 0)
+        report = p.tick()
+        self.assertEqual(report.woken, 1)
+        self.assertEqual(report.succeeded, [a])
+        self.assertEqual(p.actor_ticks, 2)
+
+    def test_tick_parks_programs(self):
+        """Compiled ActionTimed leaves park their actor too"""
+        a = timed_actor('Billy Bob', 5)
+        compiler.compile_actors({'actor' : a})
+        p = pool.ActorPool([a])
+        self.assertEqual(p.run(), 5)
+        self.assertEqual(p.actor_ticks, 2)
+
+    def test_remove_parked(self):
+        """Parked actors can be removed and are not woken"""
+        a = timed_actor('Billy Bob', 5)
+        p = pool.ActorPool([a])
+        p.tick()
+        p.remove(a)
+        self.assertEqual(len(p), 0)
+        for _ in range(5):
+            self.assertEqual(p.tick().woken, 0)
+
+    def test_run_parked_matches_unparked(self):
+        """Parking does not change how long actors take to finish"""
+        for timegoal in range(1, 8):
+            a = timed_actor('Billy Bob', timegoal)
+            frames = 1
+            while a.execute() is oh_behave.ExecuteResult.ready:
+                frames += 1
+            p = pool.ActorPool([timed_actor('Guy Mann', timegoal)])
+            self.assertEqual(p.run(), frames)
+
+    def test_run_parked_batches_matches_unparked(self):
+        """Parked actors sleep for executions, not frames, when batched"""
+        for size, batch_size, timegoal in ((4, 1, 20), (10, 3, 80), (7, 2, 13)):
+            with mock.patch.object(actor.Actor, 'get_sleep', return_value=0):
+                p = pool.ActorPool([timed_actor(str(n), timegoal) for n in range(size)],
+                                   batch_size=batch_size)
+                frames = p.run()
+            p = pool.ActorPool([timed_actor(str(n), timegoal) for n in range(size)],
+                               batch_size=batch_size)
+            # Woken actors rejoin the end of the round robin, which can
+            # move them up to one round
+            self.assertAlmostEqual(p.run(), frames, delta=math.ceil(size / batch_size))
+
+    def test_tick_parks_waiting_actors(self):
+        """Actors waiting for a key are parked until it changes"""
+        a = waiting_actor('Billy Bob')
+        p = pool.ActorPool([a])
+        self.assertEqual(p.tick().parked, 1)
+        for _ in range(10):
+            self.assertEqual(p.tick().ticked, 0)
+        a.get_blackboard().set('go', True)
+        report = p.tick()
+        self.assertEqual(report.woken, 1)
+        self.assertEqual(report.succeeded, [a])
+        self.assertEqual(p.actor_ticks, 2)
+
+    def test_tick_wait_wakes_sleep_early(self):
+        """Actors woken by a key before their sleep ends are credited the frames parked"""
+        a = waiting_actor('Billy Bob', 10)
+        p = pool.ActorPool([a])
+        p.tick()
+        for _ in range(3):
+            p.tick()
+        a.get_blackboard().set('go', True)
+        p.tick()
+        timed = a.get_rootnode().get_children()[1].get_action()
+        self.assertEqual(timed.time, 6)
+        self.assertIn(a, p)
+
+    def test_remove_waiting(self):
+        """Removed waiting actors stop listening to their keys"""
+        a = waiting_actor('Billy Bob')
+        p = pool.ActorPool([a])
+        p.tick()
+        p.remove(a)
+        a.get_blackboard().set('go', True)
+        self.assertEqual(p.tick().woken, 0)
+        self.assertNotIn(a, p)
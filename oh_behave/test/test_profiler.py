@@ -0,0 +1,136 @@
+"""Unit tests for profiler module"""
+
+import json
+import random
+import threading
+import unittest
+
+import oh_behave
+from oh_behave import action
+from oh_behave import actor
+from oh_behave import behave
+from oh_behave import offload
+from oh_behave import profiler
+
+def build_actor(name='Billy Bob'):
+    """Returns an actor running an inverted timed action then a sequence"""
+    a = actor.Actor(name=name)
+    timed = action.ActionTimed(id='wait', actor=a, timegoal=2)
+    root = behave.NodeSequence(id='root')
+    root.addchild(behave.NodeDecoratorInvert(
+            id='invert', decoratee=behave.NodeLeafAction(id='leaf', action=timed)))
+    root.addchild(behave.NodeSequence(id='empty'))
+    a.set_rootnode(root)
+    return a
+
+class BarrierNode(behave.Node):
+    """Node succeeding once every node sharing its barrier is executing"""
+    __slots__ = ('_barrier',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._barrier = kwargs['barrier']
+
+    def _execute(self):
+        self._barrier.wait()
+        return oh_behave.ExecuteResult.success
+
+    def _success(self):
+        pass
+
+    def _failed(self):
+        pass
+
+class TestProfiler(unittest.TestCase):
+    """Tests the node profiler"""
+    def setUp(self):
+        self.profiler = profiler.Profiler()
+        self.actor = build_actor()
+
+    def run_actor(self):
+        """Ticks the actor until it finishes"""
+        results = []
+        while not results or results[-1] is oh_behave.ExecuteResult.ready:
+            results.append(self.actor.execute())
+        return results
+
+    def test_attach_counts_calls(self):
+        """Execute calls, callbacks and results are counted per node"""
+        self.profiler.attach(self.actor)
+        self.assertEqual(self.run_actor(), [oh_behave.ExecuteResult.ready,
+                                            oh_behave.ExecuteResult.failure])
+        profiles = self.profiler.get_profiles()
+        self.assertEqual(set(profiles), {'root', 'invert', 'leaf', 'wait', 'empty'})
+        self.assertEqual(profiles['empty'].execute_calls, 0)
+        self.assertEqual(profiles['root'].execute_calls, 2)
+        self.assertEqual(profiles['leaf'].results[oh_behave.ExecuteResult.ready], 1)
+        self.assertEqual(profiles['leaf'].results[oh_behave.ExecuteResult.success], 1)
+        self.assertEqual(profiles['invert'].failed_calls, 1)
+        self.assertEqual(profiles['wait'].execute_calls, 2)
+        self.assertGreaterEqual(profiles['root'].total_ns, profiles['invert'].total_ns)
+        self.assertLessEqual(profiles['root'].self_ns, profiles['root'].total_ns)
+
+    def test_attach_same_results(self):
+        """Profiling does not change what the tree returns"""
+        expected = self.run_actor()
+        self.actor = build_actor()
+        self.profiler.attach(self.actor)
+        self.assertEqual(self.run_actor(), expected)
+
+    def test_detach_restores_tree(self):
+        """Detaching puts the original nodes back"""
+        root = self.actor.get_rootnode()
+        invert = root.get_children()[0]
+        leaf = invert.get_decoratee()
+        timed = leaf.get_action()
+        self.profiler.attach(self.actor)
+        self.assertIsNot(self.actor.get_rootnode(), root)
+        self.profiler.detach_all()
+        self.assertIs(self.actor.get_rootnode(), root)
+        self.assertIs(root.get_children()[0], invert)
+        self.assertIs(invert.get_decoratee(), leaf)
+        self.assertIs(leaf.get_action(), timed)
+
+    def test_collapsed_stacks(self):
+        """Stacks are exported as semicolon separated ids and self time"""
+        self.profiler.attach(self.actor)
+        self.run_actor()
+        lines = self.profiler.collapsed_stacks().splitlines()
+        stacks = [line.rsplit(' ', 1)[0] for line in lines]
+        self.assertIn('root;invert;leaf;wait', stacks)
+        for line in lines:
+            self.assertGreaterEqual(int(line.rsplit(' ', 1)[1]), 0)
+
+    def test_summary(self):
+        """The summary is JSON keyed by node id"""
+        self.profiler.attach(self.actor)
+        self.run_actor()
+        summary = json.loads(self.profiler.summary())
+        self.assertEqual(summary['root']['execute_calls'], 2)
+        self.assertEqual(summary['root']['results']['failure'], 1)
+
+    def test_sample(self):
+        """Only the sampled actors are profiled"""
+        actors = [build_actor(str(index)) for index in range(20)]
+        sampled = self.profiler.sample(actors, 0.5, random.Random(1))
+        self.assertTrue(0 < len(sampled) < 20)
+        for a in actors:
+            is_proxy = isinstance(a.get_rootnode(), profiler._ProfiledNode)
+            self.assertEqual(is_proxy, a in sampled)
+
+    def test_concurrent_stacks(self):
+        """Children running on other threads record stacks under their parent"""
+        barrier = threading.Barrier(3, timeout=5)
+        executor = offload.BoundedExecutor(2)
+        self.addCleanup(executor.shutdown)
+        parallel = behave.NodeParallel(id='parallel', concurrent=True, executor=executor)
+        for index in range(3):
+            parallel.addchild(BarrierNode(id='child{0}'.format(index), barrier=barrier))
+        a = actor.Actor(name='Guy Mann')
+        a.set_rootnode(parallel)
+        self.profiler.attach(a)
+        self.assertIs(a.execute(), oh_behave.ExecuteResult.success)
+        stacks = {line.rsplit(' ', 1)[0] for line in self.profiler.collapsed_stacks().splitlines()}
+        self.assertEqual(stacks, {'parallel', 'parallel;child0', 'parallel;child1',
+                                  'parallel;child2'})
+        self.assertEqual(self.profiler.get_profile('child1').execute_calls, 1)
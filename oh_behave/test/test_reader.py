@@ -1,7 +1,13 @@
+import io
+import json
+import os
+import tempfile
 import unittest
 from unittest import mock
 
 import oh_behave
+from oh_behave import behave
+from oh_behave import compiler
 from oh_behave import reader
 
 test_string ='{\n' \
@@ -45,6 +51,8 @@ class TestObjectEntry(unittest.TestCase):
         self.assertIs(None, entry.rootnode)
         self.assertEqual([], entry.childnodes)
         self.assertIs(None, entry.decoratee)
+        self.assertIs(None, entry.action)
+        self.assertIs(None, entry.actor)
 
     def test__init__gets_parameters(self):
         """__init__ grabs the parameters shown below"""
@@ -106,3 +114,303 @@ class TestDataParser(unittest.TestCase):
             '}'
         self.parser._parse_object_string(input_string1)
         self.parser._parse_object_string(input_string2)
+
+    def test_build_objects_links_actions(self):
+        """Leaf nodes are linked to their action and actions to their actor"""
+        table = dict(reader.classname_match_table_default)
+        parser = reader.DataParser(classname_match_table=table)
+        parser._parse_object_string('{"id": "actor01", "type": "Actor", "name": "Guy Mann",'
+                                    ' "rootnode": "leaf"}')
+        parser._parse_object_string('{"id": "leaf", "type": "NodeLeafAction", "action": "wait"}')
+        parser._parse_object_string('{"id": "wait", "type": "ActionTimed", "actor": "actor01",'
+                                    ' "timegoal": 2}')
+        objects = parser.build_objects()
+        self.assertIs(objects['leaf'].get_action(), objects['wait'])
+        self.assertIs(objects['wait']._actor, objects['actor01'])
+        self.assertIs(objects['actor01'].get_rootnode(), objects['leaf'])
+
+    def test_build_objects_links_parallel_actor(self):
+        """Parallel nodes are linked to their children and actor"""
+        parser = reader.DataParser()
+        parser._parse_object_string('{"id": "actor01", "type": "Actor", "name": "Guy Mann",'
+                                    ' "rootnode": "both"}')
+        parser._parse_object_string('{"id": "both", "type": "NodeParallel", "actor": "actor01",'
+                                    ' "success_threshold": 1, "childnodes": ["left", "right"]}')
+        parser._parse_object_string('{"id": "left", "type": "NodeSequence"}')
+        parser._parse_object_string('{"id": "right", "type": "NodeSelector"}')
+        objects = parser.build_objects()
+        self.assertIsInstance(objects['both'], behave.NodeParallel)
+        self.assertEqual(objects['both'].get_children(), [objects['left'], objects['right']])
+        self.assertIs(objects['both']._actor, objects['actor01'])
+        self.assertEqual(objects['actor01'].execute(), oh_behave.ExecuteResult.success)
+
+    def test_build_objects_node_actor_ignored(self):
+        """Nodes without an actor of their own ignore the one they are given"""
+        parser = reader.DataParser()
+        parser._parse_object_string('{"id": "actor01", "type": "Actor", "name": "Guy Mann",'
+                                    ' "rootnode": "root"}')
+        parser._parse_object_string('{"id": "root", "type": "NodeSequence", "actor": "actor01"}')
+        objects = parser.build_objects()
+        self.assertIs(objects['actor01'].get_rootnode(), objects['root'])
+
+class TestParseFile(unittest.TestCase):
+    """Tests streaming object definitions from files"""
+
+    def setUp(self):
+        self.parser = reader.DataParser()
+        self.definitions = [
+            {'id': 'actor01', 'type': 'Actor', 'name': 'Guÿ Männ ☃',
+             'rootnode': 'node01'},
+            {'id': 'node01', 'type': 'NodeSequence', 'childnodes': ['node02']},
+            {'id': 'node02', 'type': 'NodeSelector', 'name': 'with, [brackets]'}
+        ]
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write_file(self, text):
+        """Writes text to a temporary file and returns its path"""
+        path = os.path.join(self.tempdir.name, 'definitions.json')
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(text)
+        return path
+
+    def assert_parsed(self, path, **kwargs):
+        """Checks that parsing path gives entries for the definitions"""
+        parser = reader.DataParser()
+        self.assertEqual(parser.parse_file(path, **kwargs), len(self.definitions))
+        self.assertEqual([entry.values for entry in parser._entries], self.definitions)
+
+    def test_parse_file_json_lines(self):
+        """One definition per line is parsed"""
+        path = self.write_file('\n'.join(json.dumps(d) for d in self.definitions) + '\n')
+        self.assert_parsed(path)
+
+    def test_parse_file_array(self):
+        """A top level array of definitions is parsed"""
+        path = self.write_file(json.dumps(self.definitions, indent=4))
+        self.assert_parsed(path)
+
+    def test_parse_file_small_chunks(self):
+        """Definitions split across chunks are reassembled"""
+        path = self.write_file(json.dumps(self.definitions, indent=4, ensure_ascii=False))
+        for chunk_size in (1, 2, 7):
+            self.assert_parsed(path, chunk_size=chunk_size)
+            self.assert_parsed(path, chunk_size=chunk_size, use_mmap=True)
+
+    def test_parse_file_mmap(self):
+        """Memory mapped files are parsed"""
+        path = self.write_file('\n'.join(json.dumps(d, ensure_ascii=False)
+                                         for d in self.definitions))
+        self.assert_parsed(path, use_mmap=True)
+
+    def test_parse_file_empty(self):
+        """Empty files have no entries"""
+        path = self.write_file('')
+        self.assertEqual(self.parser.parse_file(path), 0)
+        self.assertEqual(self.parser.parse_file(path, use_mmap=True), 0)
+
+    def test_parse_file_invalid(self):
+        """Malformed definitions raise an exception"""
+        path = self.write_file('{"id": "node01", "type": "NodeSequence"}\n{"id": ')
+        with self.assertRaises(ValueError):
+            self.parser.parse_file(path)
+
+class TestIterJsonObjects(unittest.TestCase):
+    """Tests the streaming JSON decoder"""
+
+    def test_iter_json_objects_scalars_across_chunks(self):
+        """Top level numbers are not split at chunk boundaries"""
+        text = '12345 -6.5e3 [1, 22] true "abc" 7'
+        self.assertEqual(list(reader.iter_json_objects(io.StringIO(text), chunk_size=1)),
+                         [12345, -6.5e3, [1, 22], True, 'abc', 7])
+        self.assertEqual(list(reader.iter_json_objects(io.StringIO('[10, 200]'), chunk_size=1)),
+                         [10, 200])
+
+    def test_iter_json_objects_concatenated(self):
+        """Values need not be on their own lines"""
+        stream = io.StringIO('{"a": 1}{"b": 2}  {"c": [3]}')
+        self.assertEqual(list(reader.iter_json_objects(stream, 3)),
+                         [{'a': 1}, {'b': 2}, {'c': [3]}])
+
+    def test_iter_json_objects_invalid_start(self):
+        """Text that cannot start a value raises before the stream is read"""
+        stream = io.StringIO('{"a": 1} x' + ' ' * 100 + '{"b": 2}')
+        values = reader.iter_json_objects(stream, 4)
+        self.assertEqual(next(values), {'a': 1})
+        with self.assertRaises(json.JSONDecodeError):
+            next(values)
+        self.assertLess(stream.tell(), 20)
+
+    def test_iter_json_objects_max_pending(self):
+        """Values longer than max_pending raise before the stream is read"""
+        stream = io.StringIO('{"a": "' + 'b' * 1000)
+        with self.assertRaises(json.JSONDecodeError):
+            list(reader.iter_json_objects(stream, 4, max_pending=64))
+        self.assertLess(stream.tell(), 200)
+        stream = io.StringIO('{"a": "' + 'b' * 1000 + '"}')
+        self.assertEqual(list(reader.iter_json_objects(stream, 4)), [{'a': 'b' * 1000}])
+
+class TestBuildObjectsReachable(unittest.TestCase):
+    """Tests building only the objects reachable from some roots"""
+
+    def setUp(self):
+        self.parser = reader.DataParser()
+        for definition in [
+                '{"id": "actor01", "type": "Actor", "name": "Guy Mann", "rootnode": "root01"}',
+                '{"id": "actor02", "type": "Actor", "name": "Billy Bob", "rootnode": "root02"}',
+                '{"id": "root01", "type": "NodeSequence", "childnodes": ["invert", "shared"]}',
+                '{"id": "root02", "type": "NodeSelector", "childnodes": ["shared"]}',
+                '{"id": "invert", "type": "NodeDecoratorInvert", "decoratee": "leaf"}',
+                '{"id": "leaf", "type": "NodeLeafAction", "action": "wait"}',
+                '{"id": "wait", "type": "ActionTimed", "actor": "actor02", "timegoal": 2}',
+                '{"id": "shared", "type": "NodeSequence"}',
+                '{"id": "unused", "type": "NodeSequence"}']:
+            self.parser._parse_object_string(definition)
+
+    def test_get_entry(self):
+        """Entries are looked up by id"""
+        self.assertEqual(self.parser.get_entry('leaf').classtype, 'NodeLeafAction')
+        self.assertIs(self.parser.get_entry('missing'), None)
+
+    def test_build_objects_roots(self):
+        """Only the objects reachable from the roots are built"""
+        objects = self.parser.build_objects(roots=['actor01'])
+        self.assertEqual(set(objects),
+                         {'actor01', 'root01', 'invert', 'leaf', 'wait', 'shared'})
+        self.assertIs(objects['actor01'].get_rootnode(), objects['root01'])
+        self.assertIs(objects['leaf'].get_action(), objects['wait'])
+        # actor02 was not requested so the action keeps the plain id
+        self.assertEqual(objects['wait']._actor, 'actor02')
+
+    def test_build_objects_all(self):
+        """Without roots every entry is built"""
+        self.assertEqual(len(self.parser.build_objects()), 9)
+
+    def test_build_objects_missing_root(self):
+        """Requesting an unknown id raises KeyError"""
+        with self.assertRaises(KeyError):
+            self.parser.build_objects(roots=['missing'])
+
+class TestDeduplicate(unittest.TestCase):
+    """Tests sharing identical subtrees"""
+
+    def setUp(self):
+        self.parser = reader.DataParser()
+        definitions = [
+                {"id": "root", "type": "NodeSequence", "childnodes": ["node01", "node02"]},
+                {"id": "node01", "type": "NodeSelector", "childnodes": ["invert01", "node03"]},
+                {"id": "node02", "type": "NodeSelector", "childnodes": ["invert02", "node04"]},
+                {"id": "invert01", "type": "NodeDecoratorInvert", "decoratee": "node03"},
+                {"id": "invert02", "type": "NodeDecoratorInvert", "decoratee": "node04"},
+                {"id": "node03", "type": "NodeSequence", "name": "Smack it"},
+                {"id": "node04", "type": "NodeSequence", "name": "Relax"},
+                {"id": "node05", "type": "NodeSelector"}]
+        for index in range(2):
+            ident = 'actor{0:02d}'.format(index)
+            definitions.extend([
+                {"id": ident, "type": "Actor", "name": ident, "rootnode": ident + "_root"},
+                {"id": ident + "_root", "type": "NodeSequence", "childnodes": [ident + "_leaf"]},
+                {"id": ident + "_leaf", "type": "NodeLeafAction", "action": ident + "_wait"},
+                {"id": ident + "_wait", "type": "ActionTimed", "actor": ident, "timegoal": 3}])
+        for values in definitions:
+            self.parser._add_entry(reader.ObjectEntry(values))
+
+    def test_structural_hashes(self):
+        """Subtrees differing only by ids and names hash the same"""
+        hashes = self.parser.structural_hashes()
+        self.assertEqual(hashes['node03'], hashes['node04'])
+        self.assertEqual(hashes['invert01'], hashes['invert02'])
+        self.assertNotEqual(hashes['node03'], hashes['node05'])
+        # Selectors with children and timed actions hold state
+        self.assertNotIn('node01', hashes)
+        self.assertNotIn('actor00_leaf', hashes)
+
+    def test_deduplicate_stateless(self):
+        """Identical stateless subtrees are built once"""
+        report = self.parser.deduplicate()
+        self.assertEqual(report.aliases, {'node04' : 'node03', 'invert02' : 'invert01'})
+        objects = self.parser.build_objects()
+        self.assertIs(objects['node04'], objects['node03'])
+        self.assertIs(objects['node02'].get_children()[0], objects['invert01'])
+        self.assertIsNot(objects['node02'], objects['node01'])
+
+    def test_deduplicate_roots(self):
+        """Building from roots reaches the shared objects"""
+        self.parser.deduplicate()
+        objects = self.parser.build_objects(roots=['node02'])
+        self.assertIs(objects['node02'].get_children()[1], objects['node03'])
+
+    def test_deduplicate_externalized(self):
+        """With externalized state whole trees are shared and compiled once"""
+        report = self.parser.deduplicate(externalized=True)
+        self.assertEqual(report.groups()['node01'], ['node02'])
+        self.assertEqual(report.aliases['actor01_root'], 'actor00_root')
+        objects = self.parser.build_objects()
+        programs = compiler.compile_actors(objects)
+        self.assertEqual(list(programs), ['actor00_root'])
+        first = objects['actor00'].get_rootnode()
+        second = objects['actor01'].get_rootnode()
+        self.assertIs(first.program, second.program)
+        first.execute()
+        self.assertNotEqual(first.state, second.state)
+
+class TestParseFiles(unittest.TestCase):
+    """Tests parsing many files in parallel"""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        os.mkdir(os.path.join(self.tempdir.name, 'nested'))
+        self.write_file('a.json', [{'id': 'actor01', 'type': 'Actor', 'name': 'Guy Mann',
+                                    'rootnode': 'root'}])
+        self.write_file('nested/b.jsonl', [{'id': 'root', 'type': 'NodeSequence',
+                                            'childnodes': ['child']}])
+        self.write_file('nested/c.json', [{'id': 'child', 'type': 'NodeSelector'}])
+        self.write_file('notes.txt', [{'id': 'ignored', 'type': 'NodeSelector'}])
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write_file(self, name, definitions):
+        """Writes definitions as JSON Lines to a file in the temporary directory"""
+        path = os.path.join(self.tempdir.name, name)
+        with open(path, 'w') as output:
+            output.write('\n'.join(json.dumps(d) for d in definitions))
+        return path
+
+    def test_find_definition_files(self):
+        """Directories are searched recursively for definition files"""
+        files = reader.find_definition_files([self.tempdir.name])
+        self.assertEqual([os.path.relpath(f, self.tempdir.name) for f in files],
+                         ['a.json', os.path.join('nested', 'b.jsonl'),
+                          os.path.join('nested', 'c.json')])
+
+    def test_parse_files_processes(self):
+        """Files parsed in worker processes are merged and linked"""
+        parser = reader.DataParser()
+        self.assertEqual(parser.parse_files([self.tempdir.name], processes=2), 3)
+        objects = parser.build_objects()
+        self.assertIs(objects['actor01'].get_rootnode(), objects['root'])
+        self.assertIs(objects['root'].get_children()[0], objects['child'])
+
+    def test_parse_files_single_process(self):
+        """One process parses in place"""
+        parser = reader.DataParser()
+        self.assertEqual(parser.parse_files([self.tempdir.name], processes=1), 3)
+        self.assertEqual(parser.get_entry('child').classtype, 'NodeSelector')
+
+    def test_parse_files_duplicate_across_files(self):
+        """The same id in two files is refused"""
+        self.write_file('nested/d.json', [{'id': 'child', 'type': 'NodeSequence'}])
+        parser = reader.DataParser()
+        with self.assertRaises(reader.DuplicateIdException):
+            parser.parse_files([self.tempdir.name], processes=2)
+        self.assertIs(parser.get_entry('child'), None)
+
+    def test_parse_files_duplicate_of_parsed(self):
+        """Ids already parsed cannot be defined again"""
+        parser = reader.DataParser()
+        parser._parse_object_string('{"id": "root", "type": "NodeSequence"}')
+        with self.assertRaises(reader.DuplicateIdException):
+            parser.parse_files([self.tempdir.name], processes=1)
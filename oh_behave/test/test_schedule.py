@@ -0,0 +1,40 @@
+"""Unit tests for schedule module"""
+
+import unittest
+
+from oh_behave import schedule
+
+class TestTimerWheel(unittest.TestCase):
+    """Tests the timer wheel"""
+    def setUp(self):
+        self.wheel = schedule.TimerWheel(size=4)
+
+    def test__init__bad_size(self):
+        """The wheel needs at least one slot"""
+        with self.assertRaises(ValueError):
+            schedule.TimerWheel(size=0)
+
+    def test_advance_returns_due_items(self):
+        """Items come back on the tick they were scheduled for"""
+        self.wheel.schedule('a', 2)
+        self.wheel.schedule('b', 3)
+        self.wheel.schedule('c', 2)
+        self.assertEqual(len(self.wheel), 3)
+        self.assertEqual(self.wheel.advance(), [])
+        self.assertEqual(sorted(self.wheel.advance()), ['a', 'c'])
+        self.assertEqual(self.wheel.advance(), ['b'])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_schedule_past_deadline(self):
+        """Deadlines that have passed are due on the next tick"""
+        self.wheel.advance_to(5)
+        self.wheel.schedule('a', 1)
+        self.assertEqual(self.wheel.advance(), ['a'])
+
+    def test_schedule_beyond_revolution(self):
+        """Deadlines further than the wheel size are not returned early"""
+        self.wheel.schedule('far', 10)
+        self.wheel.schedule('near', 2)
+        self.assertEqual(self.wheel.advance_to(9), ['near'])
+        self.assertEqual(self.wheel.advance(), ['far'])
+        self.assertEqual(self.wheel.advance_to(30), [])
@@ -0,0 +1,105 @@
+"""Unit tests for shard module"""
+
+import unittest
+
+import oh_behave
+from oh_behave import compiler
+from oh_behave import generate
+from oh_behave import pool
+from oh_behave import reader
+from oh_behave import shard
+
+def build_parser(count):
+    """Returns a parser defining count actors with timed sequences"""
+    parser = reader.DataParser()
+    for index in range(count):
+        ident = 'actor{0:02d}'.format(index)
+        for values in (
+                {'id': ident, 'type': 'Actor', 'name': ident, 'rootnode': ident + '_root'},
+                {'id': ident + '_root', 'type': 'NodeSequence',
+                 'childnodes': [ident + '_leaf', ident + '_last']},
+                {'id': ident + '_leaf', 'type': 'NodeLeafAction', 'action': ident + '_wait'},
+                {'id': ident + '_wait', 'type': 'ActionTimed', 'actor': ident,
+                 'timegoal': index % 5 + 1},
+                {'id': ident + '_last', 'type': 'NodeDecoratorInvert'
+                 if index % 2 else 'NodeDecorator', 'decoratee': ident + '_empty'},
+                {'id': ident + '_empty', 'type': 'NodeSequence'}):
+            parser._add_entry(reader.ObjectEntry(values))
+    return parser
+
+def run_locally(parser):
+    """Returns the final result of every actor run in this process"""
+    objects = parser.build_objects()
+    results = {}
+    for ident in (entry.ident for entry in parser.get_entries() if entry.classtype == 'Actor'):
+        status = oh_behave.ExecuteResult.ready
+        while status is oh_behave.ExecuteResult.ready:
+            status = objects[ident].execute()
+        results[ident] = status
+    return results
+
+def parse(definitions):
+    """Returns a parser holding definitions"""
+    parser = reader.DataParser()
+    for values in definitions:
+        parser._add_entry(reader.ObjectEntry(values))
+    return parser
+
+class TestShardedRuntime(unittest.TestCase):
+    """Tests running actors across processes"""
+
+    def test_run_matches_single_process(self):
+        """Sharded actors finish with the same results as local ones"""
+        parser = build_parser(10)
+        expected = run_locally(build_parser(10))
+        for compiled in (False, True):
+            with shard.ShardedRuntime(parser, shards=3, compiled=compiled) as runtime:
+                self.assertEqual(len(runtime.partitions), 3)
+                self.assertEqual(runtime.run(batch=2), expected)
+                self.assertEqual(runtime.remaining, 0)
+
+    def test_tick_lock_step(self):
+        """Every shard runs the same number of ticks"""
+        with shard.ShardedRuntime(build_parser(4), shards=2) as runtime:
+            statuses = runtime.tick()
+            self.assertEqual(set(statuses.values()), {oh_behave.ExecuteResult.ready})
+            self.assertEqual(runtime.ticks, 1)
+            statuses = runtime.run(max_ticks=3)
+            self.assertEqual(runtime.ticks, 4)
+            self.assertEqual(len(statuses), 4)
+
+    def test_shard_error(self):
+        """Errors building a shard are raised in the coordinator"""
+        parser = reader.DataParser()
+        parser._add_entry(reader.ObjectEntry(
+                {'id': 'actor', 'type': 'Actor', 'name': 'actor', 'rootnode': 'missing'}))
+        with self.assertRaises(shard.ShardException):
+            shard.ShardedRuntime(parser, shards=1)
+
+    def test_shard_roots_shared_library(self):
+        """Shards build the actor that the actions of a shared tree belong to"""
+        parser = parse(generate.generate_library(4, 3, 2, shared=True))
+        self.assertEqual(shard._shard_roots(parser, ['actor2', 'actor3']),
+                         ['actor2', 'actor3', 'actor0'])
+        self.assertEqual(shard._shard_roots(parser, ['actor0']), ['actor0'])
+
+    def test_run_shared_library(self):
+        """Actors sharing a tree with actors of other shards run in both modes"""
+        definitions = generate.generate_library(4, 3, 3, seed=3, shared=True)
+        objects = parse(definitions).build_objects()
+        compiler.compile_actors(objects)
+        actor_pool = pool.ActorPool(objects['actor{0}'.format(index)] for index in range(4))
+        expected = dict.fromkeys(objects['actor{0}'.format(index)] for index in range(4))
+        for _ in range(8):
+            report = actor_pool.tick()
+            for a in report.succeeded:
+                expected[a] = oh_behave.ExecuteResult.success
+            for a in report.failed:
+                expected[a] = oh_behave.ExecuteResult.failure
+        expected = {a.name : status or oh_behave.ExecuteResult.ready
+                    for a, status in expected.items()}
+        for compiled in (False, True):
+            with shard.ShardedRuntime(parse(definitions), shards=2,
+                                      compiled=compiled) as runtime:
+                statuses = runtime.run(max_ticks=8)
+                self.assertEqual(statuses, expected)
@@ -0,0 +1,111 @@
+"""Unit tests for sharedstate module"""
+
+import os
+import subprocess
+import sys
+import unittest
+
+import oh_behave
+from oh_behave import actor
+from oh_behave import compiler
+from oh_behave import sharedstate
+from oh_behave.test.test_compiler import build_tree
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+@unittest.skipIf(sharedstate.shared_memory is None, 'Shared memory needs Python 3.8')
+class TestSharedState(unittest.TestCase):
+    """Tests running compiled programs on shared memory records"""
+    def setUp(self):
+        self.program = compiler.compile_tree(build_tree())
+        self.block = sharedstate.SharedStateBlock(self.program, 3)
+        self.view = sharedstate.SharedStateView(self.block.name)
+
+    def tearDown(self):
+        self.view.close()
+        self.block.close()
+        self.block.unlink()
+
+    def test_instances_match_program(self):
+        """Shared instances run like instances with their own state"""
+        shared = self.block.instantiate(1)
+        local = self.program.instantiate()
+        for _ in range(10):
+            self.assertIs(shared.execute(), local.execute())
+            self.assertEqual(shared.state.tolist(), local.state.tolist())
+
+    def test_view_reads_state(self):
+        """Views see the status, cursors and running node of every record"""
+        shared = self.block.instantiate(2)
+        shared.execute()
+        self.assertEqual(self.view.ids, list(self.program.ids))
+        self.assertIs(self.view.status(2), oh_behave.ExecuteResult.ready)
+        self.assertEqual(self.view.running_node(2), 'leaf01')
+        self.assertEqual(self.view.running_node(0), 'root')
+        record = self.view.record(2)
+        self.assertEqual(record[sharedstate.RECORD_STATE:].tolist(), shared.state.tolist())
+
+    def test_instantiate_out_of_range(self):
+        """Records outside the block are refused"""
+        with self.assertRaises(IndexError):
+            self.block.instantiate(3)
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    @unittest.skipIf(os.name != 'posix', 'Blocks are only tracked on POSIX')
+    def test_view_untracked_reader(self):
+        """Readers in other process trees leave the block alone when they exit"""
+        script = ('from oh_behave import sharedstate\n'
+                  'view = sharedstate.SharedStateView({0!r}, track=False)\n'
+                  'print(view.count)\n'
+                  'view.close()\n').format(self.block.name)
+        output = subprocess.run([sys.executable, '-c', script], check=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.assertEqual(output.stdout.split(), [b'3'])
+        self.assertNotIn(b'leaked', output.stderr)
+        view = sharedstate.SharedStateView(self.block.name)
+        self.assertEqual(view.count, 3)
+        view.close()
+
+    def test_view_as_array(self):
+        """Records can be read as a NumPy array without copying"""
+        shared = self.block.instantiate(0)
+        shared.execute()
+        array = self.view.as_array()
+        self.assertEqual(array.shape, (3, self.block.record_size))
+        self.assertEqual(array[0, sharedstate.RECORD_STATUS], 0)
+        shared.execute()
+        shared.execute()
+        self.assertEqual(array[0, sharedstate.RECORD_STATUS],
+                         oh_behave.ExecuteResult.ready.value)
+        self.assertEqual(list(array[0, sharedstate.RECORD_STATE:]), shared.state.tolist())
+        del array
+
+@unittest.skipIf(sharedstate.shared_memory is None, 'Shared memory needs Python 3.8')
+class TestShareActors(unittest.TestCase):
+    """Tests moving actors onto shared memory"""
+
+    def test_share_actors(self):
+        """Actors carry on from the state they had"""
+        root = build_tree()
+        actors = [actor.Actor(name=str(index), rootnode=root) for index in range(2)]
+        compiler.compile_actors({str(index) : a for index, a in enumerate(actors)})
+        local = compiler.compile_tree(build_tree()).instantiate()
+        for _ in range(3):
+            actors[0].execute()
+            local.execute()
+        block = sharedstate.share_actors(actors)
+        try:
+            self.assertIsInstance(actors[0].get_rootnode(), sharedstate.SharedProgramInstance)
+            for _ in range(5):
+                self.assertIs(actors[0].execute(), local.execute())
+        finally:
+            block.close()
+            block.unlink()
+
+    def test_share_actors_not_compiled(self):
+        """Actors running node objects cannot be shared"""
+        with self.assertRaises(sharedstate.SharedStateException):
+            sharedstate.share_actors([actor.Actor(name='Billy Bob', rootnode=build_tree())])
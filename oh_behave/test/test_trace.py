@@ -0,0 +1,90 @@
+"""Unit tests for trace module"""
+
+import io
+import unittest
+
+import oh_behave
+from oh_behave import actor
+from oh_behave import behave
+from oh_behave import trace
+from oh_behave.test.test_behave import mocknode_builder
+
+class TestTraceBuffer(unittest.TestCase):
+    """Tests the trace ring buffer"""
+    def setUp(self):
+        self.buffer = trace.TraceBuffer(capacity=3)
+
+    def test__init__bad_capacity(self):
+        """A buffer must be able to hold at least one event"""
+        with self.assertRaises(ValueError):
+            trace.TraceBuffer(capacity=0)
+
+    def test_record_events(self):
+        """Recorded events are returned oldest first"""
+        self.buffer.record('node01', 'execute', oh_behave.ExecuteResult.ready)
+        self.buffer.record('node02', 'success', None)
+        events = self.buffer.events()
+        self.assertEqual([(e.ident, e.method, e.result) for e in events],
+                         [('node01', 'execute', oh_behave.ExecuteResult.ready),
+                          ('node02', 'success', None)])
+        self.assertLessEqual(events[0].timestamp, events[1].timestamp)
+
+    def test_record_wraps_around(self):
+        """Once full the oldest events are overwritten"""
+        for index in range(5):
+            self.buffer.record('node{0}'.format(index), 'execute', None)
+        self.assertEqual(len(self.buffer), 3)
+        self.assertEqual(self.buffer.dropped(), 2)
+        self.assertEqual([e.ident for e in self.buffer.events()], ['node2', 'node3', 'node4'])
+
+    def test_drain(self):
+        """drain returns the events and empties the buffer"""
+        self.buffer.record('node01', 'execute', None)
+        self.assertEqual(len(self.buffer.drain()), 1)
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(self.buffer.events(), [])
+
+    def test_dump(self):
+        """dump writes one line per event"""
+        self.buffer.record('node01', 'execute', oh_behave.ExecuteResult.success)
+        stream = io.StringIO()
+        self.buffer.dump(stream)
+        self.assertIn('node01.execute ExecuteResult.success', stream.getvalue())
+        self.assertEqual(stream.getvalue().count('\n'), 1)
+
+class TestTracing(unittest.TestCase):
+    """Tests switching tracing on and off"""
+    def tearDown(self):
+        trace.disable()
+
+    def test_disabled_has_no_wrapper(self):
+        """Disabling tracing restores the plain methods"""
+        execute = behave.Node.__dict__['execute']
+        trace.enable()
+        self.assertIsNot(behave.Node.__dict__['execute'], execute)
+        self.assertTrue(trace.is_enabled())
+        trace.disable()
+        self.assertIs(behave.Node.__dict__['execute'], execute)
+        self.assertFalse(trace.is_enabled())
+        self.assertIs(trace.get_buffer(), None)
+
+    def test_enable_twice(self):
+        """Enabling again replaces the buffer without stacking wrappers"""
+        execute = behave.Node.__dict__['execute']
+        trace.enable()
+        buffer = trace.enable(trace.TraceBuffer(capacity=10))
+        self.assertIs(trace.get_buffer(), buffer)
+        trace.disable()
+        self.assertIs(behave.Node.__dict__['execute'], execute)
+
+    def test_enable_records_nodes(self):
+        """Node and actor calls are recorded while tracing"""
+        buffer = trace.enable()
+        sequence = behave.NodeSequence(id='sequence')
+        sequence.addchild(mocknode_builder(oh_behave.ExecuteResult.ready))
+        a = actor.Actor(name='Billy Bob', rootnode=sequence)
+        a.execute()
+        events = buffer.drain()
+        self.assertEqual([(e.ident, e.method, e.result) for e in events],
+                         [('sequence', 'execute', oh_behave.ExecuteResult.ready),
+                          ('Billy Bob', 'execute', oh_behave.ExecuteResult.ready)])
@@ -0,0 +1,66 @@
+"""Unit tests for vectorized module"""
+
+import unittest
+from unittest import mock
+
+from oh_behave import action
+from oh_behave import behave
+from oh_behave import compiler
+from oh_behave.test.test_compiler import build_tree, build_random_tree
+
+try:
+    import numpy
+    from oh_behave import vectorized
+except ImportError:
+    numpy = None
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class TestPopulation(unittest.TestCase):
+    """Tests the vectorized population against program instances"""
+
+    def assert_matches_instances(self, program, size, ticks):
+        """Runs actors at different phases both ways and compares results"""
+        population = vectorized.Population(program, size)
+        instances = [program.instantiate() for _ in range(size)]
+        # Stagger the actors so that they are at different places in the tree
+        for offset in range(size):
+            mask = numpy.arange(size) >= offset
+            statuses = population.execute(mask)
+            for row in range(offset, size):
+                self.assertEqual(statuses[row], instances[row].execute().value)
+        for _ in range(ticks):
+            statuses = population.execute()
+            expected = [instance.execute() for instance in instances]
+            self.assertEqual(vectorized.to_results(statuses), expected)
+
+    def test__init__unsupported_node(self):
+        """Programs with leaves other than ActionTimed are refused"""
+        leaf = behave.NodeLeafAction(id='leaf', action=mock.Mock(spec=action.Action))
+        with self.assertRaises(compiler.CompileException):
+            vectorized.Population(compiler.compile_tree(leaf), 10)
+
+    def test_execute_matches_instances(self):
+        """The population returns what each instance would"""
+        self.assert_matches_instances(compiler.compile_tree(build_tree()), 12, 20)
+
+    def test_execute_reset_policies_match_instances(self):
+        """Composites reset themselves like they do in instances"""
+        for policy in behave.ResetPolicy:
+            self.assert_matches_instances(compiler.compile_tree(build_tree(policy)), 12, 20)
+
+    def test_execute_random_trees_match_instances(self):
+        """The population matches instances on randomly generated trees"""
+        for seed in range(30):
+            program = compiler.compile_tree(build_random_tree(seed))
+            self.assert_matches_instances(program, 8, 20)
+
+    def test_reset(self):
+        """Resetting rows rewinds only those actors"""
+        program = compiler.compile_tree(build_tree())
+        population = vectorized.Population(program, 3)
+        for _ in range(4):
+            population.execute()
+        population.reset([1])
+        numpy.testing.assert_array_equal(population.state[1], population.initial_state)
+        self.assertEqual(population.resume[1], 0)
+        self.assertFalse((population.state[0] == population.initial_state).all())
@@ -0,0 +1,159 @@
+"""Module for recording execution traces of behavior trees
+
+Tracing costs nothing while disabled: enable() swaps recording wrappers in
+for the execute, success, failed and reset methods of nodes, actors and
+compiled program instances, and disable() puts the plain methods back.
+Events are stored in a preallocated ring buffer which can be drained or
+dumped when something goes wrong.
+"""
+
+import collections
+import logging
+import time
+from oh_behave import actor
+from oh_behave import behave
+from oh_behave import compiler
+
+logger = logging.getLogger(__name__)
+
+TraceEvent = collections.namedtuple('TraceEvent', ['ident', 'method', 'result', 'timestamp'])
+
+# Methods wrapped while tracing, with the function returning the id to record
+_TRACED_METHODS = (
+    (behave.Node, 'execute', behave.Node.get_id),
+    (behave.Node, 'success', behave.Node.get_id),
+    (behave.Node, 'failed', behave.Node.get_id),
+    (behave.Node, 'reset', behave.Node.get_id),
+    (actor.Actor, 'execute', lambda obj: obj.name),
+    (compiler.ProgramInstance, 'execute', compiler.ProgramInstance.get_id),
+)
+
+_originals = {}
+_buffer = None
+
+class TraceBuffer:
+    """
+    Ring buffer of trace events
+
+    Storage is allocated up front, once full the oldest events are
+    overwritten.
+    """
+    def __init__(self, capacity=4096):
+        if capacity <= 0:
+            raise ValueError('Trace buffer capacity must be positive')
+        self.capacity = capacity
+        self._idents = [None] * capacity
+        self._methods = [None] * capacity
+        self._results = [None] * capacity
+        self._timestamps = [0] * capacity
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def record(self, ident, method, result):
+        """
+        Store an event, timestamped with time.monotonic_ns()
+        """
+        index = self._count % self.capacity
+        self._idents[index] = ident
+        self._methods[index] = method
+        self._results[index] = result
+        self._timestamps[index] = time.monotonic_ns()
+        self._count += 1
+
+    def dropped(self):
+        """
+        Returns the number of events overwritten since the last clear
+        """
+        return max(self._count - self.capacity, 0)
+
+    def events(self):
+        """
+        Returns the stored events as TraceEvents, oldest first
+        """
+        count = len(self)
+        first = self._count - count
+        events = []
+        for position in range(first, self._count):
+            index = position % self.capacity
+            events.append(TraceEvent(self._idents[index], self._methods[index],
+                                     self._results[index], self._timestamps[index]))
+        return events
+
+    def clear(self):
+        """
+        Forget all stored events
+        """
+        for index in range(self.capacity):
+            self._idents[index] = None
+            self._results[index] = None
+        self._count = 0
+
+    def drain(self):
+        """
+        Returns the stored events and clears the buffer
+        """
+        events = self.events()
+        self.clear()
+        return events
+
+    def dump(self, stream):
+        """
+        Write the stored events to stream, one per line
+        """
+        for event in self.events():
+            stream.write('{0} {1}.{2} {3}\n'.format(
+                    event.timestamp, event.ident, event.method, event.result))
+
+def _traced(func, method, get_ident, buffer):
+    """Returns a wrapper of func recording every call into buffer"""
+    record = buffer.record
+    def traced(self, *args, **kwargs):
+        """Records the call in the trace buffer"""
+        ret = func(self, *args, **kwargs)
+        record(get_ident(self), method, ret)
+        return ret
+    traced.__name__ = func.__name__
+    traced.__doc__ = func.__doc__
+    return traced
+
+def enable(buffer=None):
+    """
+    Start recording trace events into buffer, a new TraceBuffer by default
+
+    Returns the buffer in use
+    """
+    global _buffer
+    if buffer is None:
+        buffer = TraceBuffer()
+    disable()
+    for cls, method, get_ident in _TRACED_METHODS:
+        func = cls.__dict__[method]
+        _originals[(cls, method)] = func
+        setattr(cls, method, _traced(func, method, get_ident, buffer))
+    _buffer = buffer
+    logger.info('Tracing enabled, buffer capacity %d', buffer.capacity)
+    return buffer
+
+def disable():
+    """
+    Stop recording and restore the untraced methods
+    """
+    global _buffer
+    for (cls, method), func in _originals.items():
+        setattr(cls, method, func)
+    _originals.clear()
+    _buffer = None
+
+def is_enabled():
+    """
+    Returns whether tracing is enabled
+    """
+    return _buffer is not None
+
+def get_buffer():
+    """
+    Returns the buffer events are recorded into, None if disabled
+    """
+    return _buffer
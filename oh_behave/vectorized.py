@@ -0,0 +1,164 @@
+"""Module for running one compiled program for a whole population at once
+
+Requires NumPy. The state of every actor is one row of a 2D array, and a
+tick advances all rows together with array operations, a handful of
+iterations per tree level rather than one execute() call per actor.
+
+Only programs made of composites, decorators and ActionTimed leaves can
+be vectorized, any other leaf has to be called per actor.
+"""
+
+import logging
+import numpy
+import oh_behave
+from oh_behave import compiler
+
+logger = logging.getLogger(__name__)
+
+_SUPPORTED = (compiler.OP_SEQUENCE, compiler.OP_SELECTOR, compiler.OP_DECORATOR,
+              compiler.OP_INVERT, compiler.OP_TIMED)
+
+class Population:
+    """
+    Execution state of one Program for size actors
+
+    state holds the node slots of each actor, one row per actor, laid out
+    like the node slots of a ProgramInstance. resume holds the node each
+    actor continues from on its next tick.
+    """
+    def __init__(self, program, size):
+        for index, op in enumerate(program.opcodes):
+            if op not in _SUPPORTED:
+                raise compiler.CompileException(
+                        'Node id "{0}" cannot be vectorized'.format(program.ids[index]))
+        self.program = program
+        self.size = size
+        self.opcodes = numpy.array(program.opcodes, dtype=numpy.int8)
+        self.child_start = numpy.array(program.child_start, dtype=numpy.int64)
+        self.child_count = numpy.array(program.child_count, dtype=numpy.int64)
+        self.parents = numpy.array(program.parents, dtype=numpy.int64)
+        self.params = numpy.array(program.params, dtype=numpy.int64)
+        self.initial_state = numpy.array(program.initial_state, dtype=numpy.int64)
+        self.state = numpy.tile(self.initial_state, (size, 1))
+        self.resume = numpy.zeros(size, dtype=numpy.int64)
+
+    def __len__(self):
+        return self.size
+
+    def reset(self, rows=None):
+        """
+        Rewind the given rows, every actor by default, to the initial state
+        """
+        if rows is None:
+            rows = numpy.arange(self.size)
+        self.state[rows] = self.initial_state
+        self.resume[rows] = 0
+
+    def _reset_subtrees(self, rows, nodes):
+        """Rewind the subtree of nodes[i] for actor rows[i]"""
+        for node in numpy.unique(nodes):
+            subtree = numpy.array(self.program.subtrees[node], dtype=numpy.int64)
+            selected = rows[nodes == node]
+            self.state[numpy.ix_(selected, subtree)] = self.initial_state[subtree]
+
+    def execute(self, mask=None):
+        """
+        Run one tick for every actor, or only the actors selected by the
+        boolean array mask
+
+        Returns an int8 array of oh_behave.ExecuteResult values, one per
+        actor. Actors left out by mask report ready.
+        """
+        statuses = numpy.zeros(self.size, dtype=numpy.int8)
+        if mask is None:
+            rows = numpy.arange(self.size)
+        else:
+            rows = numpy.nonzero(mask)[0]
+        node = self.resume[rows]
+        status = numpy.zeros(len(rows), dtype=numpy.int8)
+        self._descend(rows, node, status)
+        self._propagate(rows, node, status)
+        self.resume[rows] = node
+        statuses[rows] = status
+        return statuses
+
+    def _descend(self, rows, node, status):
+        """Walk every actor down to the node doing work this tick"""
+        state = self.state
+        opcodes = self.opcodes
+        pending = numpy.arange(len(rows))
+        while len(pending):
+            current = node[pending]
+            op = opcodes[current]
+
+            composite = op <= compiler.OP_SELECTOR
+            cursor = state[rows[pending], current]
+            descend = composite & (cursor < self.child_count[current])
+            node[pending[descend]] = self.child_start[current[descend]] + cursor[descend]
+
+            finished = composite & ~descend
+            if finished.any():
+                which = pending[finished]
+                result = numpy.where(op[finished] == compiler.OP_SEQUENCE,
+                                     compiler.SUCCESS, compiler.FAILURE)
+                status[which] = result
+                self._reset_finished(rows[which], current[finished], result)
+
+            decorator = (op == compiler.OP_DECORATOR) | (op == compiler.OP_INVERT)
+            node[pending[decorator]] = self.child_start[current[decorator]]
+
+            timed = op == compiler.OP_TIMED
+            if timed.any():
+                which = pending[timed]
+                leaves = current[timed]
+                time = state[rows[which], leaves]
+                status[which] = numpy.where(time >= self.params[leaves],
+                                            compiler.SUCCESS, compiler.READY)
+                state[rows[which], leaves] = time + 1
+
+            pending = pending[descend | decorator]
+
+    def _reset_finished(self, rows, nodes, result):
+        """Rewind composites that finished with result if their policy says so"""
+        masks = numpy.where(result == compiler.SUCCESS,
+                            compiler.RESET_ON_SUCCESS, compiler.RESET_ON_FAILURE)
+        reset = (self.params[nodes] & masks) != 0
+        if reset.any():
+            self._reset_subtrees(rows[reset], nodes[reset])
+
+    def _propagate(self, rows, node, status):
+        """Move completed results up until they turn into ready or reach the root"""
+        state = self.state
+        pending = numpy.nonzero((status != compiler.READY) & (node != 0))[0]
+        while len(pending):
+            parent = self.parents[node[pending]]
+            op = self.opcodes[parent]
+            result = status[pending]
+
+            advance = (((op == compiler.OP_SEQUENCE) & (result == compiler.SUCCESS)) |
+                       ((op == compiler.OP_SELECTOR) & (result == compiler.FAILURE)))
+            if advance.any():
+                which = rows[pending[advance]]
+                cursor = state[which, parent[advance]] + 1
+                state[which, parent[advance]] = cursor
+                more = numpy.zeros(len(pending), dtype=bool)
+                more[advance] = cursor < self.child_count[parent[advance]]
+                result[more] = compiler.READY
+
+            invert = op == compiler.OP_INVERT
+            result[invert] = -result[invert]
+            status[pending] = result
+
+            finished = (op <= compiler.OP_SELECTOR) & (result != compiler.READY)
+            if finished.any():
+                self._reset_finished(rows[pending[finished]], parent[finished],
+                                     result[finished])
+
+            node[pending] = parent
+            pending = pending[(result != compiler.READY) & (parent != 0)]
+
+def to_results(statuses):
+    """
+    Returns the oh_behave.ExecuteResult for each value in statuses
+    """
+    return [oh_behave.ExecuteResult(int(value)) for value in statuses]